@@ -58,6 +58,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -105,6 +106,93 @@ DATABASES = {
     }
 }
 
+# Read replicas of the default database, e.g. DB_REPLICA_HOSTS=db-r1,db-r2.
+# Safe-method API reads are sent to them by core.replicas.ReplicaRouter.
+DATABASE_REPLICAS = []
+for index, host in enumerate(
+        filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), 1):
+    alias = f'replica{index}'
+    DATABASES[alias] = dict(
+        DATABASES['default'], HOST=host.strip(), TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+
+# Seconds a user's reads stay on the primary after they write
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
+
+# Django REST framework
+# JSON stays the default; clients opt into MessagePack with the
+# application/msgpack Accept or Content-Type header.
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'recipe.renderers.MessagePackRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'recipe.parsers.MessagePackParser',
+    ],
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# Memcached server shared by every worker process, e.g. cache:11211.
+# Without it each process caches in its own memory, which core/caches.py
+# only allows with a single worker process.
+CACHE_LOCATION = os.environ.get('CACHE_LOCATION') or None
+if CACHE_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': CACHE_LOCATION,
+        }
+    }
+
+# Seconds a rendered tag or ingredient list stays in the per-user cache
+ATTR_LIST_CACHE_TIMEOUT = int(os.environ.get('ATTR_LIST_CACHE_TIMEOUT', 300))
+
+
+# Serve list endpoints from values() rows rendered with orjson, see
+# recipe/fastpath.py
+FAST_LIST_RENDERING = bool(int(os.environ.get('FAST_LIST_RENDERING', 0)))
+
+# Seconds a serialized recipe stays cached for assembling list pages, see
+# recipe/fragments.py; 0 serializes every recipe of every page
+RECIPE_FRAGMENT_CACHE_TIMEOUT = int(
+    os.environ.get('RECIPE_FRAGMENT_CACHE_TIMEOUT', 3600))
+
+
+# Request metrics served on /metrics, see core/metrics.py. Each worker
+# writes its totals to METRICS_DIR, when set, so /metrics covers them all.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+# Bearer token scrapers send to read /metrics. Without it only staff users
+# can read them.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Requests over their view's query_budgets are logged, see
+# core/query_budget.py; strict mode raises instead, as the tests do
+QUERY_BUDGET_STRICT = bool(int(os.environ.get('QUERY_BUDGET_STRICT', 0)))
+TEST_RUNNER = 'core.tests.runner.QueryBudgetTestRunner'
+
+
+# Token authentication cache, see user/authentication.py
+TOKEN_AUTH_CACHE_SIZE = int(os.environ.get('TOKEN_AUTH_CACHE_SIZE', 10000))
+TOKEN_AUTH_CACHE_TTL = int(os.environ.get('TOKEN_AUTH_CACHE_TTL', 60))
+# Alias in CACHES shared by every worker, enables cross-worker revocation;
+# required with several workers, the default cache when CACHE_LOCATION is set
+TOKEN_AUTH_SHARED_CACHE = os.environ.get('TOKEN_AUTH_SHARED_CACHE') or (
+    'default' if CACHE_LOCATION else None)
+TOKEN_AUTH_SHARED_CACHE_TTL = int(
+    os.environ.get('TOKEN_AUTH_SHARED_CACHE_TTL', 300))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -148,6 +236,25 @@ MEDIA_ROOT = '/vol/web/media'
 
 STATIC_ROOT='/vol/web/static/'
 
+# The OpenAPI schema built by the generate_schema command, see
+# core/openapi.py. Its directory is collected with the static files so the
+# proxy can serve it; the UI pages load it with SPEC_URL.
+OPENAPI_SCHEMA_FILE = BASE_DIR / 'openapi' / 'openapi.json'
+STATICFILES_DIRS = [OPENAPI_SCHEMA_FILE.parent]
+OPENAPI_CACHE_SECONDS = int(os.environ.get('OPENAPI_CACHE_SECONDS', 86400))
+SWAGGER_SETTINGS = {'SPEC_URL': 'openapi-schema'}
+REDOC_SETTINGS = {'SPEC_URL': 'openapi-schema'}
+
+# Worker processes that process uploaded recipe images, 0 processes them
+# synchronously on the request thread
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
+RECIPE_IMAGE_MAX_BYTES = int(
+    os.environ.get('RECIPE_IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+# Seconds after which a pending image is taken for lost with its worker
+# process and queued again by the requeue_images command
+RECIPE_IMAGE_STALE_SECONDS = int(
+    os.environ.get('RECIPE_IMAGE_STALE_SECONDS', 300))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -156,4 +263,21 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = "core.User"
 
-django_heroku.settings(locals())
\ No newline at end of file
+django_heroku.settings(locals())
+
+# django_heroku collects the static files in BASE_DIR/staticfiles for
+# /static/, where WhiteNoise serves them on Heroku. The Docker image sets
+# STATIC_VOLUME to keep them in the volume the proxy serves on
+# /static/static/ instead, the built OpenAPI schema included.
+if os.environ.get('STATIC_VOLUME'):
+    STATIC_URL = '/static/static/'
+    STATIC_ROOT = os.environ['STATIC_VOLUME']
+
+# WhiteNoise, which django_heroku puts first in MIDDLEWARE, is sync only.
+# Under ASGI it would send every request, the async views' included,
+# through the one thread Django keeps for sync code, so the ASGI server
+# leaves the static files to the proxy.
+if os.environ.get('APP_SERVER') == 'asgi':
+    MIDDLEWARE = [
+        name for name in MIDDLEWARE
+        if name != 'whitenoise.middleware.WhiteNoiseMiddleware']
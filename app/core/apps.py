@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # registers the model signal handlers
+        from core import signals  # noqa: F401
+        from core import caches
+        caches.check_shared()
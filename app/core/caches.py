@@ -0,0 +1,49 @@
+"""Startup check that the default cache is shared by the worker processes.
+
+Per-user tag and ingredient lists are cached behind a generation number
+that every write bumps (see recipe/cache.py), and the generation lives in
+the default cache. Without CACHE_LOCATION that cache is Django's local
+memory cache, private to each process, so a write handled by one worker
+would leave the lists cached by the others stale. CoreConfig.ready()
+therefore refuses to start more than one worker process on it.
+
+The number of workers is the one uWSGI reports, or WEB_CONCURRENCY, which
+gunicorn and Heroku use.
+"""
+import os
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+# Backends whose entries other processes cannot see
+PROCESS_LOCAL_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def worker_processes():
+    """Return the number of worker processes serving the app"""
+    try:
+        import uwsgi
+    except ImportError:
+        return int(os.environ.get('WEB_CONCURRENCY') or 1)
+    return uwsgi.numproc
+
+
+def is_process_local(alias='default'):
+    """Return whether other processes cannot see the entries of a cache"""
+    return settings.CACHES[alias]['BACKEND'] in PROCESS_LOCAL_BACKENDS
+
+
+def check_shared(alias='default'):
+    """Raise ImproperlyConfigured when several worker processes would each
+    keep a cache of their own"""
+    processes = worker_processes()
+    if processes > 1 and is_process_local(alias):
+        raise ImproperlyConfigured(
+            f"The {alias!r} cache is local to each process, but "
+            f"{processes} worker processes would serve the app and miss "
+            f"each other's invalidations. Set CACHE_LOCATION to a shared "
+            f"memcached server, or run a single worker process.")
@@ -0,0 +1,125 @@
+"""Concurrent HTTP load against a running server and its statistics.
+
+Requests are prepared as raw HTTP/1.1 bytes and each one is sent on a new
+connection, closed by the server once the response is sent, so the client
+stays cheap next to the server being measured. A number of workers share
+the requests, which keeps that many of them in flight at any time.
+"""
+import asyncio
+import json
+import time
+import uuid
+
+
+def http_request(method, host, path, headers=(), body=b''):
+    """Return the bytes of a request closing its connection"""
+    lines = [f'{method} {path} HTTP/1.1', f'Host: {host}']
+    lines.extend(f'{name}: {value}' for name, value in headers)
+    if body or method in ('POST', 'PUT', 'PATCH'):
+        lines.append(f'Content-Length: {len(body)}')
+    lines.append('Connection: close')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode() + body
+
+
+def json_body(data):
+    """Return the Content-Type header and body of a JSON request"""
+    return [('Content-Type', 'application/json')], json.dumps(data).encode()
+
+
+def multipart_body(name, filename, content, content_type):
+    """Return the Content-Type header and body of a file upload"""
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="{name}"; '
+        f'filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    return [('Content-Type',
+             f'multipart/form-data; boundary={boundary}')], body
+
+
+async def fetch(host, port, request):
+    """Send a request on a new connection and return its status"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(request)
+        await writer.drain()
+        status_line = await reader.readline()
+        # The server closes the connection once the body is sent
+        while await reader.read(65536):
+            pass
+    finally:
+        writer.close()
+    try:
+        return int(status_line.split()[1])
+    except (IndexError, ValueError):
+        return None
+
+
+async def load(host, port, requests, concurrency, expected=200):
+    """Send the requests, concurrency at a time, and return the latencies
+    of those answered with the expected status and the failed count"""
+    remaining = iter(requests)
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        for request in remaining:
+            started = time.perf_counter()
+            try:
+                status = await fetch(host, port, request)
+            except OSError:
+                status = None
+            if status == expected:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def percentile(latencies, fraction):
+    """Return the percentile of sorted latencies in milliseconds"""
+    if not latencies:
+        return 0
+    return latencies[int(fraction * (len(latencies) - 1))] * 1000
+
+
+def summarize(latencies, errors, elapsed):
+    """Return the throughput, latency percentiles and errors of a run"""
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0,
+        'p50': round(percentile(latencies, 0.5), 2),
+        'p95': round(percentile(latencies, 0.95), 2),
+        'p99': round(percentile(latencies, 0.99), 2),
+    }
+
+
+def compare(baseline, results, tolerance):
+    """Return (route, metric, before, after, change, regressed) of every
+    metric of the routes in both, change being relative to before.
+
+    A latency more than tolerance above the baseline, a throughput more
+    than tolerance below it or new errors count as regressions.
+    """
+    rows = []
+    for route, summary in results.items():
+        before = baseline.get(route)
+        if before is None:
+            continue
+        for metric in ('rps', 'p50', 'p95', 'p99', 'errors'):
+            old, new = before[metric], summary[metric]
+            change = (new - old) / old if old else 0
+            if metric == 'errors':
+                regressed = new > old
+            elif metric == 'rps':
+                regressed = change < -tolerance
+            else:
+                regressed = change > tolerance
+            rows.append((route, metric, old, new, change, regressed))
+    return rows
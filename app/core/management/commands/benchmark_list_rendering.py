@@ -0,0 +1,99 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.fastpath import compile_serializer
+from recipe.renderers import ORJSONRenderer
+from recipe.serializers import RecipeSerializer, TagSerializer
+from recipe.views import RecipeViewSet
+
+
+class Command(BaseCommand):
+    """Django command to compare the regular and fast list rendering"""
+    help = ('Time building and rendering recipe and tag lists with the '
+            'serializers and with recipe.fastpath. The sample rows are '
+            'created in a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        with transaction.atomic():
+            user = self._sample(rows)
+            recipes = Recipe.objects.filter(user=user).order_by('-id')
+            tags = Tag.objects.filter(user=user).order_by('-name', '-id')
+            self._compare('recipes', RecipeSerializer, rows, repeat,
+                          recipes.prefetch_related(
+                              *RecipeViewSet.related_prefetch),
+                          recipes)
+            self._compare('tags', TagSerializer, rows, repeat, tags, tags)
+            transaction.set_rollback(True)
+
+    def _sample(self, rows):
+        user = get_user_model().objects.create_user(
+            f'benchmark-{time.time_ns()}@example.com')
+        Tag.objects.bulk_create(
+            [Tag(user=user, name=f'Tag {i}') for i in range(rows)])
+        Ingredient.objects.bulk_create(
+            [Ingredient(user=user, name=f'Ingredient {i}')
+             for i in range(rows)])
+        Recipe.objects.bulk_create([
+            Recipe(user=user, title=f'Recipe {i}', time_minutes=i % 90,
+                   price=Decimal(i % 500) / 4, link='https://example.com')
+            for i in range(rows)
+        ])
+        # Re-read for the ids, which SQLite does not return from bulk_create
+        recipes = list(Recipe.objects.filter(user=user))
+        tags = list(Tag.objects.filter(user=user))
+        ingredients = list(Ingredient.objects.filter(user=user))
+        Recipe.tag.through.objects.bulk_create([
+            Recipe.tag.through(recipe_id=recipe.pk, tag_id=tag.pk)
+            for i, recipe in enumerate(recipes)
+            for tag in (tags[i], tags[i - 1])
+        ])
+        Recipe.ingredients.through.objects.bulk_create([
+            Recipe.ingredients.through(
+                recipe_id=recipe.pk, ingredient_id=ingredient.pk)
+            for i, recipe in enumerate(recipes)
+            for ingredient in (ingredients[i], ingredients[i - 1])
+        ])
+        return user
+
+    def _time(self, repeat, render):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            body = render()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, body
+
+    def _compare(self, label, serializer_class, rows, repeat,
+                 queryset, values_queryset):
+        compiled = compile_serializer(serializer_class)
+        columns = set(compiled.columns) | {'id'}
+
+        def regular():
+            data = serializer_class(list(queryset), many=True).data
+            return JSONRenderer().render(data)
+
+        def fast():
+            values = list(values_queryset.values(*sorted(columns)))
+            return ORJSONRenderer().render(compiled.rows(values))
+
+        slow_time, slow_body = self._time(repeat, regular)
+        fast_time, fast_body = self._time(repeat, fast)
+        if slow_body != fast_body:
+            self.stderr.write(f'{label}: the outputs differ')
+        per_1k = 1000 / rows * 1000
+        self.stdout.write(
+            f'{label}: serializer {slow_time * per_1k:.1f} ms, '
+            f'fast path {fast_time * per_1k:.1f} ms per 1k rows '
+            f'({slow_time / fast_time:.1f}x)')
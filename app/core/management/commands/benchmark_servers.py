@@ -0,0 +1,84 @@
+import asyncio
+import time
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from core import loadtest
+from core.models import Ingredient, Recipe, Tag
+from recipe import bulk
+
+
+class Command(BaseCommand):
+    """Django command to compare the throughput of running servers"""
+    help = ('Send concurrent GET requests to each LABEL=URL target and '
+            'report throughput and latency. Requests authenticate as a '
+            'benchmark user, created with sample recipes when missing. '
+            'scripts/benchmark_servers.sh starts the servers to compare.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('targets', nargs='+', metavar='LABEL=URL')
+        parser.add_argument('--concurrency', type=int, default=200)
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--recipes', type=int, default=200)
+        parser.add_argument('--email',
+                            default='benchmark-servers@example.com')
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['targets']:
+            label, sep, url = target.partition('=')
+            if not sep or not url.startswith('http://'):
+                raise CommandError(f"Expected LABEL=http://..., got {target}")
+            targets.append((label, url))
+
+        token = self._token(options['email'], options['recipes'])
+        for label, url in targets:
+            parts = urlsplit(url)
+            request = loadtest.http_request(
+                'GET', parts.netloc,
+                parts.path + (f'?{parts.query}' if parts.query else ''),
+                [('Authorization', f'Token {token}'),
+                 ('Accept', 'application/json')])
+
+            def run(count):
+                return asyncio.run(loadtest.load(
+                    parts.hostname, parts.port or 80, [request] * count,
+                    options['concurrency']))
+
+            # An untimed first round warms the workers and their caches
+            run(options['concurrency'])
+            started = time.perf_counter()
+            latencies, errors = run(options['requests'])
+            summary = loadtest.summarize(
+                latencies, errors, time.perf_counter() - started)
+            self.stdout.write(
+                f'{label}: {summary["rps"]:.0f} req/s, '
+                f'p50 {summary["p50"]:.1f} ms, '
+                f'p99 {summary["p99"]:.1f} ms, '
+                f'{errors} errors')
+
+    def _token(self, email, recipes):
+        """Return the benchmark user's token key, creating the user"""
+        user = get_user_model().objects.filter(email=email).first()
+        if user is None:
+            user = get_user_model().objects.create_user(email)
+            tags = Tag.objects.get_or_create_names(
+                user, [f'Tag {i}' for i in range(20)])
+            ingredients = Ingredient.objects.get_or_create_names(
+                user, [f'Ingredient {i}' for i in range(50)])
+            tag_ids = [pk for pk, _ in tags.values()]
+            ingredient_ids = [pk for pk, _ in ingredients.values()]
+            bulk.save(user, [
+                {'title': f'Recipe {i}', 'time_minutes': i % 90,
+                 'price': Decimal(i % 500) / 4,
+                 'tag': tag_ids[i % 20:i % 20 + 2],
+                 'ingredients': ingredient_ids[i % 50:i % 50 + 5]}
+                for i in range(recipes)
+            ])
+        elif not Recipe.objects.filter(user=user).exists():
+            self.stderr.write(f'{email} has no recipes')
+        return Token.objects.get_or_create(user=user)[0].key
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from core import openapi
+
+
+class Command(BaseCommand):
+    """Django command to build the OpenAPI schema served on /openapi.json"""
+    help = ('Generate the OpenAPI schema of the API into a static file, '
+            'served instead of introspecting the views on every request.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default=str(settings.OPENAPI_SCHEMA_FILE),
+            help='File to write the schema to, OPENAPI_SCHEMA_FILE by '
+                 'default')
+
+    def handle(self, *args, **options):
+        content = openapi.write(options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(content)} bytes of schema to {options['output']}"))
@@ -0,0 +1,107 @@
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management import BaseCommand, CommandError
+
+from core.models import Recipe
+from recipe import importer
+
+
+class Command(BaseCommand):
+    """Django command to bulk import recipes from an NDJSON or CSV file"""
+    help = ('Import recipes in the format of the export endpoint. Progress '
+            'is saved to a checkpoint file so an interrupted import can be '
+            'resumed by running the same command again.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', choices=('ndjson', 'csv'),
+            help='Defaults to csv for .csv files and ndjson otherwise')
+        parser.add_argument(
+            '--user', help='Email of the owner of rows without a "user"')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--checkpoint', help='Defaults to PATH.checkpoint')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore the checkpoint and import from the first row')
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options['path'])
+        fmt = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'ndjson')
+        self.checkpoint = options['checkpoint'] or path + '.checkpoint'
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive.')
+        loader = importer.Loader(default_email=options['user'])
+
+        done = 0 if options['restart'] else self._resume(path, loader)
+        if done:
+            self.stdout.write(f'Resuming after row {done}')
+        imported = rejected = 0
+        started = time.monotonic()
+        with open(path, newline='', encoding='utf-8') as stream:
+            rows = importer.read_rows(stream, fmt)
+            for _ in islice(rows, done):
+                pass
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                valid, errors = loader.prepare(batch)
+                for index, messages in sorted(errors.items()):
+                    self.stderr.write(
+                        f'Row {done + index + 1}: {"; ".join(messages)}')
+
+                ids = loader.allocate_ids(len(valid))
+                if ids:
+                    # Lets a resumed import tell whether this batch committed
+                    self._save(path, done, pending={
+                        'rows': done + len(batch), 'recipe': ids[0]})
+                loader.load(valid, ids)
+                done += len(batch)
+                self._save(path, done)
+
+                imported += len(valid)
+                rejected += len(errors)
+                rate = imported / max(time.monotonic() - started, 1e-6)
+                self.stdout.write(
+                    f'{done} rows read, {imported} recipes imported, '
+                    f'{rejected} rejected ({rate:.0f} recipes/s)')
+
+        self._save(path, done, complete=True)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} recipes, rejected {rejected} rows'))
+
+    def _resume(self, path, loader):
+        """Return how many rows of path an earlier run has imported"""
+        try:
+            with open(self.checkpoint) as checkpoint:
+                state = json.load(checkpoint)
+        except FileNotFoundError:
+            return 0
+        if state.get('source') != path:
+            raise CommandError(
+                f'{self.checkpoint} belongs to {state.get("source")}; '
+                'pass --checkpoint or --restart.')
+        if state.get('complete'):
+            raise CommandError(
+                f'{path} was already imported; pass --restart to import '
+                'it again.')
+        pending = state.get('pending')
+        if pending and Recipe.objects.using(loader.db).filter(
+                pk=pending['recipe']).exists():
+            return pending['rows']
+        return state['rows']
+
+    def _save(self, path, rows, **extra):
+        """Atomically replace the checkpoint file"""
+        state = dict(source=path, rows=rows, **extra)
+        partial = self.checkpoint + '.tmp'
+        with open(partial, 'w') as checkpoint:
+            json.dump(state, checkpoint)
+        os.replace(partial, self.checkpoint)
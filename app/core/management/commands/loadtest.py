@@ -0,0 +1,300 @@
+import asyncio
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from core import loadtest
+from core.models import Ingredient, Recipe, Tag
+from recipe import bulk
+
+
+# Started with the flags of scripts/entrypoint.sh, over plain HTTP
+SERVERS = {
+    'uwsgi': ['uwsgi', '--http', '127.0.0.1:{port}', '--master',
+              '--enable-threads', '--module', 'app.wsgi', '--listen', '1024',
+              '--disable-logging', '--die-on-term',
+              '--py-sys-executable', sys.executable],
+    'asgi': ['gunicorn', 'app.asgi:application', '--bind', '127.0.0.1:{port}',
+             '--worker-class', 'uvicorn.workers.UvicornWorker',
+             '--backlog', '1024'],
+}
+
+# Measured in this order; uploads queue image jobs, so they come last
+ROUTES = (
+    'token', 'me', 'me-update',
+    'tag-list', 'tag-create', 'tag-detail',
+    'ingredient-list', 'ingredient-create', 'ingredient-detail',
+    'recipe-list', 'recipe-create', 'recipe-detail', 'recipe-update',
+    'recipe-delete', 'recipe-upload-image',
+)
+
+# Recipes the detail, update and upload requests take turns on
+POOL = 20
+
+
+class Command(BaseCommand):
+    """Django command to measure the latency of every API route"""
+    help = ('Start a server, or use --url, and load each route with '
+            '--requests requests, --concurrency at a time, as a user '
+            'created for the run and removed after it. Reports throughput '
+            'and p50/p95/p99 latency per route and compares them with the '
+            '--baseline file; regressions beyond --tolerance make the '
+            'command fail. --save writes the results as the new baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('routes', nargs='*', metavar='ROUTE',
+                            help=f'Routes to load, of {", ".join(ROUTES)}')
+        parser.add_argument('--url',
+                            help='Base URL of a running server to load')
+        parser.add_argument('--server', choices=sorted(SERVERS),
+                            default='uwsgi')
+        parser.add_argument('--port', type=int, default=8095)
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Timed requests per route')
+        parser.add_argument('--baseline', default='loadtest-baseline.json')
+        parser.add_argument('--save', action='store_true',
+                            help='Write the results to --baseline')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed relative change of latency and throughput')
+        parser.add_argument('--email', default='loadtest@example.com')
+
+    def handle(self, *args, **options):
+        unknown = sorted(set(options['routes']) - set(ROUTES))
+        if unknown:
+            raise CommandError(f'Unknown routes: {", ".join(unknown)}')
+        for name in ('concurrency', 'requests'):
+            if options[name] < 1:
+                raise CommandError(f'--{name} must be positive.')
+        if get_user_model().objects.filter(email=options['email']).exists():
+            raise CommandError(
+                f"{options['email']} exists already, remove it or choose "
+                'another --email.')
+        routes = [name for name in ROUTES
+                  if not options['routes'] or name in options['routes']]
+
+        url = options['url'] or f'http://127.0.0.1:{options["port"]}'
+        parts = urlsplit(url)
+        if parts.scheme != 'http' or not parts.hostname:
+            raise CommandError(f'Expected an http:// URL, got {url}')
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.netloc, self.prefix = parts.netloc, parts.path.rstrip('/')
+        self.concurrency = options['concurrency']
+
+        server = None
+        if not options['url']:
+            server = self._start(options['server'], options['port'])
+        try:
+            self._create_fixture(
+                options['email'], options['concurrency'] + options['requests'])
+            results = {}
+            for name in routes:
+                results[name] = self._measure(name, options['requests'])
+                self.stdout.write(
+                    f'{name:20} {results[name]["rps"]:8.1f} req/s  '
+                    'p50 {p50:7.1f}  p95 {p95:7.1f}  p99 {p99:7.1f} ms  '
+                    '{errors} errors'.format(**results[name]))
+        finally:
+            self._remove_fixture()
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+
+        if options['save']:
+            with open(options['baseline'], 'w') as f:
+                json.dump({'concurrency': options['concurrency'],
+                           'requests': options['requests'],
+                           'routes': results}, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write(f'Saved the baseline to {options["baseline"]}')
+            return
+        self._compare(options, results)
+
+    def _start(self, name, port):
+        """Start a server on port and return its process once it listens"""
+        command = [arg.format(port=port) for arg in SERVERS[name]]
+        try:
+            # As in the entrypoint, APP_SERVER=asgi selects its middleware
+            server = subprocess.Popen(
+                command, cwd=settings.BASE_DIR,
+                env=dict(os.environ, APP_SERVER=name))
+        except FileNotFoundError:
+            raise CommandError(f'{command[0]} is not installed.')
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'{name} exited with {server.returncode}.')
+            try:
+                socket.create_connection(('127.0.0.1', port), 1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f'{name} did not listen on {port} in 30s.')
+
+    def _create_fixture(self, email, runs):
+        """Create the user of the run with tags, ingredients and recipes"""
+        self.email, self.password = email, 'loadtest-password'
+        self.user = get_user_model().objects.create_user(
+            email, self.password, name='Load test')
+        self.token = Token.objects.create(user=self.user).key
+        tags = Tag.objects.get_or_create_names(
+            self.user, [f'Tag {i}' for i in range(20)])
+        ingredients = Ingredient.objects.get_or_create_names(
+            self.user, [f'Ingredient {i}' for i in range(50)])
+        self.tag_ids = sorted(pk for pk, _ in tags.values())
+        self.ingredient_ids = sorted(pk for pk, _ in ingredients.values())
+        # The pool, then one recipe for each delete request
+        recipes = bulk.save(self.user, [
+            self._recipe(i) for i in range(POOL + runs)])
+        self.recipe_ids = [recipe.pk for recipe in recipes]
+        image = io.BytesIO()
+        Image.new('RGB', (800, 600), 'red').save(image, 'JPEG')
+        self.image = image.getvalue()
+
+    def _remove_fixture(self):
+        user = getattr(self, 'user', None)
+        if user is None:
+            return
+        recipes = Recipe.objects.filter(user=user)
+        deadline = time.monotonic() + 60
+        # Files of uploads still processing would be written after the
+        # recipes are gone
+        while (recipes.filter(image_status=Recipe.IMAGE_PENDING).exists()
+               and time.monotonic() < deadline):
+            time.sleep(0.5)
+        for recipe in recipes:
+            for field in (recipe.image, recipe.thumbnail):
+                if field:
+                    field.delete(save=False)
+        user.delete()
+
+    def _recipe(self, i):
+        return {
+            'title': f'Load test recipe {i}', 'time_minutes': i % 90,
+            'price': Decimal(i % 500) / 4,
+            'tag': self.tag_ids[i % 20:i % 20 + 2],
+            'ingredients': self.ingredient_ids[i % 50:i % 50 + 5],
+        }
+
+    def _route(self, name):
+        """Return the expected status and the request builder of a route"""
+        def pooled(i):
+            return self.recipe_ids[i % POOL]
+
+        def jsonable(i):
+            data = self._recipe(i)
+            data['price'] = str(data['price'])
+            return data
+
+        login = {'email': self.email, 'password': self.password}
+        routes = {
+            'token': (200, lambda i: (
+                'POST', reverse('user:token'), loadtest.json_body(login))),
+            'me': (200, lambda i: ('GET', reverse('user:me'), None)),
+            'me-update': (200, lambda i: (
+                'PATCH', reverse('user:me'),
+                loadtest.json_body({'name': f'Load test {i}'}))),
+            'recipe-list': (200, lambda i: (
+                'GET', reverse('recipe:recipe-list'), None)),
+            'recipe-create': (201, lambda i: (
+                'POST', reverse('recipe:recipe-list'),
+                loadtest.json_body(jsonable(i)))),
+            'recipe-detail': (200, lambda i: (
+                'GET', reverse('recipe:recipe-detail', args=[pooled(i)]),
+                None)),
+            'recipe-update': (200, lambda i: (
+                'PATCH', reverse('recipe:recipe-detail', args=[pooled(i)]),
+                loadtest.json_body({'time_minutes': i % 90}))),
+            'recipe-delete': (204, lambda i: (
+                'DELETE', reverse('recipe:recipe-detail',
+                                  args=[self.recipe_ids[POOL + i]]),
+                None)),
+            'recipe-upload-image': (202, lambda i: (
+                'POST',
+                reverse('recipe:recipe-upload-image', args=[pooled(i)]),
+                loadtest.multipart_body(
+                    'image', 'load.jpg', self.image, 'image/jpeg'))),
+        }
+        for kind, ids in (('tag', self.tag_ids),
+                          ('ingredient', self.ingredient_ids)):
+            routes[f'{kind}-list'] = (200, lambda i, kind=kind: (
+                'GET', reverse(f'recipe:{kind}-list'), None))
+            routes[f'{kind}-create'] = (201, lambda i, kind=kind: (
+                'POST', reverse(f'recipe:{kind}-list'),
+                # The ingredient serializer requires the user as well
+                loadtest.json_body({'name': f'Load test {kind} {i}',
+                                    'user': self.user.pk})))
+            routes[f'{kind}-detail'] = (200, lambda i, kind=kind, ids=ids: (
+                'GET', reverse(f'recipe:{kind}-detail',
+                               args=[ids[i % len(ids)]]),
+                None))
+        return routes[name]
+
+    def _measure(self, name, count):
+        """Load a route and return the summary of its timed requests"""
+        expected, build = self._route(name)
+        requests = []
+        for i in range(self.concurrency + count):
+            method, path, body = build(i)
+            headers, content = body or ([], b'')
+            if name != 'token':
+                headers = headers + [
+                    ('Authorization', f'Token {self.token}')]
+            requests.append(loadtest.http_request(
+                method, self.netloc, self.prefix + path,
+                headers + [('Accept', 'application/json')], content))
+
+        def run(batch):
+            return asyncio.run(loadtest.load(
+                self.host, self.port, batch, self.concurrency, expected))
+
+        # An untimed first round warms the workers and their caches
+        run(requests[:self.concurrency])
+        started = time.perf_counter()
+        latencies, errors = run(requests[self.concurrency:])
+        return loadtest.summarize(
+            latencies, errors, time.perf_counter() - started)
+
+    def _compare(self, options, results):
+        if not os.path.exists(options['baseline']):
+            self.stdout.write(
+                f'No baseline at {options["baseline"]}, run with --save '
+                'to record one.')
+            return
+        with open(options['baseline']) as f:
+            baseline = json.load(f)
+        if (baseline['concurrency'], baseline['requests']) != (
+                options['concurrency'], options['requests']):
+            self.stderr.write(
+                f'The baseline ran {baseline["requests"]} requests at '
+                f'concurrency {baseline["concurrency"]}, the numbers may '
+                'not be comparable.')
+
+        regressions = 0
+        for route, metric, old, new, change, regressed in loadtest.compare(
+                baseline['routes'], results, options['tolerance']):
+            regressions += regressed
+            line = (f'{route:20} {metric:6} {old:10.1f} -> {new:10.1f} '
+                    f'({change:+.0%})')
+            self.stdout.write(
+                self.style.ERROR(line + '  REGRESSION') if regressed
+                else line)
+        if regressions:
+            raise CommandError(
+                f'{regressions} regressions beyond the baseline.')
+        self.stdout.write(self.style.SUCCESS('No regressions.'))
@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand
+
+from core.models import Ingredient, Tag
+
+
+class Command(BaseCommand):
+    """Django command to rebuild the recipe counts of tags and ingredients"""
+    help = ('Recount the recipes of every tag and ingredient and fix the '
+            'stored recipe_count where it has drifted.')
+
+    def handle(self, *args, **options):
+        for model in (Tag, Ingredient):
+            fixed = model.objects.all().refresh_recipe_count()
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: fixed {fixed} counts')
+        self.stdout.write(self.style.SUCCESS('Recipe counts are up to date'))
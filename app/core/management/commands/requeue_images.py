@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from recipe import images
+
+
+class Command(BaseCommand):
+    """Django command to queue again the image uploads of lost jobs"""
+    help = ('Process again the recipe images still pending after their '
+            'worker process was restarted, marking those whose upload is '
+            'gone as failed. Runs when the server starts and every '
+            'RECIPE_IMAGE_STALE_SECONDS after, see scripts/entrypoint.sh.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than', type=int,
+            default=settings.RECIPE_IMAGE_STALE_SECONDS,
+            help='Seconds an image must have been pending, '
+                 'RECIPE_IMAGE_STALE_SECONDS by default')
+
+    def handle(self, *args, **options):
+        queued, failed = images.requeue_stale(options['older_than'])
+        images.shutdown()
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {queued} pending images, {failed} uploads lost'))
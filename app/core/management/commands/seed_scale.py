@@ -0,0 +1,73 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+
+from recipe.seed import Seeder
+
+
+class Command(BaseCommand):
+    """Django command to generate a large, realistic dataset"""
+    help = ('Create users with tags, ingredients and recipes, skewed like '
+            'real data: Pareto distributed recipes per user and Zipfian '
+            'tag and ingredient popularity. The same --seed and sizes '
+            'always create the same rows. Users are PREFIXn@example.com, '
+            'all with the same --password.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--tags', type=int, default=30,
+                            help='Tags of each user')
+        parser.add_argument('--ingredients', type=int, default=60,
+                            help='Ingredients of each user')
+        parser.add_argument('--tags-per-recipe', type=float, default=3)
+        parser.add_argument('--ingredients-per-recipe', type=float,
+                            default=8)
+        parser.add_argument(
+            '--popularity', type=float, default=1.1,
+            help='Zipf exponent of tag and ingredient popularity')
+        parser.add_argument(
+            '--inequality', type=float, default=1.2,
+            help='Pareto shape of recipes per user, lower is more skewed')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='seed')
+        parser.add_argument('--password', default='password')
+        parser.add_argument('--batch-size', type=int, default=50000)
+
+    def handle(self, *args, **options):
+        for name in ('users', 'batch_size'):
+            if options[name] < 1:
+                raise CommandError(f'--{name.replace("_", "-")} must be '
+                                   'positive.')
+        for name in ('recipes', 'tags', 'ingredients'):
+            if options[name] < 0:
+                raise CommandError(f'--{name} cannot be negative.')
+        seeder = Seeder(
+            options['users'], options['tags'], options['ingredients'],
+            options['recipes'], seed=options['seed'],
+            tags_per_recipe=options['tags_per_recipe'],
+            ingredients_per_recipe=options['ingredients_per_recipe'],
+            popularity=options['popularity'],
+            inequality=options['inequality'],
+            prefix=options['prefix'], password=options['password'],
+        )
+        emails = list(seeder.emails())
+        if get_user_model().objects.filter(
+                email__in=[emails[0], emails[-1]]).exists():
+            raise CommandError(
+                f"Users with the prefix '{options['prefix']}' exist "
+                'already, choose another --prefix.')
+
+        started = time.monotonic()
+
+        def progress(recipes):
+            rate = recipes / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'{recipes} of {options["recipes"]} recipes written '
+                f'({rate:.0f} recipes/s)')
+
+        seeder.run(options['batch_size'], progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {options["users"]} users and {options["recipes"]} '
+            f'recipes in {time.monotonic() - started:.1f}s'))
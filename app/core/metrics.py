@@ -0,0 +1,358 @@
+"""Per-request metrics, served in the Prometheus text format on /metrics.
+
+MetricsMiddleware records histograms of the latency, the number and time
+of SQL queries, the time spent building serializer data and the response
+size of every request, labelled with the resolved view name and method,
+and counts the responses by status and the requests over their view's
+query budget, see core.query_budget. Other code counts its own events with
+registry.count(), as the tag and ingredient list cache does its hits and
+misses.
+
+The middleware runs in the mode of the handler it wraps, so under ASGI the
+async views are not serialized on the thread Django keeps for sync code.
+
+Each process keeps its totals in memory. With METRICS_DIR set, every
+process also writes them to a file of its own there, at most once every
+METRICS_FLUSH_INTERVAL seconds, and /metrics adds up the files of all the
+workers. The entrypoint empties the directory when the server starts.
+Without METRICS_DIR, /metrics reports the process serving it.
+
+/metrics is served to staff users and to scrapers sending METRICS_TOKEN as
+a bearer token, and is forbidden to everyone else.
+"""
+import bisect
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework import serializers
+
+from core import query_budget
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5,
+                   5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# Any other method a client makes up is labelled 'other', so it cannot add
+# series without end
+METHODS = frozenset((
+    'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE',
+    'CONNECT'))
+
+# name: (help, label names, buckets, or None for a counter)
+METRICS = {
+    'http_requests_total': (
+        'Responses by view, method and status.',
+        ('view', 'method', 'status'), None),
+    'http_request_duration_seconds': (
+        'Time to produce the response.',
+        ('view', 'method'), LATENCY_BUCKETS),
+    'http_request_queries': (
+        'SQL queries run by a request.',
+        ('view', 'method'), QUERY_BUCKETS),
+    'http_request_query_seconds': (
+        'Time spent in the SQL queries of a request.',
+        ('view', 'method'), LATENCY_BUCKETS),
+    'http_request_serializer_seconds': (
+        'Time spent building serializer data, queries excluded.',
+        ('view', 'method'), LATENCY_BUCKETS),
+    'http_response_size_bytes': (
+        'Size of the response body, streaming responses excluded.',
+        ('view', 'method'), SIZE_BUCKETS),
+    'http_request_query_budget_exceeded_total': (
+        'Requests running more queries than their view allows.',
+        ('view', 'method'), None),
+    'list_cache_lookups_total': (
+        'Lookups of the tag and ingredient list cache by result.',
+        ('result',), None),
+}
+
+
+class RequestStats:
+    """What the request being handled has spent so far"""
+    __slots__ = ('queries', 'query_seconds', 'serializer_seconds',
+                 'statements', 'over_budget')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.serializer_seconds = 0.0
+        # The SQL run, fingerprinted when the query budget is exceeded
+        self.statements = []
+        self.over_budget = False
+
+
+# The stats of the request being handled, None outside of requests
+_current = ContextVar('request_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper counting the queries of the request"""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_seconds += time.perf_counter() - started
+        stats.statements.append(sql)
+
+
+@contextmanager
+def serializer_timer():
+    """Count the time spent in the block as serializer time"""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    query_seconds = stats.query_seconds
+    try:
+        yield
+    finally:
+        # Lazy queries run while serializing are already counted as SQL
+        stats.serializer_seconds += (
+            time.perf_counter() - started
+            - (stats.query_seconds - query_seconds))
+
+
+class TimedSerializerMixin:
+    """Counts building the data of a serializer as serializer time"""
+
+    @property
+    def data(self):
+        with serializer_timer():
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """List serializer counting its data as serializer time, for use as a
+    serializer's Meta.list_serializer_class"""
+
+
+class Registry:
+    """Metric values of this process and their file in METRICS_DIR"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        # {(name, labels): [count per bucket..., count above, sum]}
+        self._values = {}
+        self._filename = f'metrics-{self._pid}-{time.time_ns()}.json'
+        self._next_flush = 0
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def _add(self, name, labels, value):
+        buckets = METRICS[name][2]
+        values = self._values.get((name, labels))
+        if values is None:
+            size = 1 if buckets is None else len(buckets) + 2
+            values = self._values[(name, labels)] = [0] * size
+        if buckets is None:
+            values[0] += value
+        else:
+            values[bisect.bisect_left(buckets, value)] += 1
+            values[-1] += value
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            # Forked: the values belong to the parent process
+            self._reset()
+
+    def count(self, name, labels, value=1):
+        """Add value to a counter. It reaches METRICS_DIR with the next
+        request recorded."""
+        with self._lock:
+            self._check_fork()
+            self._add(name, labels, value)
+
+    def observe(self, view, method, status, seconds, stats, size):
+        """Record a finished request"""
+        labels = (view, method)
+        with self._lock:
+            self._check_fork()
+            self._add('http_requests_total', labels + (str(status),), 1)
+            self._add('http_request_duration_seconds', labels, seconds)
+            self._add('http_request_queries', labels, stats.queries)
+            self._add('http_request_query_seconds', labels,
+                      stats.query_seconds)
+            self._add('http_request_serializer_seconds', labels,
+                      stats.serializer_seconds)
+            if size is not None:
+                self._add('http_response_size_bytes', labels, size)
+            if stats.over_budget:
+                self._add(
+                    'http_request_query_budget_exceeded_total', labels, 1)
+            flush = bool(settings.METRICS_DIR and
+                         time.monotonic() >= self._next_flush)
+            if flush:
+                self._next_flush = (
+                    time.monotonic() + settings.METRICS_FLUSH_INTERVAL)
+        if flush:
+            self.flush()
+
+    def _snapshot(self):
+        with self._lock:
+            return [[name, list(labels), list(values)]
+                    for (name, labels), values in self._values.items()]
+
+    def flush(self):
+        """Write the values of this process to its file in METRICS_DIR"""
+        path = os.path.join(settings.METRICS_DIR, self._filename)
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(self._snapshot(), f)
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Return the values of every worker, {(name, labels): values}"""
+        if not settings.METRICS_DIR:
+            snapshots = [self._snapshot()]
+        else:
+            self.flush()
+            snapshots = []
+            pattern = os.path.join(settings.METRICS_DIR, 'metrics-*.json')
+            for path in glob.glob(pattern):
+                try:
+                    with open(path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    # Replaced or removed while being read
+                    continue
+        totals = {}
+        for snapshot in snapshots:
+            for name, labels, values in snapshot:
+                if name not in METRICS:
+                    continue
+                key = (name, tuple(labels))
+                if key in totals:
+                    totals[key] = [a + b for a, b in zip(totals[key], values)]
+                else:
+                    totals[key] = values
+        return totals
+
+    def render(self):
+        """Return the text exposition of every worker's metrics"""
+        totals = self.collect()
+        lines = []
+        for name, (help_text, label_names, buckets) in METRICS.items():
+            kind = 'counter' if buckets is None else 'histogram'
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            series = sorted(
+                (labels, values) for (metric, labels), values
+                in totals.items() if metric == name)
+            for labels, values in series:
+                pairs = list(zip(label_names, labels))
+                if buckets is None:
+                    lines.append(f'{name}{_labels(pairs)} {values[0]}')
+                    continue
+                count = 0
+                for bound, bucket_count in zip(buckets + ('+Inf',), values):
+                    count += bucket_count
+                    lines.append(f'{name}_bucket'
+                                 f'{_labels(pairs + [("le", bound)])} {count}')
+                lines.append(f'{name}_sum{_labels(pairs)} {values[-1]}')
+                lines.append(f'{name}_count{_labels(pairs)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(pairs):
+    escaped = (
+        str(value).replace('\\', r'\\').replace('"', r'\"')
+        .replace('\n', r'\n')
+        for _, value in pairs
+    )
+    return '{' + ','.join(
+        f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)
+    ) + '}'
+
+
+registry = Registry()
+
+
+class MetricsMiddleware:
+    """Records the metrics of every request"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._observe(request, response, stats, started)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._observe(request, response, stats, started)
+        return response
+
+    def _observe(self, request, response, stats, started):
+        seconds = time.perf_counter() - started
+        stats.over_budget = query_budget.check(request, response, stats)
+
+        match = request.resolver_match
+        registry.observe(
+            match.view_name if match else 'unresolved',
+            request.method if request.method in METHODS else 'other',
+            response.status_code,
+            seconds,
+            stats,
+            None if response.streaming else len(response.content),
+        )
+
+
+def _may_read(request):
+    """Return whether the request comes from a staff user or a scraper
+    holding METRICS_TOKEN"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    token = settings.METRICS_TOKEN
+    header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(
+        header.encode(), f'Bearer {token}'.encode())
+
+
+def metrics_view(request):
+    """Serve the metrics of every worker in the Prometheus text format"""
+    if not _may_read(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Index the recipe M2M through tables from the tag/ingredient side.
+
+    The auto-created unique constraint already covers (recipe_id, tag_id)
+    and (recipe_id, ingredient_id); these serve lookups starting from a tag
+    or ingredient.
+    """
+
+    dependencies = [
+        ('core', '0005_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX core_recipe_tag_tag_recipe_idx '
+            'ON core_recipe_tag (tag_id, recipe_id)',
+            'DROP INDEX core_recipe_tag_tag_recipe_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX core_recipe_ingredients_ingredient_recipe_idx '
+            'ON core_recipe_ingredients (ingredient_id, recipe_id)',
+            'DROP INDEX core_recipe_ingredients_ingredient_recipe_idx',
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+from django.db.models import Count, Min
+from django.db.models.functions import Lower
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Fold tags and ingredients that only differ by case into one row"""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field in (('Tag', 'tag'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, field).through
+        target = Recipe._meta.get_field(field).m2m_reverse_field_name()
+        groups = (model.objects.annotate(name_lower=Lower('name'))
+                  .values('user', 'name_lower')
+                  .annotate(keep=Min('pk'), count=Count('pk'))
+                  .filter(count__gt=1)
+                  .order_by())
+        for group in groups:
+            duplicates = model.objects.annotate(
+                name_lower=Lower('name')
+            ).filter(
+                user=group['user'], name_lower=group['name_lower']
+            ).exclude(pk=group['keep'])
+            duplicate_ids = list(duplicates.values_list('pk', flat=True))
+            links = through.objects.filter(**{f'{target}__in': duplicate_ids})
+            linked = set(through.objects.filter(**{target: group['keep']})
+                         .values_list('recipe_id', flat=True))
+            for recipe_id in set(links.values_list('recipe_id', flat=True)):
+                if recipe_id not in linked:
+                    through.objects.create(
+                        recipe_id=recipe_id, **{f'{target}_id': group['keep']})
+            links.delete()
+            model.objects.filter(pk__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Make tag and ingredient names unique per user, ignoring case.
+
+    Django 3.2 cannot declare a unique constraint on an expression, so the
+    indexes are created here. Duplicates were merged by 0008, which has to
+    commit first: PostgreSQL will not build the index while the deletes'
+    deferred foreign key checks are pending.
+    """
+
+    dependencies = [
+        ('core', '0008_merge_duplicate_names'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX core_tag_user_lower_name_uniq '
+            'ON core_tag (user_id, lower(name))',
+            'DROP INDEX core_tag_user_lower_name_uniq',
+        ),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX core_ingredient_user_lower_name_uniq '
+            'ON core_ingredient (user_id, lower(name))',
+            'DROP INDEX core_ingredient_user_lower_name_uniq',
+        ),
+    ]
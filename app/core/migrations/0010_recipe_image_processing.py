@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:20
+
+import core.models
+from django.db import migrations, models
+
+
+def mark_existing_images_ready(apps, schema_editor):
+    Recipe = apps.get_model('core', 'Recipe')
+    Recipe.objects.exclude(image__isnull=True).exclude(image='').update(
+        image_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_unique_tag_ingredient_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(choices=[('none', 'No image'), ('pending', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='none', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='thumbnail',
+            field=models.ImageField(editable=False, null=True, upload_to=core.models.recipe_thumbnail_file_path),
+        ),
+        migrations.RunPython(
+            mark_existing_images_ready, migrations.RunPython.noop),
+    ]
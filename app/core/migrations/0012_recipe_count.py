@@ -0,0 +1,68 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:38
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_recipes(apps, schema_editor):
+    """Fill in recipe_count of the existing tags and ingredients"""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field in (('Tag', 'tag'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, field).through
+        target = Recipe._meta.get_field(field).m2m_reverse_field_name()
+        counts = (through.objects.filter(**{target: OuterRef('pk')})
+                  .order_by().values(target).annotate(count=Count('*')))
+        model.objects.update(recipe_count=Coalesce(
+            Subquery(counts.values('count')), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_recipe_title_covering_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        # SQLite adds the columns by rebuilding the tables, which drops the
+        # expression indexes of 0009 that Django does not know about
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX IF NOT EXISTS core_tag_user_lower_name_uniq '
+            'ON core_tag (user_id, lower(name))',
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX IF NOT EXISTS '
+            'core_ingredient_user_lower_name_uniq '
+            'ON core_ingredient (user_id, lower(name))',
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-recipe_count', '-id'], name='core_ingredient_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', 'name', 'id'], name='core_ingredient_assigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-recipe_count', '-id'], name='core_tag_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', 'name', 'id'], name='core_tag_assigned_idx'),
+        ),
+        migrations.RunPython(count_recipes, migrations.RunPython.noop),
+    ]
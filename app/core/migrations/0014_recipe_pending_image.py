@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipe_user_updated_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='pending_image',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+    ]
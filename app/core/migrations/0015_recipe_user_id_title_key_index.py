@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 22:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_recipe_pending_image'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='core_recipe_user_id_title_idx',
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'id', 'title'], name='core_recipe_user_id_title_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_recipe_user_id_title_key_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='list_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
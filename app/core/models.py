@@ -1,7 +1,14 @@
-from django.db import models
+from django.db import connections, models
+from django.db.models import (
+    Case, Count, DecimalField, Exists, F, OuterRef, Q, Subquery, Value, When)
+from django.db.models.functions import Cast, Coalesce, Lower
 from django.contrib.auth.models import (
     AbstractBaseUser, BaseUserManager, PermissionsMixin)
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, SearchVectorField)
 from django.conf import settings
+from django.utils import timezone
 
 import uuid
 import os
@@ -11,9 +18,17 @@ def recipe_image_file_path(instance, filename):
     """Generate file path for new recipe image"""
 
     ext = filename.split('.')[-1]
-    filename = f"{uuid.uuid4}.{ext}"
+    filename = f"{uuid.uuid4()}.{ext}"
     return os.path.join('uploads/recipe/', filename)
 
+
+def recipe_thumbnail_file_path(instance, filename):
+    """Generate file path for new recipe thumbnail"""
+
+    ext = filename.split('.')[-1]
+    filename = f"{uuid.uuid4()}.{ext}"
+    return os.path.join('uploads/recipe/thumbnails/', filename)
+
 class UserManager(BaseUserManager):
 
     def create_user(self, email, password=None, **extra_fields):
@@ -44,28 +59,238 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Bumped by every write to the user's recipes, tags or ingredients,
+    # see recipe.signals.invalidate_user
+    list_version = models.PositiveBigIntegerField(default=0, editable=False)
 
     objects = UserManager()
     USERNAME_FIELD = 'email'
 
 
-class Tag(models.Model):
+class UserNameQuerySet(models.QuerySet):
+    """Queryset for tags and ingredients, whose names are unique per user
+    ignoring case (see migration 0009)"""
+
+    def get_or_create_names(self, user, names):
+        """Return {lowercased name: (id, stored name)} for names, creating
+        the ones the user does not have yet.
+
+        On PostgreSQL this is a single INSERT ... ON CONFLICT statement
+        that also returns the rows that already existed. The database
+        matches each given name to its row with its own lower(), which does
+        not always agree with str.lower(), so the rows are keyed on the
+        names they were matched with rather than on their stored names.
+        """
+        unique = {}
+        for name in names:
+            unique.setdefault(name.lower(), name)
+        if not unique:
+            return {}
+        if connections[self.db].vendor == 'postgresql':
+            found = self._upsert_names(user, list(unique.values()))
+            if len(found) < len(unique):
+                # A concurrent transaction inserted some of the names after
+                # our snapshot was taken; they are visible on a retry.
+                found = self._upsert_names(user, list(unique.values()))
+        else:
+            self.bulk_create(
+                [self.model(user=user, name=name) for name in unique.values()],
+                ignore_conflicts=True,
+            )
+            given = Case(*(
+                When(name_lower=Lower(Value(name)), then=Value(name))
+                for name in unique.values()), output_field=models.TextField())
+            found = (self.annotate(name_lower=Lower('name'), given=given)
+                     .filter(user=user, given__isnull=False)
+                     .values_list('given', 'pk', 'name'))
+        return {given.lower(): (pk, name) for given, pk, name in found}
+
+    def _recipe_links(self):
+        """Return the through model to recipes and its column for self"""
+        relation = self.model._meta.get_field('recipe')
+        return relation.through, relation.field.m2m_reverse_field_name()
+
+    def change_recipe_count(self, delta):
+        """Add delta to the recipe count of the selected rows"""
+        return self.update(recipe_count=F('recipe_count') + delta)
+
+    def refresh_recipe_count(self):
+        """Recount the recipes of the selected rows.
+
+        Only rows whose stored count is wrong are written; returns how many
+        there were.
+        """
+        through, target = self._recipe_links()
+        counts = (through.objects.filter(**{target: OuterRef('pk')})
+                  .order_by().values(target).annotate(count=Count('*')))
+        actual = Coalesce(Subquery(counts.values('count')), 0)
+        wrong = self.annotate(actual=actual).exclude(
+            recipe_count=F('actual'))
+        return self.model._base_manager.using(self.db).filter(
+            pk__in=wrong.values('pk')).update(recipe_count=actual)
+
+    def _upsert_names(self, user, names):
+        table = connections[self.db].ops.quote_name(self.model._meta.db_table)
+        sql = f"""
+            WITH input (name) AS (
+                SELECT n FROM unnest(%s::text[]) AS n
+            ), inserted AS (
+                INSERT INTO {table} (user_id, name, updated_at, recipe_count)
+                SELECT DISTINCT ON (lower(name)) %s, name, now(), 0 FROM input
+                ON CONFLICT (user_id, lower(name)) DO NOTHING
+                RETURNING id, name
+            ), stored AS (
+                SELECT id, name FROM inserted
+                UNION ALL
+                SELECT t.id, t.name FROM {table} t
+                JOIN (SELECT DISTINCT lower(name) AS name FROM input) i
+                    ON lower(t.name) = i.name
+                WHERE t.user_id = %s
+            )
+            SELECT i.name, s.id, s.name FROM input i
+            JOIN stored s ON lower(s.name) = lower(i.name)
+        """
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, [names, user.pk, user.pk])
+            return cursor.fetchall()
+
+
+class RecipeCountModel(models.Model):
+    """Base of tags and ingredients, which count the recipes using them"""
+    # Maintained by core.signals with UPDATE statements and rebuilt by
+    # manage.py repair_recipe_counts
+    recipe_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        """Save the row without writing back a stale recipe_count"""
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'recipe_count'
+            ]
+        super().save(*args, **kwargs)
+
+
+def _recipe_count_indexes(prefix):
+    """Return the indexes behind popularity ordering and assigned_only"""
+    return [
+        models.Index(fields=['user', '-recipe_count', '-id'],
+                     name=f'{prefix}_popular_idx'),
+        models.Index(fields=['user', 'name', 'id'],
+                     condition=Q(recipe_count__gt=0),
+                     name=f'{prefix}_assigned_idx'),
+    ]
+
+
+class Tag(RecipeCountModel):
     """Tag to be used for a recipe"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = UserNameQuerySet.as_manager()
+
+    class Meta:
+        # Serves the per-user keyset pagination ordered by name
+        indexes = [
+            models.Index(fields=['user', 'name', 'id']),
+        ] + _recipe_count_indexes('core_tag')
 
     def __str__(self):
         return self.name
 
 
-class Ingredient(models.Model):
+class Ingredient(RecipeCountModel):
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = UserNameQuerySet.as_manager()
+
+    class Meta:
+        # Serves the per-user keyset pagination ordered by name
+        indexes = [
+            models.Index(fields=['user', 'name', 'id']),
+        ] + _recipe_count_indexes('core_ingredient')
 
     def __str__(self):
         return self.name
 
 
+def _related_names(model):
+    """Return a subquery joining the names of a recipe's tags or ingredients"""
+    names = model.objects.filter(recipe=OuterRef('pk')).values('recipe')
+    names = names.annotate(names=StringAgg('name', delimiter=' '))
+    return Coalesce(Subquery(names.values('names')), Value(''))
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    search_config = 'english'
+
+    def _supports_full_text(self):
+        return connections[self.db].vendor == 'postgresql'
+
+    def _search_type(self):
+        # websearch_to_tsquery arrived in PostgreSQL 11; older servers
+        # match all the words instead, without quotes, "or" and "-"
+        if connections[self.db].pg_version < 110000:
+            return 'plain'
+        return 'websearch'
+
+    def touch(self):
+        """Mark the selected recipes as changed"""
+        return self.update(updated_at=timezone.now())
+
+    def update_search_vector(self):
+        """Recompute the stored search document of the selected recipes"""
+        if not self._supports_full_text():
+            return 0
+        config = self.search_config
+        return self.update(search_vector=(
+            SearchVector('title', weight='A', config=config) +
+            SearchVector(_related_names(Tag), weight='B', config=config) +
+            SearchVector(
+                _related_names(Ingredient), weight='B', config=config)
+        ))
+
+    def filter_related(self, field, ids, match_all=False):
+        """Filter recipes linked to any, or all, of the given related ids.
+
+        Each condition is an EXISTS subquery against the M2M through table,
+        which avoids the row fan-out and DISTINCT of filtering over a join.
+        """
+        relation = self.model._meta.get_field(field)
+        links = relation.remote_field.through.objects.filter(
+            **{relation.m2m_field_name(): OuterRef('pk')})
+        target = relation.m2m_reverse_field_name()
+        if not match_all:
+            return self.filter(Exists(links.filter(**{f'{target}__in': ids})))
+        queryset = self
+        for pk in set(ids):
+            queryset = queryset.filter(Exists(links.filter(**{target: pk})))
+        return queryset
+
+    def search(self, text):
+        """Filter recipes matching text and annotate them with search_rank.
+
+        The rank is rounded to a fixed precision decimal, which a pagination
+        cursor holds exactly, unlike a float.
+        """
+        rank_field = DecimalField(max_digits=16, decimal_places=8)
+        if not self._supports_full_text():
+            # Development databases have no tsvector support
+            return self.filter(title__icontains=text).annotate(
+                search_rank=Cast(Value(0), rank_field))
+        query = SearchQuery(
+            text, search_type=self._search_type(), config=self.search_config)
+        return self.filter(search_vector=query).annotate(search_rank=Cast(
+            SearchRank(F('search_vector'), query), rank_field))
+
+
 class Recipe(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
 
@@ -76,6 +301,48 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField("Ingredient")
     tag = models.ManyToManyField("Tag")
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    thumbnail = models.ImageField(
+        null=True, editable=False, upload_to=recipe_thumbnail_file_path)
+    IMAGE_NONE = 'none'
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = (
+        (IMAGE_NONE, 'No image'),
+        (IMAGE_PENDING, 'Processing'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    )
+    # Progress of the background processing of the last uploaded image
+    image_status = models.CharField(
+        max_length=10, choices=IMAGE_STATUS_CHOICES, default=IMAGE_NONE,
+        editable=False)
+    # Storage name of the upload being processed, kept to queue it again
+    # when its job is lost, see recipe.images.requeue_stale
+    pending_image = models.CharField(
+        max_length=255, blank=True, editable=False)
+    # Maintained by core.signals, indexed with GIN on PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Also touched by core.signals when tags or ingredients change
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        # Serves the per-user keyset pagination ordered by id. The title is
+        # a trailing key column rather than an INCLUDE column, which needs
+        # PostgreSQL 11, so ?fields=id,title lists are answered by an
+        # index-only scan on every supported version.
+        indexes = [
+            models.Index(
+                fields=['user', 'id', 'title'],
+                name='core_recipe_user_id_title_idx'),
+            # Answers the count and latest change of a user's recipes behind
+            # the list ETags with an index-only scan
+            models.Index(
+                fields=['user', 'updated_at'],
+                name='core_recipe_user_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -0,0 +1,86 @@
+"""The OpenAPI schema of the API, generated once at build time.
+
+``manage.py generate_schema`` writes the schema to OPENAPI_SCHEMA_FILE,
+which the Docker image does while it is built. The file sits in a static
+files directory, so collectstatic copies it where the proxy serves it on
+/openapi.json without reaching the app. Behind no proxy, schema_view
+serves the same file, read once per process, or generates it once when it
+was not built. Either way it is sent with a Cache-Control max-age of
+OPENAPI_CACHE_SECONDS, and the Swagger UI and ReDoc pages load it from
+there instead of introspecting every serializer on each visit.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import etag
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.generators import OpenAPISchemaGenerator
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+
+INFO = openapi.Info(
+    title="RECIPE API",
+    default_version="v1",
+    description="Recipe API with TDD",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="hello@example.com"),
+    license=openapi.License(name="BSD License"),
+)
+
+# path: (content, etag) of the schema files read by this process
+_loaded = {}
+
+
+def generate():
+    """Return the public schema of every endpoint as JSON bytes"""
+    # Views read query parameters while they are introspected; an empty
+    # url leaves the host out, so clients use the one they fetched from
+    request = APIView().initialize_request(APIRequestFactory().get('/'))
+    generator = OpenAPISchemaGenerator(INFO, url='')
+    schema = generator.get_schema(request, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def write(path):
+    """Generate the schema into path, replacing any previous file at once"""
+    content = generate()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        os.chmod(temp, 0o644)
+        os.replace(temp, path)
+    except BaseException:
+        os.unlink(temp)
+        raise
+    return content
+
+
+def load():
+    """Return the built schema and its ETag, generating it when missing"""
+    path = str(settings.OPENAPI_SCHEMA_FILE)
+    if path not in _loaded:
+        try:
+            with open(path, 'rb') as file:
+                content = file.read()
+        except FileNotFoundError:
+            content = generate()
+        _loaded[path] = content, hashlib.md5(content).hexdigest()
+    return _loaded[path]
+
+
+@etag(lambda request: load()[1])
+def schema_view(request):
+    """Serve the OpenAPI schema built with the generate_schema command"""
+    response = HttpResponse(load()[0], content_type='application/json')
+    patch_cache_control(
+        response, public=True, max_age=settings.OPENAPI_CACHE_SECONDS)
+    return response
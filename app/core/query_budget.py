@@ -0,0 +1,87 @@
+"""Per-view limits on the number of SQL queries of a request.
+
+A view declares its budgets in a query_budgets attribute keyed by action,
+for example ``query_budgets = {'list': 4}`` on a viewset, or by lowercase
+method name on other class-based views; a function view wrapping one of
+those names it in its query_budget_view attribute. MetricsMiddleware
+counts the queries of each request and checks them here once the
+response is ready. Budgets cover the API's own formats, not the pages of
+the browsable API.
+
+A request over its budget is logged as a warning listing the fingerprints
+of its queries, most repeated first, where an N+1 pattern stands out as
+one statement run once per row, and is counted in the request metrics.
+With QUERY_BUDGET_STRICT, which core.tests.runner turns on for the test
+suite, it raises QueryBudgetExceeded instead, failing the test that made
+the request.
+"""
+import logging
+import re
+from collections import Counter
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|%\(\w+\)s')
+_VALUES = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request ran more queries than its view allows"""
+
+
+def fingerprint(sql):
+    """Return sql with its values and the length of value lists erased"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _VALUES.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def budget_for(request):
+    """Return (view label, budget) of the request's view, or None"""
+    match = request.resolver_match
+    # Views wrapping another one, like the async views, name it
+    view = getattr(match and match.func, 'query_budget_view',
+                   match and match.func)
+    view_class = getattr(view, 'cls', None)
+    budgets = getattr(view_class, 'query_budgets', None)
+    if not budgets:
+        return None
+    method = request.method.lower()
+    # Viewsets map methods to actions, other views handle them by name
+    actions = getattr(view, 'actions', None)
+    name = actions.get(method) if actions else method
+    if name not in budgets:
+        return None
+    return f'{view_class.__name__}.{name}', budgets[name]
+
+
+def check(request, response, stats):
+    """Return whether the request exceeded its view's query budget,
+    raising QueryBudgetExceeded instead in strict mode"""
+    # Browsable API pages also list the choices of their forms' fields
+    renderer = getattr(response, 'accepted_renderer', None)
+    if getattr(renderer, 'format', None) == 'api':
+        return False
+    found = budget_for(request)
+    if found is None or stats.queries <= found[1]:
+        return False
+    label, budget = found
+    fingerprints = Counter(fingerprint(sql) for sql in stats.statements)
+    message = (
+        f'{label} ran {stats.queries} queries, budget {budget}: '
+        f'{request.method} {request.path}\n' + '\n'.join(
+            f'{count:5} x {sql}' for sql, count in fingerprints.most_common()))
+    if settings.QUERY_BUDGET_STRICT:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message, extra={
+        'query_budget': budget, 'queries': stats.queries,
+        'fingerprints': dict(fingerprints)})
+    return True
@@ -0,0 +1,102 @@
+"""Routing of API reads to read replicas.
+
+Views using ReplicaReadMixin serve GET, HEAD and OPTIONS requests from a
+replica, chosen at random among settings.DATABASE_REPLICAS. Everything
+else, including authentication and any request outside those views, uses
+the primary.
+
+Replicas lag behind the primary, so a user who has just written would not
+always see the change. Every successful write through the views pins the
+user's reads to the primary for REPLICA_PIN_SECONDS. The pin is kept in the
+shared cache under the user's id, so it holds whichever worker process or
+host serves the next request, whatever the client. It is also sent back as
+a signed cookie naming the user, which keeps it when the cache loses it and
+spares the cache lookup for clients that send cookies.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+
+
+PIN_KEY = 'replica:pin:{user_id}'
+PIN_COOKIE = 'replica_pin'
+PIN_SALT = 'core.replicas.pin'
+
+# The alias reads go to for the request being handled, None for default
+_read_database = ContextVar('read_database', default=None)
+
+
+def choose_replica():
+    """Return the alias of a replica to read from, or None without any"""
+    if not settings.DATABASE_REPLICAS:
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def pin(response, user_id):
+    """Send the user's reads to the primary for REPLICA_PIN_SECONDS"""
+    # The cache rounds timeouts to seconds, so the end is stored as well
+    cache.set(PIN_KEY.format(user_id=user_id),
+              time.time() + settings.REPLICA_PIN_SECONDS,
+              settings.REPLICA_PIN_SECONDS + 1)
+    response.set_signed_cookie(
+        PIN_COOKIE, user_id, salt=PIN_SALT,
+        max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+
+
+def is_pinned(request, user_id):
+    """Return whether the user's reads are pinned to the primary"""
+    pinned = request.get_signed_cookie(
+        PIN_COOKIE, default=None, salt=PIN_SALT,
+        max_age=settings.REPLICA_PIN_SECONDS)
+    if pinned == str(user_id):
+        return True
+    until = cache.get(PIN_KEY.format(user_id=user_id))
+    return until is not None and until > time.time()
+
+
+class ReplicaRouter:
+    """Sends reads to the replica picked for the current request"""
+
+    def db_for_read(self, model, **hints):
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+
+class ReplicaReadMixin:
+    """Serves the safe requests of an API view from a replica"""
+
+    def dispatch(self, request, *args, **kwargs):
+        token = _read_database.set(None)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _read_database.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        # Authenticates and checks permissions on the primary
+        super().initial(request, *args, **kwargs)
+        user = request.user
+        if request.method not in SAFE_METHODS:
+            self._writer_id = user.pk if user.is_authenticated else None
+        elif not (user.is_authenticated and is_pinned(request, user.pk)):
+            _read_database.set(choose_replica())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Pinned once the write is done, so the window starts at its commit.
+        # A rejected write changed nothing there is to read back.
+        if getattr(self, '_writer_id', None) is not None and \
+                status.is_success(response.status_code):
+            pin(response, self._writer_id)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,161 @@
+from collections import Counter
+
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete)
+from django.dispatch import receiver
+
+from core import metrics
+from core.models import Ingredient, Recipe, Tag
+
+
+@receiver(connection_created)
+def count_request_queries(sender, connection, **kwargs):
+    """Count the queries of every connection in the request metrics"""
+    # Sent again on reconnects of the same connection object
+    if metrics.record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(metrics.record_query)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, raw=False, **kwargs):
+    """Refresh the search document after a recipe is saved"""
+    if not raw:
+        Recipe.objects.filter(pk=instance.pk).update_search_vector()
+
+
+def _changed_recipe_ids(sender, instance, action, reverse, pk_set):
+    """Return the ids of the recipes affected by an m2m_changed signal"""
+    if not reverse:
+        return {instance.pk}
+    if action == 'pre_clear':
+        # Remember the recipes before the through rows are gone
+        field = 'tag' if sender is Recipe.tag.through else 'ingredients'
+        instance._cleared_recipe_ids = set(
+            Recipe.objects.filter(**{field: instance})
+            .values_list('pk', flat=True)
+        )
+    if action == 'post_clear':
+        return instance.__dict__.pop('_cleared_recipe_ids', set())
+    return set(pk_set or ())
+
+
+@receiver(m2m_changed, sender=Recipe.tag.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_recipes_on_relation_change(sender, instance, action,
+                                      reverse, pk_set, **kwargs):
+    """Refresh recipes whose tags or ingredients changed"""
+    recipe_ids = _changed_recipe_ids(
+        sender, instance, action, reverse, pk_set)
+    if action in ('post_add', 'post_remove', 'post_clear') and recipe_ids:
+        recipes = Recipe.objects.filter(pk__in=recipe_ids)
+        recipes.touch()
+        recipes.update_search_vector()
+
+
+@receiver(post_save, sender=Tag)
+def update_recipes_on_tag_rename(sender, instance, created,
+                                 raw=False, **kwargs):
+    """Refresh the recipes using a renamed tag"""
+    if not created and not raw:
+        recipes = Recipe.objects.filter(tag=instance)
+        recipes.touch()
+        recipes.update_search_vector()
+
+
+@receiver(post_save, sender=Ingredient)
+def update_recipes_on_ingredient_rename(sender, instance, created,
+                                        raw=False, **kwargs):
+    """Refresh the recipes using a renamed ingredient"""
+    if not created and not raw:
+        recipes = Recipe.objects.filter(ingredients=instance)
+        recipes.touch()
+        recipes.update_search_vector()
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def remember_recipes_on_delete(sender, instance, **kwargs):
+    """Remember the recipes of a tag or ingredient before its links go"""
+    field = 'tag' if sender is Tag else 'ingredients'
+    instance._deleted_recipe_ids = list(
+        Recipe.objects.filter(**{field: instance})
+        .values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def update_recipes_on_delete(sender, instance, **kwargs):
+    """Refresh the recipes that used a deleted tag or ingredient"""
+    recipe_ids = instance.__dict__.pop('_deleted_recipe_ids', None)
+    if recipe_ids:
+        recipes = Recipe.objects.filter(pk__in=recipe_ids)
+        recipes.touch()
+        recipes.update_search_vector()
+
+
+# The recipe relation behind each through table, and the model it counts
+COUNTED_RELATIONS = {
+    Recipe.tag.through: ('tag', Tag),
+    Recipe.ingredients.through: ('ingredients', Ingredient),
+}
+
+
+def _link_counts(sender, recipe_ids=None, counted_ids=None):
+    """Return {tag or ingredient id: links} among the given through rows"""
+    field = Recipe._meta.get_field(COUNTED_RELATIONS[sender][0])
+    source = field.m2m_field_name()
+    target = field.m2m_reverse_field_name()
+    links = sender.objects.all()
+    if recipe_ids is not None:
+        links = links.filter(**{f'{source}__in': recipe_ids})
+    if counted_ids is not None:
+        links = links.filter(**{f'{target}__in': counted_ids})
+    return Counter(links.values_list(f'{target}_id', flat=True))
+
+
+def _change_recipe_counts(model, counts, sign):
+    """Apply {id: links} to recipe_count, one UPDATE per distinct amount"""
+    by_amount = {}
+    for pk, amount in counts.items():
+        by_amount.setdefault(amount, []).append(pk)
+    for amount, pks in by_amount.items():
+        model.objects.filter(pk__in=pks).change_recipe_count(sign * amount)
+
+
+@receiver(m2m_changed, sender=Recipe.tag.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_recipe_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep recipe_count of tags and ingredients in step with their links"""
+    model = COUNTED_RELATIONS[sender][1]
+    if action == 'post_add' and pk_set:
+        if reverse:
+            counts = Counter({instance.pk: len(pk_set)})
+        else:
+            counts = Counter(pk_set)
+        _change_recipe_counts(model, counts, 1)
+    elif action in ('pre_remove', 'pre_clear'):
+        # Django sends every requested id on remove, linked or not, so the
+        # links are counted before they are deleted
+        if reverse:
+            counts = _link_counts(
+                sender, recipe_ids=pk_set, counted_ids=[instance.pk])
+        else:
+            counts = _link_counts(
+                sender, recipe_ids=[instance.pk], counted_ids=pk_set)
+        instance.__dict__.setdefault('_removed_links', {})[sender] = counts
+    elif action in ('post_remove', 'post_clear'):
+        counts = instance.__dict__.get('_removed_links', {}).pop(
+            sender, Counter())
+        _change_recipe_counts(model, counts, -1)
+
+
+@receiver(pre_delete, sender=Recipe)
+def update_recipe_counts_on_delete(sender, instance, **kwargs):
+    """Uncount a recipe that is being deleted with its through rows.
+
+    Runs inside the transaction of the delete, before the rows go.
+    """
+    for through, (_, model) in COUNTED_RELATIONS.items():
+        _change_recipe_counts(
+            model, _link_counts(through, recipe_ids=[instance.pk]), -1)
@@ -0,0 +1,53 @@
+import os
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+from core import caches
+
+
+LOCMEM = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+MEMCACHED = {'default': {
+    'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'LOCATION': 'cache:11211'}}
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    """Test refusing to start several workers on a process-local cache"""
+
+    def _workers(self, count):
+        return mock.patch.dict(os.environ, {'WEB_CONCURRENCY': str(count)})
+
+    @override_settings(CACHES=LOCMEM)
+    def test_local_cache_several_workers(self):
+        """Test a local memory cache fails with several workers"""
+        with self._workers(4), \
+                self.assertRaisesMessage(ImproperlyConfigured,
+                                         '4 worker processes'):
+            caches.check_shared()
+
+    @override_settings(CACHES=LOCMEM)
+    def test_local_cache_single_worker(self):
+        """Test a local memory cache is fine with a single worker"""
+        with self._workers(1):
+            caches.check_shared()
+        with mock.patch.dict(os.environ, clear=True):
+            self.assertEqual(caches.worker_processes(), 1)
+            caches.check_shared()
+
+    @override_settings(CACHES=MEMCACHED)
+    def test_shared_cache_several_workers(self):
+        """Test a shared cache is fine with several workers"""
+        with self._workers(4):
+            caches.check_shared()
+
+    @override_settings(CACHES=LOCMEM)
+    def test_uwsgi_processes(self):
+        """Test under uWSGI its number of processes is used"""
+        uwsgi = mock.Mock(numproc=2)
+        with mock.patch.dict('sys.modules', {'uwsgi': uwsgi}), \
+                self._workers(1), \
+                self.assertRaises(ImproperlyConfigured):
+            caches.check_shared()
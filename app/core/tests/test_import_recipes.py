@@ -0,0 +1,173 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.renderers import CSVRenderer
+
+
+class ImportRecipesTests(TestCase):
+    """Test the import_recipes command"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'import@joseph.com',
+            'testPASS'
+        )
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def _write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def _ndjson(self, rows):
+        return self._write(
+            'recipes.ndjson', ''.join(json.dumps(row) + '\n' for row in rows))
+
+    def _import(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_recipes', path, '--user', self.user.email,
+                     *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_ndjson(self):
+        """Test importing recipes with their tags and ingredients"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        path = self._ndjson([
+            {'title': 'Curry', 'time_minutes': 30, 'price': '7.50',
+             'tag': ['vegan', 'Dinner'], 'ingredients': ['Rice']},
+            {'title': 'Toast', 'time_minutes': 2, 'price': 1},
+        ])
+
+        out, _ = self._import(path, '--batch-size', '1')
+
+        curry = Recipe.objects.get(user=self.user, title='Curry')
+        self.assertEqual(str(curry.price), '7.50')
+        self.assertEqual(curry.link, '')
+        self.assertEqual(
+            sorted(curry.tag.values_list('name', flat=True)),
+            ['Dinner', 'Vegan'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(
+            list(curry.ingredients.values_list('name', flat=True)), ['Rice'])
+        self.assertTrue(
+            Recipe.objects.filter(user=self.user, title='Toast').exists())
+        self.assertEqual(list(Recipe.objects.search('curry')), [curry])
+        self.assertIn('Imported 2 recipes', out)
+
+    def test_import_csv_export(self):
+        """Test importing the CSV export format"""
+        path = self._write(
+            'recipes.csv',
+            'id,title,time_minutes,price,link,ingredients,tag\n'
+            '9,"Curry, hot",30,7.50,,Rice|Peas,Vegan\n'
+        )
+
+        self._import(path)
+
+        curry = Recipe.objects.get(user=self.user)
+        self.assertEqual(curry.title, 'Curry, hot')
+        self.assertEqual(curry.ingredients.count(), 2)
+        self.assertEqual(curry.tag.get().name, 'Vegan')
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(), 2)
+
+    def test_import_csv_undoes_formula_escaping(self):
+        """Test cells escaped by the CSV export are imported as they were"""
+        titles = ['=1+1', "'quoted", '-', 'Plain']
+        path = self._write('recipes.csv', CSVRenderer().render([
+            {'title': title, 'time_minutes': 1, 'price': '1.00',
+             'tag': '@home'}
+            for title in titles]).decode())
+
+        self._import(path)
+
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('title', flat=True)),
+            sorted(titles))
+        self.assertEqual(Tag.objects.get(user=self.user).name, '@home')
+
+    def test_import_rejects_invalid_rows(self):
+        """Test invalid rows are reported and the rest imported"""
+        path = self._ndjson([
+            {'title': 'Good', 'time_minutes': 1, 'price': 1},
+            {'title': '', 'time_minutes': 'soon', 'price': 1},
+            {'title': 'Nobody', 'time_minutes': 1, 'price': 1,
+             'user': 'missing@joseph.com'},
+        ])
+
+        out, err = self._import(path)
+
+        self.assertEqual(
+            list(Recipe.objects.values_list('title', flat=True)), ['Good'])
+        self.assertIn('Row 2:', err)
+        self.assertIn('Row 3: User missing@joseph.com does not exist.', err)
+        self.assertIn('rejected 2 rows', out)
+
+    def test_import_row_owner(self):
+        """Test rows can name their owner by email"""
+        other = get_user_model().objects.create_user(
+            'other@joseph.com',
+            'testPASS'
+        )
+        path = self._ndjson([
+            {'title': 'Theirs', 'time_minutes': 1, 'price': 1,
+             'user': other.email, 'tag': ['Vegan']},
+        ])
+
+        self._import(path)
+
+        recipe = Recipe.objects.get(title='Theirs')
+        self.assertEqual(recipe.user, other)
+        self.assertEqual(recipe.tag.get().user, other)
+
+    def test_import_resumes_from_checkpoint(self):
+        """Test a rerun continues after the last imported row"""
+        path = self._ndjson([
+            {'title': f'Recipe {i}', 'time_minutes': 1, 'price': 1}
+            for i in range(3)
+        ])
+        with open(path + '.checkpoint', 'w') as f:
+            json.dump({'source': path, 'rows': 1}, f)
+
+        out, _ = self._import(path)
+
+        self.assertIn('Resuming after row 1', out)
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('title', flat=True)),
+            ['Recipe 1', 'Recipe 2'])
+
+    def test_import_redoes_uncommitted_batch(self):
+        """Test a batch is imported again when it never committed"""
+        path = self._ndjson([
+            {'title': f'Recipe {i}', 'time_minutes': 1, 'price': 1}
+            for i in range(2)
+        ])
+        with open(path + '.checkpoint', 'w') as f:
+            json.dump({'source': path, 'rows': 0,
+                       'pending': {'rows': 2, 'recipe': 10 ** 9}}, f)
+
+        self._import(path)
+
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_import_refuses_completed_file(self):
+        """Test a finished import is not repeated without --restart"""
+        path = self._ndjson([{'title': 'Once', 'time_minutes': 1, 'price': 1}])
+        self._import(path)
+
+        with self.assertRaises(CommandError):
+            self._import(path)
+        self._import(path, '--restart')
+
+        self.assertEqual(Recipe.objects.filter(title='Once').count(), 2)
@@ -0,0 +1,113 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import LiveServerTestCase, SimpleTestCase, override_settings
+
+from core import loadtest
+from core.management.commands.loadtest import ROUTES
+
+
+def summary(rps=100, p50=10, p95=20, p99=30, errors=0):
+    return {'requests': 100, 'errors': errors, 'rps': rps,
+            'p50': p50, 'p95': p95, 'p99': p99}
+
+
+class LoadTestCommandTests(LiveServerTestCase):
+    """Test the loadtest command against a live server"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.baseline = os.path.join(self.directory.name, 'baseline.json')
+        # Images are processed right away, into the temporary directory
+        settings_override = override_settings(
+            MEDIA_ROOT=self.directory.name, RECIPE_IMAGE_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _loadtest(self, *routes, **options):
+        out = StringIO()
+        call_command('loadtest', *routes, url=self.live_server_url,
+                     requests=3, concurrency=1, baseline=self.baseline,
+                     stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_every_route_measured(self):
+        """Test every route answers as expected and the run cleans up"""
+        self._loadtest(save=True)
+
+        with open(self.baseline) as f:
+            baseline = json.load(f)
+        self.assertEqual(sorted(baseline['routes']), sorted(ROUTES))
+        for route, result in baseline['routes'].items():
+            self.assertEqual(result['errors'], 0, route)
+            self.assertEqual(result['requests'], 3, route)
+            self.assertGreater(result['rps'], 0, route)
+            self.assertLessEqual(result['p50'], result['p99'], route)
+        self.assertFalse(get_user_model().objects.filter(
+            email='loadtest@example.com').exists())
+
+    def test_regression_fails(self):
+        """Test results far behind the baseline make the command fail"""
+        with open(self.baseline, 'w') as f:
+            json.dump({'concurrency': 1, 'requests': 3, 'routes': {
+                'me': summary(rps=10 ** 6, p50=0.001, p95=0.001, p99=0.001),
+            }}, f)
+
+        with self.assertRaisesMessage(CommandError, 'regressions'):
+            self._loadtest('me')
+
+    def test_within_tolerance_passes(self):
+        """Test results matching the baseline pass"""
+        with open(self.baseline, 'w') as f:
+            json.dump({'concurrency': 1, 'requests': 3, 'routes': {
+                'me': summary(rps=1, p50=10 ** 6, p95=10 ** 6, p99=10 ** 6),
+            }}, f)
+
+        self.assertIn('No regressions', self._loadtest('me'))
+
+    def test_unknown_route_rejected(self):
+        """Test naming a route that is not measured is an error"""
+        with self.assertRaises(CommandError):
+            self._loadtest('recipe-export')
+
+
+class CompareTests(SimpleTestCase):
+    """Test comparing results with a baseline"""
+
+    def _regressed(self, before, after):
+        return {(metric, regressed) for _, metric, _, _, _, regressed
+                in loadtest.compare({'me': before}, {'me': after}, 0.2)
+                if regressed}
+
+    def test_slower_is_regression(self):
+        """Test higher latency and lower throughput beyond tolerance"""
+        regressed = self._regressed(
+            summary(), summary(rps=70, p50=11, p95=25, p99=40))
+
+        self.assertEqual(regressed, {('rps', True), ('p95', True),
+                                     ('p99', True)})
+
+    def test_new_errors_are_regression(self):
+        """Test any new failed request counts as a regression"""
+        self.assertEqual(self._regressed(summary(), summary(errors=1)),
+                         {('errors', True)})
+
+    def test_routes_missing_from_baseline_skipped(self):
+        """Test routes without a baseline are not compared"""
+        self.assertEqual(loadtest.compare({}, {'me': summary()}, 0.2), [])
+
+    def test_percentiles(self):
+        """Test percentiles are taken from the sorted latencies"""
+        result = loadtest.summarize(
+            [i / 1000 for i in range(100, 0, -1)], 2, 1)
+
+        self.assertEqual(result['requests'], 102)
+        self.assertEqual((result['p50'], result['p95'], result['p99']),
+                         (50, 95, 99))
+        self.assertEqual(result['rps'], 100)
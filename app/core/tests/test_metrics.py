@@ -0,0 +1,237 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.models import Recipe, Tag
+from recipe.views import RecipeViewSet
+
+
+METRICS_URL = reverse('metrics')
+TAGS_URL = reverse('recipe:tag-list')
+RECIPES_URL = reverse('recipe:recipe-list')
+ASYNC_RECIPES_URL = reverse('recipe:async-recipe-list')
+METRICS_TOKEN = 'scrape-token'
+
+
+@override_settings(METRICS_TOKEN=METRICS_TOKEN)
+class MetricsTests(TestCase):
+    """Test the request metrics and their /metrics endpoint"""
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'metrics@joseph.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Curry {i}', time_minutes=i,
+                price=Decimal('7.5'))
+            recipe.tag.add(tag)
+
+    def _metrics(self):
+        """Return {series: value} from the /metrics endpoint"""
+        res = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION=f'Bearer {METRICS_TOKEN}')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'], metrics.CONTENT_TYPE)
+        values = {}
+        for line in res.content.decode().splitlines():
+            if not line.startswith('#'):
+                series, value = line.rsplit(' ', 1)
+                values[series] = float(value)
+        return values
+
+    def test_counts_responses_by_view(self):
+        """Test responses are counted by view name, method and status"""
+        sizes = [len(self.client.get(TAGS_URL).content) for _ in range(2)]
+        self.client.post(TAGS_URL, {'name': ''})
+
+        values = self._metrics()
+
+        labels = '{view="recipe:tag-list",method="GET"'
+        self.assertEqual(
+            values['http_requests_total' + labels + ',status="200"}'], 2)
+        self.assertEqual(values[
+            'http_requests_total{view="recipe:tag-list",method="POST",'
+            'status="400"}'], 1)
+        self.assertEqual(
+            values['http_request_duration_seconds_count' + labels + '}'], 2)
+        self.assertEqual(values['http_request_duration_seconds_bucket'
+                                + labels + ',le="+Inf"}'], 2)
+        self.assertEqual(
+            values['http_response_size_bytes_sum' + labels + '}'], sum(sizes))
+
+    def test_counts_queries(self):
+        """Test the queries of a request are counted"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(RECIPES_URL)
+        # Read before the next request resets the query log
+        count = len(queries)
+
+        values = self._metrics()
+
+        labels = '{view="recipe:recipe-list",method="GET"}'
+        self.assertEqual(values['http_request_queries_sum' + labels], count)
+        self.assertGreater(
+            values['http_request_query_seconds_sum' + labels], 0)
+
+    def test_records_serializer_time(self):
+        """Test building serializer data is timed, fast path included"""
+        self.client.get(RECIPES_URL)
+        with override_settings(FAST_LIST_RENDERING=True):
+            self.client.get(RECIPES_URL, {'page_size': 2})
+
+        values = self._metrics()
+
+        labels = '{view="recipe:recipe-list",method="GET"}'
+        self.assertEqual(
+            values['http_request_serializer_seconds_count' + labels], 2)
+        self.assertGreater(
+            values['http_request_serializer_seconds_sum' + labels], 0)
+
+    def test_unresolved_requests(self):
+        """Test requests matching no view share one label"""
+        self.client.get('/no/such/page/')
+
+        values = self._metrics()
+
+        self.assertEqual(values[
+            'http_requests_total{view="unresolved",method="GET",'
+            'status="404"}'], 1)
+
+    def test_adds_up_worker_files(self):
+        """Test /metrics adds up the files of every worker"""
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_DIR=directory):
+            with open(os.path.join(directory, 'metrics-1-1.json'), 'w') as f:
+                json.dump([['http_requests_total',
+                            ['recipe:tag-list', 'GET', '200'], [5]]], f)
+            self.client.get(TAGS_URL)
+
+            values = self._metrics()
+            files = sorted(os.listdir(directory))
+
+        self.assertEqual(values[
+            'http_requests_total{view="recipe:tag-list",method="GET",'
+            'status="200"}'], 6)
+        self.assertEqual(len(files), 2)
+
+    def test_forked_process_starts_empty(self):
+        """Test a forked worker does not report its parent's values"""
+        self.client.get(TAGS_URL)
+
+        with mock.patch('core.metrics.os.getpid', return_value=-1):
+            self.client.get(RECIPES_URL)
+            values = self._metrics()
+
+        self.assertNotIn(
+            'http_requests_total{view="recipe:tag-list",method="GET",'
+            'status="200"}', values)
+
+    def test_unknown_methods_share_one_label(self):
+        """Test methods outside the standard ones are labelled other"""
+        self.client.generic('BREW', TAGS_URL)
+
+        values = self._metrics()
+
+        self.assertIn(
+            'http_requests_total{view="recipe:tag-list",method="other",'
+            'status="405"}', values)
+        self.assertFalse([series for series in values if 'BREW' in series])
+
+    def test_metrics_need_token_or_staff(self):
+        """Test /metrics is forbidden without the token or a staff user"""
+        anonymous = APIClient()
+
+        res = anonymous.get(METRICS_URL)
+        wrong = anonymous.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer nope')
+
+        self.assertEqual(res.status_code, 403)
+        self.assertEqual(wrong.status_code, 403)
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(anonymous.get(
+                METRICS_URL, HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    def test_metrics_served_to_staff(self):
+        """Test a logged in staff user can read /metrics"""
+        staff = get_user_model().objects.create_superuser(
+            'metricsadmin@joseph.com',
+            'testPASS'
+        )
+        client = APIClient()
+        client.force_login(staff)
+
+        res = client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_label_values_escaped(self):
+        """Test quotes, backslashes and newlines in labels are escaped"""
+        labels = metrics._labels([('view', 'a"b\\c\nd')])
+
+        self.assertEqual(labels, '{view="a\\"b\\\\c\\nd"}')
+
+
+@override_settings(MIDDLEWARE=['core.metrics.MetricsMiddleware'])
+class AsyncMetricsTests(TransactionTestCase):
+    """Test recording the metrics of the async views under ASGI"""
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.clear()
+        self.user = get_user_model().objects.create_user(
+            'asyncmetrics@joseph.com',
+            'testPASS'
+        )
+        self.token = Token.objects.create(user=self.user)
+        Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=1, price=1)
+
+    async def test_concurrent_requests(self):
+        """Test two async requests are handled at once and both recorded"""
+        # Each action waits for the other, which a sync middleware would
+        # never let in: Django runs it on its one thread for sync code
+        both_in = threading.Barrier(2, timeout=5)
+        original = RecipeViewSet.list
+
+        def list_together(viewset, request, *args, **kwargs):
+            both_in.wait()
+            return original(viewset, request, *args, **kwargs)
+
+        with mock.patch.object(RecipeViewSet, 'list', list_together):
+            responses = await asyncio.gather(*(
+                self.async_client.get(
+                    ASYNC_RECIPES_URL,
+                    authorization=f'Token {self.token.key}')
+                for _ in range(2)
+            ))
+
+        self.assertEqual([res.status_code for res in responses], [200] * 2)
+        totals = metrics.registry.collect()
+        labels = ('recipe:async-recipe-list', 'GET')
+        self.assertEqual(
+            totals[('http_requests_total', labels + ('200',))], [2])
+        queries = totals[('http_request_queries', labels)]
+        self.assertEqual(sum(queries[:-1]), 2)
+        self.assertGreater(queries[-1], 0)
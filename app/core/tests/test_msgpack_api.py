@@ -0,0 +1,136 @@
+import json
+from decimal import Decimal
+from unittest import mock
+
+import msgpack
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+
+
+MSGPACK = 'application/msgpack'
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+ME_URL = reverse('user:me')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class MessagePackApiTests(TestCase):
+    """Test MessagePack responses and request bodies"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'msgpack@joseph.com',
+            'testPASS',
+            name='Pack'
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Végan')
+        self.ingredient = Ingredient.objects.create(
+            user=self.user, name='Rice')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=30,
+            price=Decimal('12.05'))
+        self.recipe.tag.add(self.tag)
+        self.recipe.ingredients.add(self.ingredient)
+
+    def _get(self, url):
+        res = self.client.get(url, HTTP_ACCEPT=MSGPACK)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], MSGPACK)
+        return msgpack.unpackb(res.content, raw=False)
+
+    def test_recipe_detail_matches_json(self):
+        """Test a recipe detail decodes to the same data as its JSON"""
+        packed = self._get(detail_url(self.recipe.id))
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertEqual(packed, json.loads(res.content))
+        self.assertEqual(packed['price'], '12.05')
+        self.assertEqual(packed['tag'], [{'id': self.tag.id, 'name': 'Végan'}])
+        self.assertLess(len(msgpack.packb(packed)), len(res.content))
+
+    def test_lists_and_user(self):
+        """Test list and user endpoints negotiate MessagePack"""
+        recipes = self._get(RECIPES_URL)
+        tags = self._get(TAGS_URL)
+        me = self._get(ME_URL)
+
+        self.assertEqual(recipes['results'][0]['title'], 'Curry')
+        self.assertEqual(
+            tags['results'], [{'id': self.tag.id, 'name': 'Végan'}])
+        self.assertEqual(me, {'email': 'msgpack@joseph.com', 'name': 'Pack'})
+
+    def test_json_is_default(self):
+        """Test responses stay JSON without an Accept header"""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['Content-Type'], 'application/json')
+
+    def test_create_recipe_from_msgpack(self):
+        """Test creating a recipe with a MessagePack body"""
+        payload = {
+            'title': 'Pilau',
+            'time_minutes': 45,
+            'price': '7.50',
+            'tag': [self.tag.id],
+            'ingredients': [self.ingredient.id],
+        }
+
+        res = self.client.post(
+            RECIPES_URL, msgpack.packb(payload), content_type=MSGPACK,
+            HTTP_ACCEPT=MSGPACK)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        created = msgpack.unpackb(res.content, raw=False)
+        recipe = Recipe.objects.get(id=created['id'])
+        self.assertEqual(recipe.price, Decimal('7.50'))
+        self.assertEqual(created['price'], '7.50')
+        self.assertEqual(list(recipe.tag.all()), [self.tag])
+
+    def test_invalid_msgpack_body(self):
+        """Test a malformed body is a 400, not a server error"""
+        res = self.client.post(
+            RECIPES_URL, b'\xc1', content_type=MSGPACK)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def _post_body(self, body):
+        return self.client.post(RECIPES_URL, body, content_type=MSGPACK)
+
+    def test_unhashable_map_key_body(self):
+        """Test a map keyed by a map is a 400, not a server error"""
+        res = self._post_body(b'\x81\x80\x01')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Unpackers without strict_map_key fail hashing the key instead
+        with mock.patch('msgpack.unpackb',
+                        side_effect=TypeError("unhashable type: 'dict'")):
+            res = self._post_body(b'\x81\x80\x01')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_trailing_data_body(self):
+        """Test bytes after the packed object are a 400"""
+        res = self._post_body(msgpack.packb({'title': 'Pilau'}) + b'\x01')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_deeply_nested_body(self):
+        """Test nesting past the unpacker's stack limit is a 400"""
+        with self.assertRaises(msgpack.StackError):
+            msgpack.unpackb(b'\x91' * 2000 + b'\x01')
+
+        res = self._post_body(b'\x91' * 2000 + b'\x01')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,85 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import openapi
+
+
+SCHEMA_URL = reverse('openapi-schema')
+
+
+class OpenAPISchemaTests(TestCase):
+    """Test serving the OpenAPI schema built at build time"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(openapi._loaded.clear)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'openapi', 'openapi.json')
+
+    def test_command_writes_live_schema(self):
+        """Test the built schema matches the one generated per request"""
+        call_command('generate_schema', output=self.path, stdout=mock.Mock())
+
+        with open(self.path) as file:
+            built = json.load(file)
+        live = self.client.get('/', {'format': 'openapi'}).json()
+        self.assertNotIn('host', built)
+        live.pop('host')
+        live.pop('schemes')
+        self.assertEqual(built, live)
+        self.assertIn('/recipe/recipes/', built['paths'])
+
+    def test_views_introspected_cleanly(self):
+        """Test no view fails while the schema is generated"""
+        with mock.patch('drf_yasg.inspectors.base.logger') as logger:
+            openapi.generate()
+
+        logger.warning.assert_not_called()
+
+    @override_settings(OPENAPI_CACHE_SECONDS=600)
+    def test_serves_built_file(self):
+        """Test the built file is served with caching headers"""
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as file:
+            file.write('{"swagger": "2.0"}')
+
+        with override_settings(OPENAPI_SCHEMA_FILE=self.path), \
+                mock.patch.object(openapi, 'generate') as generate:
+            res = self.client.get(SCHEMA_URL)
+            cached = self.client.get(
+                SCHEMA_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        generate.assert_not_called()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'], 'application/json')
+        self.assertEqual(res.content, b'{"swagger": "2.0"}')
+        self.assertEqual(res['Cache-Control'], 'public, max-age=600')
+        self.assertEqual(cached.status_code, 304)
+
+    def test_generates_missing_file_once(self):
+        """Test the schema is generated once when it was not built"""
+        with override_settings(OPENAPI_SCHEMA_FILE=self.path), \
+                mock.patch.object(openapi, 'generate',
+                                  wraps=openapi.generate) as generate:
+            first = self.client.get(SCHEMA_URL)
+            second = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        self.assertIn('paths', first.json())
+
+    def test_ui_pages_load_served_schema(self):
+        """Test the Swagger UI and ReDoc pages point at the built schema"""
+        for url in (reverse('schema-swagger-ui'), reverse('schema-redoc')):
+            res = self.client.get(url)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertContains(res, f'"url": "{SCHEMA_URL}"')
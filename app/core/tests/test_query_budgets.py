@@ -0,0 +1,116 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+
+from rest_framework.test import APIClient
+
+from core import metrics, query_budget
+from core.models import Recipe, Tag
+from recipe.views import RecipeViewSet
+from user.views import ManageUserView
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+ASYNC_RECIPES_URL = reverse('recipe:async-recipe-list')
+ME_URL = reverse('user:me')
+
+
+class QueryBudgetTests(TestCase):
+    """Test enforcing the query budgets of views"""
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'budgets@joseph.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Curry {i}', time_minutes=i,
+                price='7.50')
+            recipe.tag.add(tag)
+
+    def test_tests_run_strict(self):
+        """Test the test runner turns strict mode on"""
+        self.assertTrue(settings.QUERY_BUDGET_STRICT)
+
+    def test_strict_raises(self):
+        """Test a request over budget fails in strict mode"""
+        with mock.patch.object(RecipeViewSet, 'query_budgets', {'list': 1}):
+            with self.assertRaisesMessage(
+                    query_budget.QueryBudgetExceeded,
+                    'RecipeViewSet.list ran'):
+                self.client.get(RECIPES_URL)
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_logs_fingerprints(self):
+        """Test a request over budget is logged with its query shapes"""
+        with mock.patch.object(RecipeViewSet, 'query_budgets', {'list': 1}), \
+                self.assertLogs('core.query_budget', 'WARNING') as logs:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(logs.records), 1)
+        record = logs.records[0]
+        self.assertIn(f'budget 1: GET {RECIPES_URL}', record.getMessage())
+        self.assertIn('FROM "core_recipe"', record.getMessage())
+        self.assertEqual(record.queries, sum(record.fingerprints.values()))
+        self.assertIn(
+            'http_request_query_budget_exceeded_total'
+            '{view="recipe:recipe-list",method="GET"} 1',
+            metrics.registry.render())
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_within_budget_not_logged(self):
+        """Test requests within their budget are not reported"""
+        with mock.patch.object(query_budget.logger, 'warning') as warning:
+            self.client.get(RECIPES_URL)
+
+        warning.assert_not_called()
+        self.assertNotIn('query_budget_exceeded_total{',
+                         metrics.registry.render())
+
+    def test_budget_by_method(self):
+        """Test views that are not viewsets budget by method name"""
+        with mock.patch.object(ManageUserView, 'query_budgets', {'get': -1}):
+            with self.assertRaises(query_budget.QueryBudgetExceeded):
+                self.client.get(ME_URL)
+            res = self.client.patch(ME_URL, {'name': 'New name'})
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_browsable_api_not_checked(self):
+        """Test browsable API pages are not held to the API budgets"""
+        with mock.patch.object(RecipeViewSet, 'query_budgets', {'list': 1}):
+            res = self.client.get(RECIPES_URL, HTTP_ACCEPT='text/html')
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_async_view_budget(self):
+        """Test the async views are held to their viewset's budgets"""
+        request = RequestFactory().get(ASYNC_RECIPES_URL)
+        request.resolver_match = resolve(ASYNC_RECIPES_URL)
+
+        self.assertEqual(
+            query_budget.budget_for(request),
+            ('RecipeViewSet.list', RecipeViewSet.query_budgets['list']))
+
+    def test_fingerprint(self):
+        """Test values and value list lengths are erased"""
+        self.assertEqual(
+            query_budget.fingerprint(
+                "SELECT \"t2\".id FROM t2  WHERE id IN (%s, %s, %s)\n"
+                "AND name = 'it''s' AND price > 7.5 AND x = %(x)s"),
+            'SELECT "t2".id FROM t2 WHERE id IN (...) AND name = ? '
+            'AND price > ? AND x = ?')
+        self.assertEqual(
+            query_budget.fingerprint('SELECT * FROM t WHERE id IN (%s)'),
+            query_budget.fingerprint('SELECT * FROM t WHERE id IN (1, 2)'))
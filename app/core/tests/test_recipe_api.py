@@ -84,7 +84,7 @@ class PrivateRecipeApiTest(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
 
     def test_recipes_limited_to_user(self):
@@ -106,8 +106,8 @@ class PrivateRecipeApiTest(TestCase):
         
         
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data),1)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(len(res.data['results']),1)
+        self.assertEqual(res.data['results'], serializer.data)
 
     
     def test_view_recipe_detail(self):
@@ -302,9 +302,9 @@ class RecipeImageUploadTests(TestCase):
             serializer2 = RecipeSerializer(recipe2)
             serializer3 = RecipeSerializer(recipe3)
 
-            self.assertIn(serializer1.data, res.data)
-            self.assertIn(serializer2.data, res.data)
-            self.assertNotIn(serializer3.data, res.data)
+            self.assertIn(serializer1.data, res.data['results'])
+            self.assertIn(serializer2.data, res.data['results'])
+            self.assertNotIn(serializer3.data, res.data['results'])
 
         def test_filter_recipes_by_ingredients(self):
             """Test returning recipes with specific ingredients"""
@@ -325,26 +325,149 @@ class RecipeImageUploadTests(TestCase):
             serializer3 =RecipeSerializer(recipe3)
 
 
-            self.assertIn(serializer1.data, res.data)
-            self.assertIn(serializer2.data, res.data)
-            self.assertNotIn(serializer3.data, res.data)
+            self.assertIn(serializer1.data, res.data['results'])
+            self.assertIn(serializer2.data, res.data['results'])
+            self.assertNotIn(serializer3.data, res.data['results'])
 
 
-            
+class RecipeQueryCountTests(TestCase):
+    """Test the number of queries made by the recipe endpoints"""
 
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'queries@joseph.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
 
+    def _create_recipes(self, count):
+        """Create recipes that each have two tags and two ingredients"""
+        recipes = []
+        for i in range(count):
+            recipe = sample_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tag.add(
+                sample_tag(user=self.user, name=f'Tag {i}a'),
+                sample_tag(user=self.user, name=f'Tag {i}b'),
+            )
+            recipe.ingredients.add(
+                sample_ingredient(user=self.user, name=f'Ingredient {i}a'),
+                sample_ingredient(user=self.user, name=f'Ingredient {i}b'),
+            )
+            recipes.append(recipe)
+        return recipes
+
+    def test_list_query_count_is_constant(self):
+        """Test listing recipes prefetches tags and ingredients"""
+        self._create_recipes(10)
+
+        # ETag, recipes, ingredients, tags
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPE_URL)
 
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 10)
+        self.assertEqual(len(res.data['results'][0]['tag']), 2)
+        self.assertEqual(len(res.data['results'][0]['ingredients']), 2)
 
+    def test_retrieve_query_count(self):
+        """Test retrieving a recipe prefetches nested tags and ingredients"""
+        recipe = self._create_recipes(1)[0]
 
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(recipe.id))
 
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tag']), 2)
+        self.assertEqual(len(res.data['ingredients']), 2)
 
 
+class RecipeFilterTests(TestCase):
+    """Test filtering recipes by tags and ingredients"""
 
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'filters@joseph.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
+
+        self.vegan = sample_tag(user=self.user, name='Vegan')
+        self.quick = sample_tag(user=self.user, name='Quick')
+        self.garlic = sample_ingredient(user=self.user, name='Garlic')
+
+        self.curry = sample_recipe(user=self.user, title='Vegetable curry')
+        self.curry.tag.add(self.vegan, self.quick)
+        self.curry.ingredients.add(self.garlic)
+        self.salad = sample_recipe(user=self.user, title='Salad')
+        self.salad.tag.add(self.vegan)
+        self.steak = sample_recipe(user=self.user, title='Steak')
+
+    def _titles(self, params):
+        res = self.client.get(RECIPE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return {item['title'] for item in res.data['results']}
+
+    def test_filter_by_tags_any(self):
+        """Test recipes matching any of the tags are returned once"""
+        titles = self._titles({'tag': f'{self.vegan.id},{self.quick.id}'})
 
+        self.assertEqual(titles, {'Vegetable curry', 'Salad'})
 
+    def test_filter_by_tags_all(self):
+        """Test match=all returns only recipes having every tag"""
+        titles = self._titles({
+            'tag': f'{self.vegan.id},{self.quick.id}',
+            'match': 'all',
+        })
 
+        self.assertEqual(titles, {'Vegetable curry'})
 
+    def test_filter_by_ingredients(self):
+        """Test returning recipes with specific ingredients"""
+        titles = self._titles({'ingredients': f'{self.garlic.id}'})
 
+        self.assertEqual(titles, {'Vegetable curry'})
 
+    def test_filter_tags_and_ingredients_combined(self):
+        """Test tag and ingredient filters must both match"""
+        titles = self._titles({
+            'tag': f'{self.vegan.id}',
+            'ingredients': f'{self.garlic.id}',
+        })
 
+        self.assertEqual(titles, {'Vegetable curry'})
 
+    def test_filter_invalid_ids(self):
+        """Test non numeric ids are rejected"""
+        res = self.client.get(RECIPE_URL, {'tag': 'vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_invalid_match(self):
+        """Test an unknown match mode is rejected"""
+        res = self.client.get(
+            RECIPE_URL, {'tag': f'{self.vegan.id}', 'match': 'some'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_match_ignored_without_filters(self):
+        """Test match is only read along with tag or ingredient ids"""
+        res = self.client.post(
+            f'{RECIPE_URL}?match=some',
+            {'title': 'Toast', 'time_minutes': 2, 'price': '1.00'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            self._titles({'match': 'some'}),
+            {'Vegetable curry', 'Salad', 'Steak', 'Toast'})
+
+    def test_filter_without_ids(self):
+        """Test a filter listing no ids filters nothing in either mode"""
+        everything = {'Vegetable curry', 'Salad', 'Steak'}
+
+        for match in ('any', 'all'):
+            titles = self._titles(
+                {'tag': ',', 'ingredients': ' ', 'match': match})
+            self.assertEqual(titles, everything)
@@ -0,0 +1,150 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+
+
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+def recipe_payload(title, **params):
+    """Return a bulk payload item"""
+    payload = {'title': title, 'time_minutes': 10, 'price': '5.00'}
+    payload.update(params)
+    return payload
+
+
+class RecipeBulkApiTests(TestCase):
+    """Test the bulk recipe endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'bulk@joseph.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.rice = Ingredient.objects.create(user=self.user, name='Rice')
+
+    def test_bulk_create(self):
+        """Test creating recipes with tags and ingredients in one call"""
+        payload = [
+            recipe_payload('Fried rice', tag=[self.vegan.id],
+                           ingredients=[self.rice.id]),
+            recipe_payload('Plain rice', ingredients=[self.rice.id]),
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 2)
+        fried = Recipe.objects.get(id=res.data[0]['id'])
+        plain = Recipe.objects.get(id=res.data[1]['id'])
+        self.assertEqual(fried.title, 'Fried rice')
+        self.assertEqual(list(fried.tag.all()), [self.vegan])
+        self.assertEqual(list(plain.ingredients.all()), [self.rice])
+        self.assertEqual(plain.tag.count(), 0)
+
+    def test_bulk_update(self):
+        """Test items with an id update the recipe and replace relations"""
+        recipe = Recipe.objects.create(
+            user=self.user, title='Old title', time_minutes=5, price=1)
+        recipe.tag.add(Tag.objects.create(user=self.user, name='Old tag'))
+
+        payload = [{'id': recipe.id, 'title': 'New title',
+                    'tag': [self.vegan.id]}]
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'New title')
+        self.assertEqual(recipe.time_minutes, 5)
+        self.assertEqual(list(recipe.tag.all()), [self.vegan])
+
+    def test_bulk_reports_item_errors(self):
+        """Test invalid items are reported by position and nothing is saved"""
+        other = get_user_model().objects.create_user(
+            'other@joseph.com',
+            'testPASS'
+        )
+        foreign_tag = Tag.objects.create(user=other, name='Not mine')
+        payload = [
+            recipe_payload('Valid'),
+            recipe_payload('', time_minutes='soon'),
+            recipe_payload('Foreign tag', tag=[foreign_tag.id]),
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('title', res.data[1])
+        self.assertIn('time_minutes', res.data[1])
+        self.assertIn('tag', res.data[2])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_update_other_users_recipe_rejected(self):
+        """Test a bulk update cannot touch another user's recipe"""
+        other = get_user_model().objects.create_user(
+            'other@joseph.com',
+            'testPASS'
+        )
+        recipe = Recipe.objects.create(
+            user=other, title='Theirs', time_minutes=5, price=1)
+
+        res = self.client.post(
+            BULK_URL, [{'id': recipe.id, 'title': 'Mine'}], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Theirs')
+
+    def test_bulk_duplicate_id_rejected(self):
+        """Test a batch updating the same recipe twice is rejected"""
+        recipe = Recipe.objects.create(
+            user=self.user, title='Once', time_minutes=5, price=1)
+        payload = [
+            {'id': recipe.id, 'title': 'First', 'tag': [self.vegan.id]},
+            {'id': recipe.id, 'title': 'Second', 'tag': [self.vegan.id]},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertEqual(res.data[1], {'id': ['Duplicate id in this batch.']})
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Once')
+        self.assertEqual(recipe.tag.count(), 0)
+
+    def test_bulk_requires_list(self):
+        """Test the payload must be a list"""
+        res = self.client.post(BULK_URL, recipe_payload('One'), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipUnless(connection.features.can_return_rows_from_bulk_insert,
+                'Bulk inserts need returned ids')
+    def test_bulk_query_count_independent_of_size(self):
+        """Test the number of queries does not grow with the batch"""
+        def count(size):
+            payload = [
+                recipe_payload(f'Recipe {i}', tag=[self.vegan.id],
+                               ingredients=[self.rice.id])
+                for i in range(size)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(BULK_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        self.assertEqual(count(2), count(50))
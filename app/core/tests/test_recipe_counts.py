@@ -0,0 +1,203 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+
+
+BULK_URL = reverse('recipe:recipe-bulk')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def sample_recipe(user, title='Curry'):
+    return Recipe.objects.create(
+        user=user, title=title, time_minutes=10, price=5)
+
+
+class RecipeCountTests(TestCase):
+    """Test the maintained recipe_count of tags and ingredients"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'counts@joseph.com',
+            'testPASS'
+        )
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.dinner = Tag.objects.create(user=self.user, name='Dinner')
+        self.rice = Ingredient.objects.create(user=self.user, name='Rice')
+
+    def assertCounts(self, **expected):
+        for name, count in expected.items():
+            obj = getattr(self, name)
+            obj.refresh_from_db(fields=['recipe_count'])
+            self.assertEqual(obj.recipe_count, count, name)
+
+    def test_add_and_remove(self):
+        """Test adding and removing links from the recipe side"""
+        recipe = sample_recipe(self.user)
+        recipe.tag.add(self.vegan, self.dinner)
+        recipe.tag.add(self.vegan)
+        recipe.ingredients.add(self.rice)
+        self.assertCounts(vegan=1, dinner=1, rice=1)
+
+        recipe.tag.remove(self.vegan)
+        recipe.tag.remove(self.vegan)
+        self.assertCounts(vegan=0, dinner=1)
+
+        recipe.tag.clear()
+        self.assertCounts(vegan=0, dinner=0, rice=1)
+
+    def test_reverse_add_and_clear(self):
+        """Test changing links from the tag side"""
+        recipes = [sample_recipe(self.user, f'Recipe {i}') for i in range(3)]
+        self.vegan.recipe_set.add(*recipes)
+        self.assertCounts(vegan=3)
+
+        self.vegan.recipe_set.remove(recipes[0])
+        self.assertCounts(vegan=2)
+
+        self.vegan.recipe_set.clear()
+        self.assertCounts(vegan=0)
+
+    def test_set_replaces_links(self):
+        """Test set() counts the removed and the added links"""
+        recipe = sample_recipe(self.user)
+        recipe.tag.set([self.vegan])
+        recipe.tag.set([self.dinner])
+
+        self.assertCounts(vegan=0, dinner=1)
+
+    def test_recipe_delete(self):
+        """Test deleting recipes uncounts their links"""
+        first, second = sample_recipe(self.user), sample_recipe(self.user)
+        first.tag.add(self.vegan)
+        second.tag.add(self.vegan)
+        second.ingredients.add(self.rice)
+
+        first.delete()
+        self.assertCounts(vegan=1, rice=1)
+
+        Recipe.objects.filter(pk=second.pk).delete()
+        self.assertCounts(vegan=0, rice=0)
+
+    def test_save_keeps_count(self):
+        """Test saving a stale tag does not write back its old count"""
+        stale = Tag.objects.get(pk=self.vegan.pk)
+        sample_recipe(self.user).tag.add(self.vegan)
+
+        stale.name = 'Plant based'
+        stale.save()
+
+        self.assertCounts(vegan=1)
+        self.assertEqual(
+            Tag.objects.get(pk=self.vegan.pk).name, 'Plant based')
+
+    def test_bulk_endpoint(self):
+        """Test the bulk recipe endpoint keeps the counts"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        res = client.post(BULK_URL, [
+            {'title': 'A', 'time_minutes': 1, 'price': '1.00',
+             'tag': [self.vegan.id], 'ingredients': [self.rice.id]},
+            {'title': 'B', 'time_minutes': 1, 'price': '1.00',
+             'tag': [self.vegan.id]},
+        ], format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertCounts(vegan=2, rice=1)
+
+        res = client.post(BULK_URL, [
+            {'id': res.data[0]['id'], 'tag': [self.dinner.id]},
+        ], format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertCounts(vegan=1, dinner=1, rice=1)
+
+    def test_import_counts(self):
+        """Test imported recipes are counted"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'recipes.ndjson')
+        with open(path, 'w') as f:
+            for title in ('A', 'B'):
+                f.write(json.dumps({
+                    'title': title, 'time_minutes': 1, 'price': 1,
+                    'tag': ['vegan', 'Brunch'],
+                }) + '\n')
+
+        call_command('import_recipes', path, '--user', self.user.email,
+                     '--checkpoint', os.path.join(directory, 'checkpoint'),
+                     stdout=StringIO())
+
+        self.assertCounts(vegan=2)
+        self.assertEqual(
+            Tag.objects.get(user=self.user, name='Brunch').recipe_count, 2)
+
+    def test_repair_command(self):
+        """Test the repair command rebuilds drifted counts"""
+        sample_recipe(self.user).tag.add(self.vegan)
+        Tag.objects.filter(pk=self.vegan.pk).update(recipe_count=7)
+        Tag.objects.filter(pk=self.dinner.pk).update(recipe_count=-1)
+        out = StringIO()
+
+        call_command('repair_recipe_counts', stdout=out)
+
+        self.assertCounts(vegan=1, dinner=0)
+        self.assertIn('tags: fixed 2 counts', out.getvalue())
+
+
+class RecipeCountApiTests(TestCase):
+    """Test the tag and ingredient lists use the maintained counts"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'countapi@joseph.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_assigned_only_without_join(self):
+        """Test assigned_only filters on recipe_count"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Unused')
+        sample_recipe(self.user).tag.add(vegan)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(
+            [tag['name'] for tag in res.data['results']], ['Vegan'])
+        self.assertNotIn('core_recipe_tag', queries[-1]['sql'])
+
+    def test_popular_ordering(self):
+        """Test ordering tags by the number of recipes using them"""
+        tags = [Tag.objects.create(user=self.user, name=name)
+                for name in ('A', 'B', 'C')]
+        for count, tag in zip((1, 3, 2), tags):
+            for _ in range(count):
+                sample_recipe(self.user).tag.add(tag)
+
+        res = self.client.get(TAGS_URL, {'ordering': 'popular'})
+
+        self.assertEqual(
+            [tag['name'] for tag in res.data['results']], ['B', 'C', 'A'])
+
+    def test_unknown_ordering(self):
+        """Test an unknown ordering is a 400"""
+        res = self.client.get(TAGS_URL, {'ordering': 'newest'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,139 @@
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    """Return recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def sample_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {'title': 'sample recipe', 'time_minutes': 10, 'price': 5.00}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeConditionalGetTests(TestCase):
+    """Test ETag and If-None-Match handling on the recipe endpoints"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'etags@joseph.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_list_not_modified(self):
+        """Test a matching If-None-Match on the list only reads its ETag"""
+        sample_recipe(user=self.user)
+        res = self.client.get(RECIPE_URL)
+        etag = res['ETag']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_list_etag_changes_after_write(self):
+        """Test the list ETag changes when a recipe is created"""
+        etag = self.client.get(RECIPE_URL)['ETag']
+        sample_recipe(user=self.user)
+
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_list_etag_changes_after_delete_elsewhere(self):
+        """Test the list ETag follows a delete the cache never saw"""
+        keep = sample_recipe(user=self.user)
+        gone = sample_recipe(user=self.user)
+        etag = self.client.get(RECIPE_URL)['ETag']
+
+        # As if deleted by a worker process with a cache of its own
+        with mock.patch('recipe.cache.bump_generation'):
+            gone.delete()
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data['results']],
+                         [keep.id])
+
+    def test_list_etag_depends_on_query(self):
+        """Test different pages of the list have different ETags"""
+        first = self.client.get(RECIPE_URL)['ETag']
+        second = self.client.get(RECIPE_URL, {'page_size': 1})['ETag']
+
+        self.assertNotEqual(first, second)
+
+    def test_detail_not_modified(self):
+        """Test a matching If-None-Match on a recipe returns 304"""
+        recipe = sample_recipe(user=self.user)
+        etag = self.client.get(detail_url(recipe.id))['ETag']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                detail_url(recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_etag_changes_on_tag_rename(self):
+        """Test renaming a nested tag changes the recipe ETag"""
+        recipe = sample_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tag.add(tag)
+        etag = self.client.get(detail_url(recipe.id))['ETag']
+
+        tag.name = 'Vegetarian'
+        tag.save()
+        res = self.client.get(detail_url(recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tag'][0]['name'], 'Vegetarian')
+
+    def test_detail_of_other_user_not_revealed(self):
+        """Test a wildcard If-None-Match does not leak other users' recipes"""
+        user2 = get_user_model().objects.create_user(
+            'other@joseph.com',
+            'testPASS'
+        )
+        recipe = sample_recipe(user=user2)
+
+        res = self.client.get(detail_url(recipe.id), HTTP_IF_NONE_MATCH='*')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_upload_image_sets_etag(self):
+        """Test uploading an image returns an ETag"""
+        recipe = sample_recipe(user=self.user)
+        url = reverse('recipe:recipe-upload-image', args=[recipe.id])
+
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+                Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+                ntf.seek(0)
+                res = self.client.post(
+                    url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIn('ETag', res)
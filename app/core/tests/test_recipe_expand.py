@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.serializers import RecipeDetailSerializer
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class RecipeExpandTests(TestCase):
+    """Test nesting tags and ingredients in recipe lists with ?expand="""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'expand@joseph.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipes = []
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=5, price=2)
+            recipe.tag.add(
+                Tag.objects.create(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f'Salt {i}'))
+            self.recipes.append(recipe)
+
+    def test_expand_matches_detail(self):
+        """Test expanded list items are the detail representation"""
+        # ETag, recipes, ingredients, tags
+        with self.assertNumQueries(4):
+            res = self.client.get(RECIPES_URL, {'expand': 'ingredients,tag'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        expected = RecipeDetailSerializer(
+            reversed(self.recipes), many=True).data
+        self.assertEqual(res.data['results'], expected)
+
+    def test_expand_one_relation(self):
+        """Test only the named relation is nested"""
+        res = self.client.get(RECIPES_URL, {'expand': 'tag'})
+
+        item = res.data['results'][0]
+        self.assertEqual(item['tag'][0]['name'], 'Tag 2')
+        self.assertEqual(
+            item['ingredients'], [self.recipes[2].ingredients.get().id])
+
+    def test_expand_with_fields(self):
+        """Test ?expand= combines with ?fields="""
+        res = self.client.get(
+            RECIPES_URL, {'expand': 'tag', 'fields': 'id,tag'})
+
+        self.assertEqual(res.data['results'][0], {
+            'id': self.recipes[2].id,
+            'tag': [{'id': self.recipes[2].tag.get().id, 'name': 'Tag 2'}],
+        })
+
+    def test_expand_unknown_relation(self):
+        """Test expanding something that is not a relation is a 400"""
+        res = self.client.get(RECIPES_URL, {'expand': 'tag,user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['expand'], ["Cannot expand 'user'."])
+
+    @override_settings(FAST_LIST_RENDERING=True)
+    def test_expand_with_fast_path(self):
+        """Test expanded lists fall back from the fast path intact"""
+        res = self.client.get(RECIPES_URL, {'expand': 'ingredients'})
+
+        item = res.json()['results'][0]
+        self.assertEqual(item['ingredients'][0]['name'], 'Salt 2')
@@ -0,0 +1,128 @@
+import csv
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.views import RecipeViewSet
+
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+class RecipeExportTests(TestCase):
+    """Test streaming exports of a user's recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'export@joseph.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
+
+        self.curry = Recipe.objects.create(
+            user=self.user, title='Curry, hot', time_minutes=30, price=7.5)
+        self.curry.tag.add(
+            Tag.objects.create(user=self.user, name='Vegan'),
+            Tag.objects.create(user=self.user, name='Dinner'),
+        )
+        self.curry.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Rice'))
+        self.toast = Recipe.objects.create(
+            user=self.user, title='Toast', time_minutes=2, price=1)
+
+    def _content(self, res):
+        self.assertTrue(res.streaming)
+        return b''.join(res.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        """Test exporting recipes as newline delimited JSON"""
+        res = self.client.get(EXPORT_URL, {'format': 'ndjson'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line) for line in self._content(res).splitlines()]
+        self.assertEqual(rows[0], {
+            'id': self.curry.id,
+            'title': 'Curry, hot',
+            'time_minutes': 30,
+            'price': '7.50',
+            'link': '',
+            'ingredients': ['Rice'],
+            'tag': ['Dinner', 'Vegan'],
+        })
+        self.assertEqual(rows[1]['tag'], [])
+
+    def test_export_csv(self):
+        """Test exporting recipes as CSV"""
+        res = self.client.get(EXPORT_URL, {'format': 'csv'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/csv'))
+        rows = list(csv.DictReader(io.StringIO(self._content(res))))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['title'], 'Curry, hot')
+        self.assertEqual(rows[0]['tag'], 'Dinner|Vegan')
+        self.assertEqual(rows[1]['ingredients'], '')
+
+    def test_export_csv_escapes_formulas(self):
+        """Test cells a spreadsheet would run as formulas are escaped"""
+        recipe = Recipe.objects.create(
+            user=self.user, title='=HYPERLINK("http://x")', time_minutes=1,
+            price=1, link='+1 555')
+        recipe.tag.add(Tag.objects.create(user=self.user, name='@home'))
+
+        res = self.client.get(EXPORT_URL, {'format': 'csv'})
+
+        rows = list(csv.DictReader(io.StringIO(self._content(res))))
+        self.assertEqual(rows[2]['title'], '\'=HYPERLINK("http://x")')
+        self.assertEqual(rows[2]['link'], "'+1 555")
+        self.assertEqual(rows[2]['tag'], "'@home")
+        self.assertEqual(rows[0]['title'], 'Curry, hot')
+
+    def test_export_limited_to_user(self):
+        """Test exports only contain the user's own recipes"""
+        other = get_user_model().objects.create_user(
+            'other@joseph.com',
+            'testPASS'
+        )
+        Recipe.objects.create(
+            user=other, title='Theirs', time_minutes=2, price=1)
+
+        res = self.client.get(EXPORT_URL, {'format': 'ndjson'})
+
+        self.assertNotIn('Theirs', self._content(res))
+
+    def test_export_batches_relation_queries(self):
+        """Test related names are loaded once per chunk, not per recipe"""
+        for i in range(4):
+            Recipe.objects.create(
+                user=self.user, title=f'Extra {i}', time_minutes=1, price=1)
+
+        chunk_size = RecipeViewSet.export_chunk_size
+        RecipeViewSet.export_chunk_size = 3
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.get(EXPORT_URL, {'format': 'ndjson'})
+                lines = self._content(res).splitlines()
+        finally:
+            RecipeViewSet.export_chunk_size = chunk_size
+
+        self.assertEqual(len(lines), 6)
+        # recipes, then names of both relations for each of the two chunks
+        self.assertEqual(len(queries), 1 + 2 * 2)
+
+    def test_export_requires_authentication(self):
+        """Test anonymous users cannot export"""
+        res = APIClient().get(EXPORT_URL, {'format': 'csv'})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
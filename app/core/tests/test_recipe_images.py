@@ -0,0 +1,196 @@
+import datetime
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe import images, imaging
+
+
+def image_upload_url(recipe_id):
+    """Return URL for recipe image upload"""
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+# APP1 payload holding an empty little-endian TIFF directory
+EXIF = b'Exif\x00\x00II*\x00\x08\x00\x00\x00' + b'\x00' * 6
+
+
+def jpeg_with_exif(path, size=(800, 600)):
+    """Write a JPEG carrying EXIF metadata to path"""
+    Image.new('RGB', size, 'red').save(path, 'JPEG', exif=EXIF)
+    with Image.open(path) as img:
+        assert 'exif' in img.info
+
+
+class RecipeImageProcessingTests(TestCase):
+    """Test uploading and processing recipe images"""
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root.name, RECIPE_IMAGE_WORKERS=0)
+        self.settings_override.enable()
+
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'images@joseph.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Pizza', time_minutes=20, price=8.00)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def _upload(self, content=None, suffix='.jpg'):
+        with tempfile.NamedTemporaryFile(suffix=suffix) as ntf:
+            if content is None:
+                jpeg_with_exif(ntf.name)
+            else:
+                ntf.write(content)
+            ntf.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(
+                    image_upload_url(self.recipe.id), {'image': ntf},
+                    format='multipart')
+        self.recipe.refresh_from_db()
+        return res
+
+    def test_upload_accepted_and_processed(self):
+        """Test an upload returns 202 and ends with a clean image"""
+        res = self._upload()
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_PENDING)
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        with Image.open(self.recipe.image.path) as img:
+            self.assertEqual(img.size, (800, 600))
+            self.assertNotIn('exif', img.info)
+        with Image.open(self.recipe.thumbnail.path) as thumb:
+            self.assertLessEqual(max(thumb.size), 320)
+        self.assertEqual(default_storage.listdir('uploads/recipe/pending'),
+                         ([], []))
+
+    def test_invalid_image_marked_failed(self):
+        """Test a file that is not an image ends in the failed state"""
+        res = self._upload(content=b'not an image')
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
+        self.assertFalse(self.recipe.image)
+
+    def test_new_upload_replaces_old_files(self):
+        """Test processing a new image deletes the previous files"""
+        self._upload()
+        old_path = self.recipe.image.path
+
+        self._upload()
+
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=10)
+    def test_upload_too_large(self):
+        """Test uploads above the size limit are rejected"""
+        res = self._upload()
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_NONE)
+
+    def test_status_in_recipe_detail(self):
+        """Test the processing status is part of the recipe"""
+        self._upload()
+
+        res = self.client.get(
+            reverse('recipe:recipe-detail', args=[self.recipe.id]))
+
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_READY)
+
+    @override_settings(RECIPE_IMAGE_WORKERS=1)
+    def test_process_in_worker_pool(self):
+        """Test the processing job runs in a spawned worker process"""
+        source = os.path.join(self.media_root.name, 'source.jpg')
+        target = os.path.join(self.media_root.name, 'target.jpg')
+        thumb = os.path.join(self.media_root.name, 'thumb.jpg')
+        jpeg_with_exif(source)
+
+        executor = images.get_executor()
+        try:
+            executor.submit(imaging.process, source, target, thumb).result(
+                timeout=60)
+        finally:
+            executor.shutdown()
+            images._executor = None
+
+        with Image.open(target) as img:
+            self.assertNotIn('exif', img.info)
+
+    def _lost_job(self, age=600, upload=True):
+        """Leave the recipe pending on an upload whose job was lost"""
+        name = 'uploads/recipe/pending/lost.jpg'
+        if upload:
+            os.makedirs(os.path.dirname(default_storage.path(name)))
+            jpeg_with_exif(default_storage.path(name))
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            image_status=Recipe.IMAGE_PENDING, pending_image=name,
+            updated_at=timezone.now() - datetime.timedelta(seconds=age))
+        return name
+
+    def _requeue(self):
+        call_command('requeue_images', stdout=StringIO())
+        self.recipe.refresh_from_db()
+
+    def test_requeue_lost_job(self):
+        """Test an image pending for too long is processed again"""
+        name = self._lost_job()
+
+        self._requeue()
+
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        self.assertEqual(self.recipe.pending_image, '')
+        self.assertTrue(os.path.exists(self.recipe.thumbnail.path))
+        self.assertFalse(default_storage.exists(name))
+
+    def test_requeue_skips_recent_jobs(self):
+        """Test images pending for a short time are left to their job"""
+        self._lost_job(age=0)
+
+        self._requeue()
+
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_PENDING)
+
+    def test_requeue_lost_upload_failed(self):
+        """Test a pending image whose upload is gone is marked failed"""
+        self._lost_job(upload=False)
+
+        self._requeue()
+
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
+
+    def test_overtaken_job_changes_nothing(self):
+        """Test a job finishing after a newer upload leaves it in place"""
+        name = self._lost_job()
+        self._upload()
+        image = self.recipe.image.name
+
+        images._schedule(self.recipe.pk, name)
+        self.recipe.refresh_from_db()
+
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        self.assertEqual(self.recipe.image.name, image)
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+        self.assertFalse(default_storage.exists(name))
@@ -0,0 +1,151 @@
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+is_postgres = connection.vendor == 'postgresql'
+
+
+def sample_recipe(user, title):
+    """Create and return a sample recipe"""
+    return Recipe.objects.create(
+        user=user, title=title, time_minutes=10, price=5.00
+    )
+
+
+class RecipeSearchTests(TestCase):
+    """Test searching recipes through the recipe API"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'search@joseph.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _titles(self, res):
+        return [item['title'] for item in res.data['results']]
+
+    def test_search_by_title(self):
+        """Test searching returns recipes whose title matches"""
+        sample_recipe(self.user, 'Mushroom risotto')
+        sample_recipe(self.user, 'Beef stew')
+
+        res = self.client.get(RECIPE_URL, {'search': 'risotto'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._titles(res), ['Mushroom risotto'])
+
+    def test_search_limited_to_user(self):
+        """Test searching does not return other users' recipes"""
+        user2 = get_user_model().objects.create_user(
+            'other@joseph.com',
+            'testPASS'
+        )
+        sample_recipe(user2, 'Mushroom risotto')
+
+        res = self.client.get(RECIPE_URL, {'search': 'risotto'})
+
+        self.assertEqual(res.data['results'], [])
+
+    @skipUnless(is_postgres, 'Full-text search requires PostgreSQL')
+    def test_search_matches_tags_and_ingredients(self):
+        """Test tag and ingredient names are part of the search document"""
+        curry = sample_recipe(self.user, 'Weeknight curry')
+        curry.tag.add(Tag.objects.create(user=self.user, name='Vegan'))
+        soup = sample_recipe(self.user, 'Winter soup')
+        soup.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Lentils'))
+
+        res = self.client.get(RECIPE_URL, {'search': 'vegan'})
+        self.assertEqual(self._titles(res), ['Weeknight curry'])
+
+        res = self.client.get(RECIPE_URL, {'search': 'lentil'})
+        self.assertEqual(self._titles(res), ['Winter soup'])
+
+    @skipUnless(is_postgres, 'Full-text search requires PostgreSQL')
+    def test_search_ranks_title_matches_first(self):
+        """Test a title match ranks above a tag match"""
+        tagged = sample_recipe(self.user, 'Sunday roast')
+        tagged.tag.add(Tag.objects.create(user=self.user, name='Chicken'))
+        sample_recipe(self.user, 'Chicken pie')
+
+        res = self.client.get(RECIPE_URL, {'search': 'chicken'})
+
+        self.assertEqual(self._titles(res), ['Chicken pie', 'Sunday roast'])
+
+    def test_search_pages_hold_every_match_once(self):
+        """Test walking the pages of results with tied ranks returns each
+        match exactly once"""
+        ids = [sample_recipe(self.user, title).id
+               for title in ['Soup'] * 7 + ['Tomato soup'] * 7 +
+               ['Soup of soup'] * 7]
+
+        seen = []
+        res = self.client.get(RECIPE_URL, {'search': 'soup', 'page_size': 4})
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            seen += [item['id'] for item in res.data['results']]
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(sorted(seen), sorted(ids))
+
+    @skipUnless(is_postgres, 'Full-text search requires PostgreSQL')
+    def test_search_follows_tag_rename(self):
+        """Test renaming a tag updates the search documents using it"""
+        recipe = sample_recipe(self.user, 'Fruit salad')
+        tag = Tag.objects.create(user=self.user, name='Summer')
+        recipe.tag.add(tag)
+        tag.name = 'Breakfast'
+        tag.save()
+
+        res = self.client.get(RECIPE_URL, {'search': 'breakfast'})
+
+        self.assertEqual(self._titles(res), ['Fruit salad'])
+
+    # In CI this runs on the database of docker-compose.yml, which needs
+    # PostgreSQL 11 for websearch_to_tsquery
+    @skipUnless(is_postgres, 'Full-text search requires PostgreSQL')
+    def test_search_web_syntax(self):
+        """Test quoted phrases, "or" and "-" in the search text"""
+        sample_recipe(self.user, 'Mushroom risotto')
+        sample_recipe(self.user, 'Risotto with wild mushroom')
+        sample_recipe(self.user, 'Beef stew')
+
+        for text, titles in (
+                ('"mushroom risotto"', ['Mushroom risotto']),
+                ('risotto -wild', ['Mushroom risotto']),
+                ('stew or "wild mushroom"',
+                 ['Beef stew', 'Risotto with wild mushroom'])):
+            res = self.client.get(RECIPE_URL, {'search': text})
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK, text)
+            self.assertEqual(sorted(self._titles(res)), titles, text)
+
+    @skipUnless(is_postgres, 'Full-text search requires PostgreSQL')
+    def test_search_before_postgres_11(self):
+        """Test older servers match all the words with plainto_tsquery"""
+        sample_recipe(self.user, 'Mushroom risotto')
+        sample_recipe(self.user, 'Beef stew')
+
+        default = connections['default']
+        with mock.patch.dict(default.__dict__, {'pg_version': 100000}):
+            found = Recipe.objects.using('default').search('risotto mushroom')
+            sql = str(found.query)
+            titles = [recipe.title for recipe in found]
+
+        self.assertIn('plainto_tsquery', sql)
+        self.assertEqual(titles, ['Mushroom risotto'])
@@ -0,0 +1,176 @@
+import time
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import replicas
+from core.models import Recipe
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+ME_URL = reverse('user:me')
+
+# A second database that stands in for a replica. It is not kept in sync,
+# so a read served from it does not see rows written to the primary.
+REPLICA = 'replica1'
+
+
+class ReplicaRoutingTests(TestCase):
+    """Test which requests read from a replica"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'replica@joseph.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
+        self.choose = mock.patch(
+            'core.replicas.choose_replica', return_value=None).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_safe_requests_use_replica(self):
+        """Test reads of the API views are sent to a replica"""
+        for url in (RECIPES_URL, TAGS_URL, ME_URL):
+            self.client.get(url)
+
+        self.assertEqual(self.choose.call_count, 3)
+
+    def test_write_pins_reads_to_primary(self):
+        """Test a user's reads stay on the primary after they write"""
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        self.client.get(TAGS_URL)
+        self.client.get(ME_URL)
+
+        self.choose.assert_not_called()
+        self.assertEqual(
+            res.cookies[replicas.PIN_COOKIE]['max-age'],
+            settings.REPLICA_PIN_SECONDS)
+
+    def test_pin_outlives_cache(self):
+        """Test the pin cookie holds when the cache lost the pin"""
+        self.client.post(TAGS_URL, {'name': 'Vegan'})
+        cache.clear()
+
+        self.client.get(TAGS_URL)
+
+        self.choose.assert_not_called()
+
+    def test_pin_held_without_cookie(self):
+        """Test the pin holds for clients that send no cookies back"""
+        self.client.post(TAGS_URL, {'name': 'Vegan'})
+        self.client.cookies.clear()
+
+        self.client.get(TAGS_URL)
+
+        self.choose.assert_not_called()
+
+    def test_failed_write_not_pinned(self):
+        """Test a rejected write leaves the user's reads on a replica"""
+        res = self.client.post(TAGS_URL, {'name': ''})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.get(TAGS_URL)
+
+        self.assertNotIn(replicas.PIN_COOKIE, res.cookies)
+        self.assertEqual(self.choose.call_count, 1)
+
+    def test_forged_pin_ignored(self):
+        """Test an unsigned pin cookie does not pin reads"""
+        self.client.cookies[replicas.PIN_COOKIE] = str(self.user.pk)
+
+        self.client.get(TAGS_URL)
+
+        self.assertEqual(self.choose.call_count, 1)
+
+    def test_pin_is_per_user(self):
+        """Test another user's reads are not pinned by a write"""
+        self.client.post(TAGS_URL, {'name': 'Vegan'})
+        other = get_user_model().objects.create_user(
+            'other@joseph.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(other)
+
+        self.client.get(TAGS_URL)
+
+        self.assertEqual(self.choose.call_count, 1)
+
+    def test_pin_expires(self):
+        """Test reads return to the replica once the window has passed"""
+        self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        later = time.time() + settings.REPLICA_PIN_SECONDS + 1
+        with mock.patch('time.time', return_value=later):
+            self.client.get(TAGS_URL)
+
+        self.assertEqual(self.choose.call_count, 1)
+
+    def test_router_outside_requests(self):
+        """Test code outside the API views reads from the primary"""
+        self.assertEqual(router.db_for_read(Recipe), 'default')
+        self.assertEqual(router.db_for_write(Recipe), 'default')
+
+
+class ChooseReplicaTests(TestCase):
+    """Test picking a replica"""
+
+    @override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+    def test_choose_configured_replica(self):
+        self.assertIn(
+            replicas.choose_replica(), ('replica1', 'replica2'))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        self.assertIsNone(replicas.choose_replica())
+
+
+@skipUnless(REPLICA in settings.DATABASES,
+            f'needs a second database configured as {REPLICA}')
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaDatabaseTests(TestCase):
+    """Test reads against a real second database"""
+    databases = {'default', REPLICA} if REPLICA in settings.DATABASES \
+        else {'default'}
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'replicadb@joseph.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _titles(self):
+        res = self.client.get(RECIPES_URL)
+        return [recipe['title'] for recipe in res.data['results']]
+
+    def test_reads_served_by_replica(self):
+        """Test a read does not see rows only the primary has"""
+        Recipe.objects.create(
+            user=self.user, title='Primary only', time_minutes=1, price=1)
+
+        self.assertEqual(self._titles(), [])
+
+    def test_read_your_writes(self):
+        """Test a user sees their own write straight away"""
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Fresh', 'time_minutes': 1, 'price': '1.00'})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(self._titles(), ['Fresh'])
+        self.assertFalse(
+            Recipe.objects.using(REPLICA).filter(title='Fresh').exists())
@@ -0,0 +1,101 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+
+from core.models import Ingredient, Recipe, Tag
+
+
+def seed(prefix, **options):
+    options = {'users': 5, 'recipes': 300, 'tags': 6, 'ingredients': 12,
+               'batch_size': 64, **options}
+    call_command('seed_scale', prefix=prefix, stdout=StringIO(), **options)
+    return get_user_model().objects.filter(
+        email__startswith=prefix).order_by('pk')
+
+
+def shape(users):
+    """Return the titles and tag names of the users' recipes, in order"""
+    return [
+        [(recipe.title, sorted(tag.name for tag in recipe.tag.all()))
+         for recipe in Recipe.objects.filter(user=user).order_by('pk')
+         .prefetch_related('tag')]
+        for user in users
+    ]
+
+
+class SeedScaleTests(TestCase):
+    """Test the seed_scale command"""
+
+    def test_creates_requested_sizes(self):
+        """Test the users, names and recipes asked for are created"""
+        users = seed('sizes')
+
+        self.assertEqual(users.count(), 5)
+        self.assertEqual(Recipe.objects.filter(user__in=users).count(), 300)
+        self.assertEqual(Tag.objects.filter(user__in=users).count(), 30)
+        self.assertEqual(
+            Ingredient.objects.filter(user__in=users).count(), 60)
+        self.assertTrue(users[0].check_password('password'))
+        self.assertEqual(users[0].email, 'sizes0@example.com')
+
+    def test_same_seed_same_data(self):
+        """Test a seed always generates the same recipes"""
+        first = shape(seed('first', seed=7))
+        second = shape(seed('second', seed=7))
+        other = shape(seed('other', seed=8))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+
+    def test_recipe_counts_are_exact(self):
+        """Test the stored recipe counts match the links written"""
+        users = seed('counts')
+
+        for model in (Tag, Ingredient):
+            self.assertEqual(
+                model.objects.filter(user__in=users)
+                .refresh_recipe_count(), 0)
+
+    def test_popularity_is_skewed(self):
+        """Test popular tags and prolific users dominate"""
+        users = seed('skew', users=20, recipes=2000, tags=10)
+
+        tags = Tag.objects.filter(user__in=users)
+        by_name = {}
+        for tag in tags:
+            by_name[tag.name] = by_name.get(tag.name, 0) + tag.recipe_count
+        self.assertGreater(by_name['Dinner'], 3 * by_name['Healthy'])
+        per_user = sorted(
+            (Recipe.objects.filter(user=user).count() for user in users),
+            reverse=True)
+        self.assertGreater(sum(per_user[:4]), sum(per_user[4:]))
+
+    def test_existing_prefix_rejected(self):
+        """Test seeding twice with a prefix is an error"""
+        seed('twice')
+
+        with self.assertRaises(CommandError):
+            seed('twice')
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL only')
+    def test_foreign_keys_restored_and_recipes_searchable(self):
+        """Test the dropped foreign keys are back and search works"""
+        def foreign_keys():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT conname, pg_get_constraintdef(oid) "
+                    "FROM pg_constraint WHERE contype = 'f' ORDER BY 1")
+                return cursor.fetchall()
+        before = foreign_keys()
+
+        users = seed('search')
+
+        self.assertEqual(foreign_keys(), before)
+        recipes = Recipe.objects.filter(user__in=users)
+        self.assertFalse(recipes.filter(search_vector=None).exists())
+        self.assertTrue(recipes.search('dinner').exists())
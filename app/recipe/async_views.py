@@ -0,0 +1,69 @@
+"""Async list and detail endpoints for recipes, tags and ingredients.
+
+Under an ASGI server Django runs every sync view on one thread shared by
+the whole process, so the DRF viewsets answer one request at a time there.
+The views here are coroutines instead. Each request runs its viewset
+action in the event loop's thread pool, on a database connection of that
+thread, and the loop keeps accepting and answering other requests while
+the queries are in flight.
+
+Django 3.2 has no async ORM, querysets cannot be awaited, so the queries
+themselves still run in threads. The responses are the ones the viewsets
+give, ?fields=, ?expand=, ETags and replica reads included.
+
+Every middleware must be async capable for them to help: a sync one is
+run on the shared thread too, and takes the requests one at a time again.
+That is why the settings drop WhiteNoise when APP_SERVER=asgi.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from recipe import views
+
+
+def database_sync_to_async(func):
+    """Wrap func to run in the thread pool instead of the shared thread.
+
+    Connections belong to the thread that opened them and request_finished
+    only closes those of its own thread, so the pool threads drop theirs
+    around each call, the way the request cycle does.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper, thread_sensitive=False)
+
+
+def async_view(viewset_class, actions):
+    """Return a coroutine view serving the given actions of a viewset"""
+    view = viewset_class.as_view(actions)
+
+    @database_sync_to_async
+    def respond(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        # Rendered in the pool too, the handler would use the shared thread
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    async def handler(request, *args, **kwargs):
+        return await respond(request, *args, **kwargs)
+
+    handler.csrf_exempt = True
+    # The view whose query budgets apply, see core/query_budget.py
+    handler.query_budget_view = view
+    return handler
+
+
+recipe_list = async_view(views.RecipeViewSet, {'get': 'list'})
+recipe_detail = async_view(views.RecipeViewSet, {'get': 'retrieve'})
+tag_list = async_view(views.TagViewSet, {'get': 'list'})
+tag_detail = async_view(views.TagViewSet, {'get': 'retrieve'})
+ingredient_list = async_view(views.IngredientViewSet, {'get': 'list'})
+ingredient_detail = async_view(views.IngredientViewSet, {'get': 'retrieve'})
@@ -0,0 +1,146 @@
+"""Batch creation and update of recipes.
+
+A batch is validated as a whole before anything is written. Recipes are
+then written with bulk_create/bulk_update and their tags and ingredients
+with one bulk insert per through table, all inside one transaction. The
+per-row signal handlers do not run for bulk writes, so their work, search
+vectors and recipe counts included, is repeated here once for the batch.
+"""
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.serializers import RecipeBulkSerializer
+from recipe.signals import invalidate_user
+
+
+RELATIONS = (('tag', Tag), ('ingredients', Ingredient))
+FIELDS = ('title', 'time_minutes', 'price', 'link')
+
+
+def _owned_ids(model, user, ids):
+    """Return which of ids belong to user, in a single query"""
+    if not ids:
+        return set()
+    return set(model.objects.filter(user=user, pk__in=ids)
+               .values_list('pk', flat=True))
+
+
+def validate(user, items):
+    """Validate a batch and return (validated_data, errors).
+
+    errors has one dict per item, empty for valid items, and is None when
+    the whole batch is valid.
+    """
+    # Items with an id are updates and only need the fields they change
+    serializers = [
+        RecipeBulkSerializer(
+            data=item, partial=isinstance(item, dict) and 'id' in item)
+        for item in items
+    ]
+    errors = [{} if s.is_valid() else dict(s.errors) for s in serializers]
+    data = [s.validated_data if s.is_valid() else {} for s in serializers]
+
+    wanted = {
+        'id': {item['id'] for item in data if 'id' in item},
+        'tag': {pk for item in data for pk in item.get('tag', ())},
+        'ingredients': {
+            pk for item in data for pk in item.get('ingredients', ())},
+    }
+    owned = {'id': _owned_ids(Recipe, user, wanted['id'])}
+    for field, model in RELATIONS:
+        owned[field] = _owned_ids(model, user, wanted[field])
+
+    seen = set()
+    for item, item_errors in zip(data, errors):
+        if 'id' in item and item['id'] not in owned['id']:
+            item_errors['id'] = [f"Recipe {item['id']} does not exist."]
+        elif 'id' in item and item['id'] in seen:
+            # Its through rows would be inserted twice
+            item_errors['id'] = ['Duplicate id in this batch.']
+        seen.add(item.get('id'))
+        for field, _ in RELATIONS:
+            missing = sorted(set(item.get(field, ())) - owned[field])
+            if missing:
+                item_errors[field] = [f'Invalid pk "{pk}" - object does '
+                                      'not exist.' for pk in missing]
+
+    if any(errors):
+        return data, errors
+    return data, None
+
+
+def _create(user, items):
+    recipes = [
+        Recipe(user=user, **{name: item[name] for name in FIELDS
+                             if name in item})
+        for item in items
+    ]
+    db = router.db_for_write(Recipe)
+    if connections[db].features.can_return_rows_from_bulk_insert:
+        Recipe.objects.bulk_create(recipes, batch_size=1000)
+    else:
+        # The M2M rows need the new ids, which only PostgreSQL returns
+        for recipe in recipes:
+            recipe.save()
+    return recipes
+
+
+def _update(user, items):
+    recipes = Recipe.objects.in_bulk([item['id'] for item in items])
+    now = timezone.now()
+    changed = set()
+    for item in items:
+        recipe = recipes[item['id']]
+        for name in FIELDS:
+            if name in item:
+                setattr(recipe, name, item[name])
+                changed.add(name)
+        recipe.updated_at = now
+    Recipe.objects.bulk_update(
+        recipes.values(), sorted(changed) + ['updated_at'], batch_size=1000)
+    return [recipes[item['id']] for item in items]
+
+
+def _set_relations(items, recipes):
+    """Replace the tags and ingredients given in items with bulk writes"""
+    for field, model in RELATIONS:
+        relation = Recipe._meta.get_field(field)
+        through = relation.remote_field.through
+        source = relation.m2m_field_name() + '_id'
+        target = relation.m2m_reverse_field_name() + '_id'
+        pairs = [(recipe, item) for recipe, item in zip(recipes, items)
+                 if field in item]
+        replaced = [recipe.pk for recipe, item in pairs if 'id' in item]
+        counted = {pk for _, item in pairs for pk in item[field]}
+        if replaced:
+            old = through.objects.filter(**{f'{source}__in': replaced})
+            counted.update(old.values_list(target, flat=True))
+            old.delete()
+        through.objects.bulk_create([
+            through(**{source: recipe.pk, target: pk})
+            for recipe, item in pairs
+            for pk in set(item[field])
+        ], batch_size=5000)
+        model.objects.filter(pk__in=counted).refresh_recipe_count()
+
+
+def save(user, items):
+    """Create items without an id and update those with one.
+
+    Returns the saved recipes in input order. Items must come from a
+    successful validate().
+    """
+    with transaction.atomic():
+        new = [item for item in items if 'id' not in item]
+        existing = [item for item in items if 'id' in item]
+        created = iter(_create(user, new))
+        updated = iter(_update(user, existing) if existing else ())
+        recipes = [next(updated) if 'id' in item else next(created)
+                   for item in items]
+        _set_relations(items, recipes)
+
+        saved = Recipe.objects.filter(pk__in=[r.pk for r in recipes])
+        saved.update_search_vector()
+        invalidate_user(user.pk)
+    return recipes
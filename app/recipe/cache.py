@@ -0,0 +1,75 @@
+"""Versioned per-user cache of rendered tag and ingredient lists.
+
+Every cached list is keyed by the owner's current generation number. Any
+write that can change one of the owner's lists bumps the generation, so the
+old entries are simply never read again and expire on their own; nothing
+has to find and delete them.
+
+Hits and misses are counted in the process's metrics registry, served on
+/metrics, rather than in the cache, which would cost a round trip each.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.metrics import registry
+
+
+GENERATION_KEY = 'recipe:generation:{user_id}'
+LIST_KEY = 'recipe:list:{label}:{user_id}:{generation}:{digest}'
+LOOKUPS_METRIC = 'list_cache_lookups_total'
+
+
+def get_generation(user_id):
+    """Return the current cache generation for a user"""
+    key = GENERATION_KEY.format(user_id=user_id)
+    generation = cache.get(key)
+    if generation is None:
+        # Seeding from the clock means an evicted counter never restarts at
+        # a value that older, possibly stale, entries were stored under.
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(user_id):
+    """Invalidate every cached list belonging to a user"""
+    key = GENERATION_KEY.format(user_id=user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def list_key(request, model):
+    """Return the cache key of a list response for the requesting user"""
+    url = request.build_absolute_uri()
+    return LIST_KEY.format(
+        label=model._meta.label_lower,
+        user_id=request.user.pk,
+        generation=get_generation(request.user.pk),
+        digest=hashlib.md5(url.encode()).hexdigest(),
+    )
+
+
+def get_list(key):
+    """Return cached list data for key or None, counting hits and misses"""
+    data = cache.get(key)
+    registry.count(LOOKUPS_METRIC, ('miss' if data is None else 'hit',))
+    return data
+
+
+def set_list(key, data):
+    cache.set(key, data, settings.ATTR_LIST_CACHE_TIMEOUT)
+
+
+def stats():
+    """Return the hit and miss counts of the list cache, of every worker
+    with METRICS_DIR set"""
+    totals = registry.collect()
+    return {
+        'hits': totals.get((LOOKUPS_METRIC, ('hit',)), [0])[0],
+        'misses': totals.get((LOOKUPS_METRIC, ('miss',)), [0])[0],
+    }
@@ -0,0 +1,44 @@
+"""Strong ETags and conditional GET handling for the recipe endpoints"""
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(request, *parts):
+    """Return a strong ETag for the parts and the negotiated media type"""
+    parts += (request.accepted_media_type,)
+    value = '|'.join(str(part) for part in parts)
+    return quote_etag(hashlib.sha1(value.encode()).hexdigest())
+
+
+def list_etag(request, queryset):
+    """Return the ETag of a list page from the user's list version.
+
+    Every write to the user's recipes, tags or ingredients bumps the
+    version (see recipe.signals), so it is read by primary key from the
+    database the page is read from.
+    """
+    version = get_user_model().objects.using(queryset.db).filter(
+        pk=request.user.pk,
+    ).values_list('list_version', flat=True).first()
+    return make_etag(request, version, request.build_absolute_uri())
+
+
+def recipe_etag(request, recipe_id, updated_at):
+    """Return the ETag of a single recipe representation"""
+    return make_etag(request, request.path, recipe_id, updated_at.isoformat())
+
+
+def not_modified(request, etag):
+    """Return a 304 response when If-None-Match matches etag, else None"""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return None
+    etags = parse_etags(header)
+    if '*' in etags or etag in etags:
+        return Response(status=status.HTTP_304_NOT_MODIFIED,
+                        headers={'ETag': etag})
+    return None
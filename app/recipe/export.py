@@ -0,0 +1,73 @@
+"""Streaming export of a user's recipes.
+
+Recipes are read through a server-side cursor in chunks. The tag and
+ingredient names for a chunk are fetched in one query per relation, so an
+export runs in constant memory and its first rows go out straight away.
+"""
+from itertools import islice
+
+from core.models import Recipe
+from recipe.renderers import CSVRenderer
+
+
+COLUMNS = ('id', 'title', 'time_minutes', 'price', 'link')
+RELATIONS = ('ingredients', 'tag')
+# Separates tag and ingredient names inside a CSV cell
+CSV_NAME_SEPARATOR = '|'
+
+
+def _names(field, recipe_ids):
+    """Return {recipe id: sorted names} of one relation for the recipes"""
+    relation = Recipe._meta.get_field(field)
+    target = relation.m2m_reverse_field_name()
+    links = relation.remote_field.through.objects.filter(
+        recipe_id__in=recipe_ids).values_list('recipe_id', f'{target}__name')
+    names = {}
+    for recipe_id, name in links:
+        names.setdefault(recipe_id, []).append(name)
+    return {recipe_id: sorted(found) for recipe_id, found in names.items()}
+
+
+def iter_recipes(queryset, chunk_size):
+    """Yield recipe dicts, with the related names, in id order"""
+    rows = (queryset.order_by('id').values_list(*COLUMNS)
+            .iterator(chunk_size=chunk_size))
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        ids = [row[0] for row in chunk]
+        related = {field: _names(field, ids) for field in RELATIONS}
+        for row in chunk:
+            recipe = dict(zip(COLUMNS, row))
+            recipe['price'] = str(recipe['price'])
+            for field in RELATIONS:
+                recipe[field] = related[field].get(recipe['id'], [])
+            yield recipe
+
+
+def ndjson_lines(recipes, renderer):
+    for recipe in recipes:
+        yield renderer.render_row(recipe)
+
+
+def csv_lines(recipes, renderer, chunk_size):
+    yield renderer.render_header(COLUMNS + RELATIONS)
+    while True:
+        chunk = list(islice(recipes, chunk_size))
+        if not chunk:
+            return
+        for recipe in chunk:
+            for field in RELATIONS:
+                recipe[field] = CSV_NAME_SEPARATOR.join(recipe[field])
+        yield renderer.render_rows(chunk)
+
+
+def stream(queryset, renderer, chunk_size):
+    """Return an iterator over the encoded export in the renderer's format"""
+    recipes = iter_recipes(queryset, chunk_size)
+    if isinstance(renderer, CSVRenderer):
+        lines = csv_lines(recipes, renderer, chunk_size)
+    else:
+        lines = ndjson_lines(recipes, renderer)
+    return (line.encode() for line in lines)
@@ -0,0 +1,191 @@
+"""Read-only fast path for list endpoints.
+
+A serializer class is compiled once into a plain description of its
+fields: the columns to select with values(), one converter per column and
+the many-to-many relations to load from their through tables. Rows are then
+built from dicts, skipping model instances and the to_representation chain
+of every field, and rendered with orjson. The output is the same, byte for
+byte, as the serializer and JSONRenderer produce.
+
+Enabled with the FAST_LIST_RENDERING setting. Serializers with fields the
+compiler does not know fall back to the regular path. Sparse fieldsets
+compile to their own, narrower, description.
+"""
+import decimal
+
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from core import metrics
+from recipe.fieldsets import SparseFieldsMixin
+from recipe.renderers import ORJSONRenderer
+
+
+# Fields whose representation of a database value is the value itself
+PLAIN_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.ReadOnlyField,
+)
+
+
+def _decimal_converter(field):
+    """Return DecimalField.to_representation with its quantizing prepared"""
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    context.prec = field.max_digits
+
+    def convert(value):
+        return '{:f}'.format(
+            value.quantize(exponent, rounding=field.rounding, context=context))
+    return convert
+
+
+def _choice_converter(field):
+    """Return ChoiceField.to_representation for string choices"""
+    choices = field.choice_strings_to_values
+
+    def convert(value):
+        if value == '':
+            return value
+        return choices.get(str(value), value)
+    return convert
+
+
+class CompiledSerializer:
+    """Builds a serializer's output from values() rows"""
+
+    def __init__(self, model, fields):
+        self.model = model
+        # [(output name, source, converter or None, is many-to-many)] in
+        # the serializer's field order
+        self.fields = fields
+        self.columns = [source for _, source, _, many in fields if not many]
+        self.relations = [source for _, source, _, many in fields if many]
+
+    def _related_ids(self, field, ids):
+        """Return {row id: [related ids]} ordered like the prefetched rows"""
+        relation = self.model._meta.get_field(field)
+        source = relation.m2m_field_name()
+        target = relation.m2m_reverse_field_name()
+        links = (relation.remote_field.through.objects
+                 .filter(**{f'{source}_id__in': ids})
+                 .order_by(f'{target}_id')
+                 .values_list(f'{source}_id', f'{target}_id'))
+        related = {}
+        for row_id, related_id in links:
+            related.setdefault(row_id, []).append(related_id)
+        return related
+
+    def rows(self, values):
+        """Return the serialized form of a list of values() dicts"""
+        ids = [row['id'] for row in values]
+        related = {
+            field: self._related_ids(field, ids) if ids else {}
+            for field in self.relations
+        }
+        results = []
+        for row in values:
+            data = {}
+            for name, source, convert, many in self.fields:
+                if many:
+                    data[name] = related[source].get(row['id'], [])
+                    continue
+                value = row[source]
+                if value is not None and convert is not None:
+                    value = convert(value)
+                data[name] = value
+            results.append(data)
+        return results
+
+
+def _compile(serializer_class, only):
+    serializer = serializer_class()
+    model = serializer.Meta.model
+    fields = []
+    for name, field in serializer.fields.items():
+        if field.write_only or (only is not None and name not in only):
+            continue
+        if field.source == '*' or '.' in field.source:
+            return None
+        if isinstance(field, ManyRelatedField):
+            child = field.child_relation
+            if not isinstance(child, PrimaryKeyRelatedField) or child.pk_field:
+                return None
+            fields.append((name, field.source, None, True))
+        elif isinstance(field, PrimaryKeyRelatedField) and not field.pk_field:
+            # values() returns the id of a foreign key under its name
+            fields.append((name, field.source, None, False))
+        elif isinstance(field, serializers.ChoiceField):
+            fields.append(
+                (name, field.source, _choice_converter(field), False))
+        elif isinstance(field, serializers.DecimalField):
+            coerce = getattr(field, 'coerce_to_string',
+                             api_settings.COERCE_DECIMAL_TO_STRING)
+            if (not coerce or field.localize or
+                    field.decimal_places is None or field.max_digits is None):
+                return None
+            fields.append(
+                (name, field.source, _decimal_converter(field), False))
+        elif isinstance(field, PLAIN_FIELDS):
+            fields.append((name, field.source, None, False))
+        else:
+            return None
+    return CompiledSerializer(model, fields)
+
+
+_compiled = {}
+
+
+def compile_serializer(serializer_class, fields=None):
+    """Return the CompiledSerializer for a class, or None if unsupported.
+
+    fields limits the output to a subset of the serializer's fields.
+    """
+    key = (serializer_class, fields and frozenset(fields))
+    if key not in _compiled:
+        _compiled[key] = _compile(serializer_class, fields)
+    return _compiled[key]
+
+
+class FastListMixin(SparseFieldsMixin):
+    """Serves the list action through the fast path when it is enabled"""
+
+    def _fast_list_serializer(self):
+        if (not settings.FAST_LIST_RENDERING or
+                getattr(self, 'action', None) != 'list'):
+            return None
+        return compile_serializer(
+            self.get_serializer_class(), self.get_requested_fields())
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self._fast_list_serializer() is None:
+            return renderers
+        return [ORJSONRenderer() if type(renderer) is JSONRenderer
+                else renderer for renderer in renderers]
+
+    def list(self, request, *args, **kwargs):
+        compiled = self._fast_list_serializer()
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        columns = set(compiled.columns) | {'id'}
+        if hasattr(self.paginator, 'get_ordering'):
+            # Cursor pagination reads its ordering fields from the rows
+            ordering = self.paginator.get_ordering(request, queryset, self)
+            columns |= {field.lstrip('-') for field in ordering}
+        values = queryset.prefetch_related(None).values(*sorted(columns))
+
+        page = self.paginate_queryset(values)
+        with metrics.serializer_timer():
+            rows = compiled.rows(page if page is not None else list(values))
+        if page is not None:
+            return self.get_paginated_response(rows)
+        return Response(rows)
@@ -0,0 +1,69 @@
+"""Sparse fieldsets selected with the ?fields= query parameter.
+
+``?fields=id,title`` trims the serializer to the named fields. Lists also
+narrow their SELECT to the matching columns with only(), and views skip
+prefetching relations that were not asked for.
+"""
+from rest_framework.exceptions import ValidationError
+
+
+class SparseFieldsMixin:
+    """Adds ?fields= to the list and retrieve actions of a viewset"""
+    fields_param = 'fields'
+    sparse_actions = ('list', 'retrieve')
+
+    def get_requested_fields(self):
+        """Return the set of fields asked for, or None for all of them"""
+        if not hasattr(self, '_requested_fields'):
+            self._requested_fields = self._parse_requested_fields()
+        return self._requested_fields
+
+    def _parse_requested_fields(self):
+        if getattr(self, 'action', None) not in self.sparse_actions:
+            return None
+        param = self.request.query_params.get(self.fields_param, '')
+        fields = {name.strip() for name in param.split(',') if name.strip()}
+        if not fields:
+            return None
+        available = {
+            name for name, field
+            in self.get_serializer_class()().fields.items()
+            if not field.write_only
+        }
+        unknown = sorted(fields - available)
+        if unknown:
+            raise ValidationError({self.fields_param: [
+                f"Unknown field '{name}'." for name in unknown]})
+        return fields
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = self.get_requested_fields()
+        if fields is not None:
+            target = getattr(serializer, 'child', serializer)
+            for name in list(target.fields):
+                if name not in fields:
+                    target.fields.pop(name)
+        return serializer
+
+    def _sparse_columns(self, queryset, fields):
+        """Return the model fields to load for the requested fields"""
+        model_fields = {
+            field.name for field in queryset.model._meta.concrete_fields}
+        serializer_fields = self.get_serializer_class()().fields
+        columns = {serializer_fields[name].source for name in fields}
+        columns.add(queryset.model._meta.pk.name)
+        if hasattr(self.paginator, 'get_ordering'):
+            # Cursor pagination reads its position from the last row
+            ordering = self.paginator.get_ordering(
+                self.request, queryset, self)
+            columns |= {field.lstrip('-') for field in ordering}
+        return columns & model_fields
+
+    def filter_queryset(self, queryset):
+        """Load only the requested columns when listing"""
+        queryset = super().filter_queryset(queryset)
+        fields = self.get_requested_fields()
+        if fields is None or self.action != 'list':
+            return queryset
+        return queryset.only(*self._sparse_columns(queryset, fields))
@@ -0,0 +1,94 @@
+"""Cache of the serialized recipes that list pages are assembled from.
+
+A page is first read without its relations. Every change to a recipe or
+to its tags and ingredients moves its updated_at forward (see
+core.signals), and the serialized form of a recipe is cached under its id
+and that version, so a changed recipe is looked up under a new key and its
+old entry expires unread; nothing has to be deleted. The page's entries
+are fetched with one get_many(), only the misses have their relations
+prefetched and are serialized, and they are stored with one set_many().
+
+Entries are also keyed by the serializer variant: its class and the class
+of each field it outputs, so ?expand= and ?fields= do not share entries
+and a deploy that changes the fields does not read the old ones.
+"""
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.serializers import ListSerializer
+
+from recipe.fieldsets import SparseFieldsMixin
+
+
+FRAGMENT_KEY = 'recipe:fragment:{variant}:{id}:{version}'
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def version(updated_at):
+    """Return the change marker of a row as an integer"""
+    return (updated_at - EPOCH) // MICROSECOND
+
+
+def variant(serializer):
+    """Return a digest of the output shape of a serializer"""
+    target = getattr(serializer, 'child', serializer)
+    shape = [type(target).__module__, type(target).__qualname__]
+    for name, field in target.fields.items():
+        if isinstance(field, ListSerializer):
+            field = field.child
+        shape.append(f'{name}:{type(field).__qualname__}')
+    return hashlib.md5('|'.join(shape).encode()).hexdigest()[:12]
+
+
+class FragmentListMixin(SparseFieldsMixin):
+    """Serves the list action from the cached serialized recipes.
+
+    The view's get_prefetches() returns the relations its serializer
+    reads; they are only loaded for the recipes missing from the cache.
+    """
+
+    def _sparse_columns(self, queryset, fields):
+        # The version of each row keys its fragment
+        return super()._sparse_columns(queryset, fields) | {'updated_at'}
+
+    def list(self, request, *args, **kwargs):
+        if not settings.RECIPE_FRAGMENT_CACHE_TIMEOUT:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # The search document is the biggest column and is never shown
+        rows = queryset.prefetch_related(None).defer('search_vector')
+        page = self.paginate_queryset(rows)
+        paginated = page is not None
+        if not paginated:
+            page = list(rows)
+
+        shape = variant(self.get_serializer(many=True))
+        keys = [
+            FRAGMENT_KEY.format(variant=shape, id=row.pk,
+                                version=version(row.updated_at))
+            for row in page
+        ]
+        found = cache.get_many(keys)
+        missing = [(row, key) for row, key in zip(page, keys)
+                   if key not in found]
+        if missing:
+            recipes = [row for row, _ in missing]
+            prefetch_related_objects(recipes, *self.get_prefetches())
+            serializer = self.get_serializer(recipes, many=True)
+            stored = {key: item for (_, key), item
+                      in zip(missing, serializer.data)}
+            cache.set_many(stored, settings.RECIPE_FRAGMENT_CACHE_TIMEOUT)
+            found.update(stored)
+        data = [found[key] for key in keys]
+
+        if paginated:
+            return self.get_paginated_response(data)
+        return Response(data)
@@ -0,0 +1,165 @@
+"""Background processing of uploaded recipe images.
+
+upload_image only streams the upload to disk and queues it. The decoding,
+validation, re-encoding and thumbnailing in recipe.imaging run in a
+process pool so they never hold a web worker. When the job finishes the
+recipe's image, thumbnail and image_status are updated.
+
+The pool belongs to the web worker process, so its queued jobs are lost
+when that process restarts or is recycled. The recipe keeps the name of
+its pending upload, and requeue_stale(), run by the requeue_images command
+when the server starts, queues again the uploads still pending after
+RECIPE_IMAGE_STALE_SECONDS. A job only stores its outcome while its
+upload is still the recipe's pending one, so a job queued twice, or
+overtaken by a newer upload, changes nothing.
+"""
+import datetime
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+
+from core.models import (
+    Recipe, recipe_image_file_path, recipe_thumbnail_file_path)
+from recipe import imaging
+from recipe.signals import invalidate_user
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the process pool, created on first use in each process"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawned workers do not inherit the web worker's threads; under
+            # uWSGI they need --py-sys-executable, see scripts/entrypoint.sh
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def shutdown():
+    """Wait for the jobs queued by this process and stop its pool"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def save_upload(upload):
+    """Stream an uploaded file into storage and return its name"""
+    ext = os.path.splitext(upload.name)[1].lower()[:10]
+    return default_storage.save(
+        f'uploads/recipe/pending/{uuid.uuid4()}{ext}', upload)
+
+
+def enqueue(recipe, pending_name):
+    """Mark the recipe as processing and queue its pending upload"""
+    Recipe.objects.filter(pk=recipe.pk).update(
+        image_status=Recipe.IMAGE_PENDING, pending_image=pending_name,
+        updated_at=timezone.now())
+    invalidate_user(recipe.user_id)
+    transaction.on_commit(lambda: _schedule(recipe.pk, pending_name))
+
+
+def requeue_stale(older_than):
+    """Queue again the uploads pending for more than older_than seconds.
+
+    Uploads whose file is gone are marked failed. Returns the numbers of
+    uploads queued and failed.
+    """
+    cutoff = timezone.now() - datetime.timedelta(seconds=older_than)
+    stale = Recipe.objects.filter(
+        image_status=Recipe.IMAGE_PENDING, updated_at__lt=cutoff)
+    queued = failed = 0
+    for recipe_id, pending_name in list(
+            stale.values_list('pk', 'pending_image')):
+        if pending_name and default_storage.exists(pending_name):
+            _schedule(recipe_id, pending_name)
+            queued += 1
+        else:
+            _finish(recipe_id, pending_name,
+                    error=FileNotFoundError(f'Upload {pending_name!r} lost'))
+            failed += 1
+    return queued, failed
+
+
+def _schedule(recipe_id, pending_name):
+    image_name = recipe_image_file_path(None, 'image.jpg')
+    thumbnail_name = recipe_thumbnail_file_path(None, 'image.jpg')
+    paths = [default_storage.path(name)
+             for name in (pending_name, image_name, thumbnail_name)]
+    for path in paths[1:]:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    names = (recipe_id, pending_name, image_name, thumbnail_name)
+
+    if not settings.RECIPE_IMAGE_WORKERS:
+        try:
+            imaging.process(*paths)
+        except Exception as exc:
+            return _finish(*names, error=exc)
+        return _finish(*names)
+
+    def done(future):
+        try:
+            _finish(*names, error=future.exception())
+        finally:
+            # runs on the pool's management thread, which owns a connection
+            connections.close_all()
+
+    get_executor().submit(imaging.process, *paths).add_done_callback(done)
+
+
+def _finish(recipe_id, pending_name, image_name=None, thumbnail_name=None,
+            error=None):
+    """Store the outcome of a processing job on the recipe"""
+    if pending_name:
+        default_storage.delete(pending_name)
+    current = Recipe.objects.filter(
+        pk=recipe_id, image_status=Recipe.IMAGE_PENDING,
+        pending_image=pending_name)
+    recipe = current.first()
+    if recipe is None:
+        # Deleted, overtaken by a newer upload or done by a requeued job
+        _delete(image_name, thumbnail_name)
+        return
+
+    if error is not None:
+        logger.info('Image for recipe %s rejected: %s', recipe_id, error)
+        _delete(image_name, thumbnail_name)
+        current.update(image_status=Recipe.IMAGE_FAILED, pending_image='',
+                       updated_at=timezone.now())
+    elif current.update(
+            image=image_name,
+            thumbnail=thumbnail_name,
+            image_status=Recipe.IMAGE_READY,
+            pending_image='',
+            updated_at=timezone.now()):
+        for old in (recipe.image, recipe.thumbnail):
+            if old:
+                old.delete(save=False)
+    else:
+        _delete(image_name, thumbnail_name)
+        return
+    invalidate_user(recipe.user_id)
+
+
+def _delete(*names):
+    for name in names:
+        if name:
+            default_storage.delete(name)
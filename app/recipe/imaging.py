@@ -0,0 +1,36 @@
+"""Recipe image processing, run in worker processes by recipe.images.
+
+This module must not import Django: it is loaded by freshly spawned
+worker processes that have no configured settings.
+"""
+from PIL import Image, ImageOps
+
+
+THUMBNAIL_SIZE = (320, 320)
+# Refuse decompression bombs well before they exhaust a worker's memory
+MAX_PIXELS = 40 * 1000 * 1000
+
+
+def process(source, destination, thumbnail):
+    """Validate the image at source and write a clean copy and a thumbnail.
+
+    The copy is re-encoded as JPEG from the decoded pixels, which drops
+    EXIF (including location), ICC and any other embedded metadata.
+    Raises ValueError when source is not a usable image.
+    """
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    try:
+        with Image.open(source) as img:
+            img.verify()
+        with Image.open(source) as img:
+            img.load()
+            if hasattr(ImageOps, 'exif_transpose'):
+                # keep the orientation the EXIF data we drop described
+                img = ImageOps.exif_transpose(img)
+            clean = img.convert('RGB')
+    except (OSError, SyntaxError, Image.DecompressionBombError) as exc:
+        raise ValueError(f'Invalid image: {exc}') from exc
+
+    clean.save(destination, 'JPEG', quality=85, optimize=True)
+    clean.thumbnail(THUMBNAIL_SIZE)
+    clean.save(thumbnail, 'JPEG', quality=80, optimize=True)
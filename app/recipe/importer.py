@@ -0,0 +1,247 @@
+"""Bulk loading of recipes in the export formats.
+
+Rows are read as a stream and loaded in batches. On PostgreSQL a batch is
+copied into temporary staging tables with COPY and merged into the recipe,
+tag, ingredient and through tables with a handful of set-based statements.
+Other databases load through recipe.bulk instead.
+"""
+import csv
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+
+from core.models import Recipe
+from recipe import bulk
+from recipe.export import CSV_NAME_SEPARATOR
+from recipe.renderers import unescape_csv_cell
+from recipe.signals import invalidate_user
+
+
+def read_rows(stream, fmt):
+    """Yield the raw rows of an NDJSON or CSV text stream"""
+    if fmt == 'csv':
+        for row in csv.DictReader(stream):
+            row = {key: unescape_csv_cell(value) for key, value in row.items()}
+            for field, _ in bulk.RELATIONS:
+                names = row.get(field) or ''
+                row[field] = names.split(CSV_NAME_SEPARATOR) if names else []
+            yield row
+        return
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line
+
+
+def clean_row(row):
+    """Return a validated copy of a raw row, raising ValidationError"""
+    if not isinstance(row, dict):
+        raise ValidationError('Expected an object.')
+    cleaned, errors = {}, {}
+    for name in bulk.FIELDS:
+        field = Recipe._meta.get_field(name)
+        try:
+            cleaned[name] = field.clean(
+                row.get(name, field.get_default()), None)
+        except ValidationError as error:
+            errors[name] = error.messages
+    for name, model in bulk.RELATIONS:
+        names = row.get(name) or []
+        max_length = model._meta.get_field('name').max_length
+        if (not isinstance(names, list) or
+                not all(isinstance(n, str) for n in names)):
+            errors[name] = ['Expected a list of names.']
+        elif any(len(n.strip()) > max_length for n in names):
+            errors[name] = [f'Names are limited to {max_length} characters.']
+        else:
+            cleaned[name] = {n.strip() for n in names if n.strip()}
+    if errors:
+        raise ValidationError(errors)
+    cleaned['user'] = row.get('user') or None
+    return cleaned
+
+
+class Loader:
+    """Loads batches of rows into the database.
+
+    Rows name their owner by email in an optional "user" field and fall
+    back to default_email.
+    """
+
+    def __init__(self, default_email=None):
+        self.db = router.db_for_write(Recipe)
+        self.default_email = default_email
+        self._user_ids = {}
+
+    @property
+    def uses_copy(self):
+        return connections[self.db].vendor == 'postgresql'
+
+    def _resolve_users(self, emails):
+        missing = set(emails) - set(self._user_ids)
+        if missing:
+            self._user_ids.update(
+                get_user_model().objects.using(self.db)
+                .filter(email__in=missing).values_list('email', 'pk'))
+
+    def prepare(self, rows):
+        """Return (cleaned rows, {index: error messages}) for a batch"""
+        cleaned, errors = [], {}
+        for index, row in enumerate(rows):
+            try:
+                cleaned.append((index, clean_row(row)))
+            except ValidationError as error:
+                errors[index] = error.messages
+        self._resolve_users(
+            row['user'] or self.default_email for _, row in cleaned
+            if row['user'] or self.default_email)
+
+        valid = []
+        for index, row in cleaned:
+            email = row.pop('user') or self.default_email
+            if email is None:
+                errors[index] = ['No user given for the row.']
+            elif email not in self._user_ids:
+                errors[index] = [f'User {email} does not exist.']
+            else:
+                row['user_id'] = self._user_ids[email]
+                valid.append(row)
+        return valid, errors
+
+    def allocate_ids(self, count):
+        """Reserve count recipe ids, or return None without COPY support"""
+        if not self.uses_copy or not count:
+            return None
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+                'FROM generate_series(1, %s)',
+                [Recipe._meta.db_table, Recipe._meta.pk.column, count])
+            return [row[0] for row in cursor.fetchall()]
+
+    def load(self, rows, ids=None):
+        """Write a batch of prepared rows in one transaction.
+
+        ids must come from allocate_ids() when the database supports COPY.
+        """
+        if not rows:
+            return
+        with transaction.atomic(using=self.db):
+            if self.uses_copy:
+                self._merge(rows, ids)
+                (Recipe.objects.using(self.db).filter(pk__in=ids)
+                 .update_search_vector())
+            else:
+                self._save(rows)
+            for user_id in {row['user_id'] for row in rows}:
+                invalidate_user(user_id)
+
+    def _save(self, rows):
+        users = get_user_model().objects.using(self.db).in_bulk(
+            {row['user_id'] for row in rows})
+        for user_id, user in users.items():
+            items = [row for row in rows if row['user_id'] == user_id]
+            for field, model in bulk.RELATIONS:
+                found = model.objects.using(self.db).get_or_create_names(
+                    user, {name for item in items for name in item[field]})
+                for item in items:
+                    item[field] = [found[name.lower()][0]
+                                   for name in item[field]]
+            bulk.save(user, items)
+
+    def _merge(self, rows, ids):
+        quote = connections[self.db].ops.quote_name
+        recipes = [
+            [pk, row['user_id']] + [row[name] for name in bulk.FIELDS]
+            for pk, row in zip(ids, rows)
+        ]
+        names = [
+            [pk, field, name]
+            for pk, row in zip(ids, rows)
+            for field, _ in bulk.RELATIONS
+            for name in row[field]
+        ]
+        with connections[self.db].cursor() as cursor:
+            # The tables are dropped on commit, but outlive a savepoint
+            cursor.execute('DROP TABLE IF EXISTS import_recipe, import_name')
+            cursor.execute("""
+                CREATE TEMPORARY TABLE import_recipe (
+                    id bigint, user_id bigint, title text,
+                    time_minutes integer, price numeric, link text
+                ) ON COMMIT DROP
+            """)
+            cursor.execute("""
+                CREATE TEMPORARY TABLE import_name (
+                    recipe_id bigint, relation text, name text
+                ) ON COMMIT DROP
+            """)
+            copy_rows(cursor, 'import_recipe',
+                      ('id', 'user_id') + bulk.FIELDS, recipes)
+            copy_rows(cursor, 'import_name',
+                      ('recipe_id', 'relation', 'name'), names)
+            cursor.execute('ANALYZE import_recipe, import_name')
+
+            cursor.execute(f"""
+                INSERT INTO {quote(Recipe._meta.db_table)} (
+                    id, user_id, title, time_minutes, price, link,
+                    image_status, pending_image, updated_at)
+                SELECT id, user_id, title, time_minutes, price, link, %s,
+                       '', now()
+                FROM import_recipe
+            """, [Recipe.IMAGE_NONE])
+            for field, model in bulk.RELATIONS:
+                relation = Recipe._meta.get_field(field)
+                table = quote(model._meta.db_table)
+                through = quote(relation.remote_field.through._meta.db_table)
+                source = quote(relation.m2m_column_name())
+                target = quote(relation.m2m_reverse_name())
+                cursor.execute(f"""
+                    INSERT INTO {table} (
+                        user_id, name, updated_at, recipe_count)
+                    SELECT DISTINCT ON (r.user_id, lower(n.name))
+                           r.user_id, n.name, now(), 0
+                    FROM import_name n
+                    JOIN import_recipe r ON r.id = n.recipe_id
+                    WHERE n.relation = %s
+                    ON CONFLICT (user_id, lower(name)) DO NOTHING
+                """, [field])
+                cursor.execute(f"""
+                    INSERT INTO {through} ({source}, {target})
+                    SELECT DISTINCT n.recipe_id, t.id
+                    FROM import_name n
+                    JOIN import_recipe r ON r.id = n.recipe_id
+                    JOIN {table} t
+                      ON t.user_id = r.user_id
+                     AND lower(t.name) = lower(n.name)
+                    WHERE n.relation = %s
+                """, [field])
+                # The recipes are new, so their links only add to the counts
+                cursor.execute(f"""
+                    UPDATE {table} t
+                    SET recipe_count = t.recipe_count + c.links
+                    FROM (
+                        SELECT {target} AS id, count(*) AS links
+                        FROM {through}
+                        WHERE {source} IN (SELECT id FROM import_recipe)
+                        GROUP BY {target}
+                    ) c
+                    WHERE t.id = c.id
+                """)
+
+
+def copy_rows(cursor, table, columns, rows):
+    """COPY rows into table through an in-memory CSV buffer"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    columns = ', '.join(columns)
+    # Without FORCE_NOT_NULL an empty link would be read as NULL
+    cursor.copy_expert(
+        f'COPY {table} ({columns}) FROM STDIN '
+        f'WITH (FORMAT csv, FORCE_NOT_NULL ({columns}))', buffer)
@@ -0,0 +1,42 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset pagination for recipes, newest first.
+
+    Pages are selected with a ``WHERE id < cursor`` predicate on an indexed
+    column instead of OFFSET, and no COUNT(*) is issued, so fetching a deep
+    page costs the same as fetching the first one and cursors stay stable
+    while new rows are inserted.
+    """
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_ordering(self, request, queryset, view):
+        """Order search results by relevance, ties broken by id.
+
+        The cursor keeps the rank of the last row and how many rows with
+        that rank it has passed, so ties are paged by id in order.
+        """
+        if 'search_rank' in queryset.query.annotations:
+            return ('-search_rank', '-id')
+        return super().get_ordering(request, queryset, view)
+
+
+class RecipeAttrCursorPagination(RecipeCursorPagination):
+    """Keyset pagination for tags and ingredients ordered by name, or by
+    the number of recipes using them with ?ordering=popular"""
+    ordering = ('-name', '-id')
+    popular_ordering = ('-recipe_count', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get('ordering', 'name')
+        if ordering not in ('name', 'popular'):
+            raise ValidationError(
+                {'ordering': "Expected 'name' or 'popular'"})
+        if ordering == 'popular':
+            return self.popular_ordering
+        return super().get_ordering(request, queryset, view)
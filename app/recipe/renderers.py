@@ -0,0 +1,127 @@
+import csv
+import decimal
+import io
+import json
+
+import msgpack
+import orjson
+from rest_framework.utils import encoders
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+# Spreadsheet applications run a cell starting with one of these as a
+# formula. The apostrophe is there so that escaping can be undone: every
+# text cell starting with one was escaped.
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r', "'")
+
+
+def escape_csv_cell(value):
+    """Return value with an apostrophe before a leading formula character,
+    which spreadsheet applications then show as text"""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def unescape_csv_cell(value):
+    """Return a cell written by escape_csv_cell() as it was given"""
+    if isinstance(value, str) and value.startswith("'"):
+        return value[1:]
+    return value
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline delimited JSON, one object per line"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(self.render_row(row) for row in rows).encode()
+
+    @staticmethod
+    def render_row(row):
+        return json.dumps(row, ensure_ascii=False, default=str) + '\n'
+
+
+class CSVRenderer(BaseRenderer):
+    """Comma separated values with a header row taken from the first row.
+
+    Cells that a spreadsheet would evaluate as a formula are escaped with
+    escape_csv_cell().
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        if not rows:
+            return b''
+        return (self.render_header(rows[0].keys()) +
+                self.render_rows(rows)).encode()
+
+    @staticmethod
+    def render_header(fields):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(fields)
+        return buffer.getvalue()
+
+    @staticmethod
+    def render_rows(rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(escape_csv_cell(value) for value in row.values())
+        return buffer.getvalue()
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer encoding with orjson.
+
+    Produces the same bytes as JSONRenderer for the data serializers
+    return, floats aside. Indented and ASCII-only output is left to
+    JSONRenderer.
+    """
+    default = encoders.JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.default,
+                               option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except orjson.JSONEncodeError:
+            # e.g. integers wider than 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+        return (ret.replace('\u2028'.encode(), b'\\u2028')
+                .replace('\u2029'.encode(), b'\\u2029'))
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack, a compact binary encoding of the same data as JSON"""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    @staticmethod
+    def default(obj):
+        # Keep every digit of a Decimal, which the JSON encoder turns
+        # into a float
+        if isinstance(obj, decimal.Decimal):
+            return str(obj)
+        return encoders.JSONEncoder().default(obj)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=self.default, use_bin_type=True)
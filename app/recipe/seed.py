@@ -0,0 +1,291 @@
+"""Synthetic users, tags, ingredients and recipes for testing at scale.
+
+The data is skewed the way real usage is:
+
+* recipes per user follow a Pareto distribution, so a few users own a
+  large share of all the recipes;
+* tags and ingredients come from a vocabulary shared by every user and
+  are picked with Zipfian popularity, so the same few dominate everywhere;
+* the number of tags and ingredients of a recipe varies around a mean.
+
+Everything is drawn from one random generator seeded by the caller, so
+the same seed and sizes always give the same rows. Ids are reserved from
+the sequences up front and the rows are written in batches, with COPY on
+PostgreSQL and bulk_create elsewhere, in a single transaction. Recipe
+counts are tallied while generating, so tags and ingredients are written
+last, complete. On PostgreSQL the foreign keys of the written tables are
+dropped for the load and added back at the end, which checks them with
+one query each instead of one trigger call per row.
+"""
+import random
+from array import array
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.importer import copy_rows
+
+
+TAG_WORDS = (
+    'Dinner', 'Quick', 'Vegetarian', 'Lunch', 'Breakfast', 'Healthy',
+    'Dessert', 'Vegan', 'Comfort food', 'Spicy', 'Italian', 'Soup',
+    'Gluten free', 'Baking', 'Salad', 'Mexican', 'Budget', 'Indian',
+    'Snack', 'Party', 'Slow cooker', 'Grill', 'Low carb', 'Kids',
+    'Seafood', 'Thai', 'Holiday', 'One pot', 'Japanese', 'Summer',
+)
+INGREDIENT_WORDS = (
+    'Salt', 'Olive oil', 'Garlic', 'Onion', 'Butter', 'Pepper', 'Egg',
+    'Flour', 'Sugar', 'Milk', 'Tomato', 'Lemon', 'Chicken', 'Rice',
+    'Carrot', 'Potato', 'Parsley', 'Cheese', 'Ginger', 'Soy sauce',
+    'Basil', 'Cumin', 'Beef', 'Honey', 'Cream', 'Spinach', 'Paprika',
+    'Coriander', 'Mushroom', 'Chickpeas', 'Lime', 'Pasta', 'Bacon',
+    'Yogurt', 'Coconut milk', 'Celery', 'Thyme', 'Chili', 'Salmon',
+    'Beans', 'Vinegar', 'Cinnamon', 'Oats', 'Pork', 'Shrimp', 'Tofu',
+    'Avocado', 'Peas', 'Leek', 'Walnuts',
+)
+TITLE_WORDS = (
+    'Roasted', 'Creamy', 'Easy', 'Crispy', 'Spiced', 'Grilled', 'Baked',
+    'Smoky', 'Fresh', 'Braised', 'Garlicky', 'Sticky', 'Classic',
+)
+DISHES = (
+    'Curry', 'Stew', 'Soup', 'Salad', 'Pie', 'Bowl', 'Tacos', 'Pasta',
+    'Risotto', 'Stir fry', 'Traybake', 'Omelette', 'Bake', 'Skewers',
+)
+
+
+def vocabulary(words, size):
+    """Return size distinct names, the words first and then numbered"""
+    return [
+        words[i % len(words)] + (
+            f' {i // len(words) + 1}' if i >= len(words) else '')
+        for i in range(size)
+    ]
+
+
+def zipf_cum_weights(size, exponent):
+    """Return the cumulative Zipf weights of ranks 1 to size"""
+    cum_weights, total = [], 0.0
+    for rank in range(1, size + 1):
+        total += rank ** -exponent
+        cum_weights.append(total)
+    return cum_weights
+
+
+def recipes_per_user(rng, users, recipes, shape):
+    """Split recipes among users in Pareto distributed shares"""
+    weights = [rng.paretovariate(shape) for _ in range(users)]
+    total = sum(weights)
+    counts = [int(recipes * weight / total) for weight in weights]
+    # Rounding down leaves fewer than one recipe per user to hand out
+    largest = sorted(range(users), key=weights.__getitem__, reverse=True)
+    for index in largest[:recipes - sum(counts)]:
+        counts[index] += 1
+    return counts
+
+
+class Seeder:
+    """Generates and writes a synthetic dataset"""
+
+    def __init__(self, users, tags, ingredients, recipes, seed=0,
+                 tags_per_recipe=3, ingredients_per_recipe=8,
+                 popularity=1.1, inequality=1.2, prefix='seed',
+                 password='password'):
+        self.users = users
+        self.recipes = recipes
+        self.seed = seed
+        self.tags_per_recipe = tags_per_recipe
+        self.ingredients_per_recipe = ingredients_per_recipe
+        self.inequality = inequality
+        self.prefix = prefix
+        self.password = password
+        self.tag_names = vocabulary(TAG_WORDS, tags)
+        self.ingredient_names = vocabulary(INGREDIENT_WORDS, ingredients)
+        self.tag_weights = zipf_cum_weights(tags, popularity)
+        self.ingredient_weights = zipf_cum_weights(ingredients, popularity)
+        self.db = router.db_for_write(Recipe)
+        self.now = timezone.now()
+
+    @property
+    def uses_copy(self):
+        return connections[self.db].vendor == 'postgresql'
+
+    def emails(self):
+        normalize = get_user_model().objects.normalize_email
+        return (normalize(f'{self.prefix}{n}@example.com')
+                for n in range(self.users))
+
+    def _reserve(self, model, count):
+        """Reserve count consecutive ids of model and return the first"""
+        if not self.uses_copy:
+            last = model.objects.using(self.db).aggregate(last=Max('pk'))
+            return (last['last'] or 0) + 1
+        sequence = 'pg_get_serial_sequence(%s, %s)'
+        table, column = model._meta.db_table, model._meta.pk.column
+        with connections[self.db].cursor() as cursor:
+            # Not atomic against concurrent inserts, seed an idle database
+            cursor.execute(
+                f'SELECT setval({sequence}, nextval({sequence}) + %s - 1)',
+                [table, column, table, column, max(count, 1)])
+            return cursor.fetchone()[0] - max(count, 1) + 1
+
+    def _write(self, model, columns, rows):
+        if self.uses_copy:
+            quote = connections[self.db].ops.quote_name
+            with connections[self.db].cursor() as cursor:
+                copy_rows(cursor, quote(model._meta.db_table),
+                          [quote(column) for column in columns], rows)
+        else:
+            model.objects.using(self.db).bulk_create(
+                [model(**dict(zip(columns, row))) for row in rows],
+                batch_size=1000)
+
+    def _write_all(self, model, columns, rows, batch_size):
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            self._write(model, columns, batch)
+
+    def _drop_foreign_keys(self, models):
+        """Drop the foreign keys of the models' tables and return them"""
+        tables = [model._meta.db_table for model in models]
+        with connections[self.db].cursor() as cursor:
+            cursor.execute("""
+                SELECT conrelid::regclass::text, quote_ident(conname),
+                       pg_get_constraintdef(oid)
+                FROM pg_constraint
+                WHERE contype = 'f' AND conrelid = ANY(%s::regclass[])
+            """, [tables])
+            constraints = cursor.fetchall()
+            for table, name, _ in constraints:
+                cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {name}')
+        return constraints
+
+    def _add_foreign_keys(self, constraints):
+        with connections[self.db].cursor() as cursor:
+            for table, name, definition in constraints:
+                cursor.execute(
+                    f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+
+    def _pick(self, rng, mean, names, cum_weights):
+        """Return the distinct ranks of a recipe's tags or ingredients"""
+        if not names:
+            return set()
+        count = round(rng.triangular(0, 2 * mean, mean))
+        return set(rng.choices(
+            range(len(names)), cum_weights=cum_weights, k=count))
+
+    def run(self, batch_size, progress=None):
+        """Write the dataset, calling progress(recipes written) per batch"""
+        rng = random.Random(self.seed)
+        counts = recipes_per_user(
+            rng, self.users, self.recipes, self.inequality)
+        tags, ingredients = len(self.tag_names), len(self.ingredient_names)
+        # Recipes per tag and ingredient, indexed by their offset in the run
+        tag_counts = array('q', [0]) * (self.users * tags)
+        ingredient_counts = array('q', [0]) * (self.users * ingredients)
+        loaded = (Tag, Ingredient, Recipe, Recipe.tag.through,
+                  Recipe.ingredients.through)
+
+        with transaction.atomic(using=self.db):
+            first_user = self._reserve(get_user_model(), self.users)
+            first_tag = self._reserve(Tag, self.users * tags)
+            first_ingredient = self._reserve(
+                Ingredient, self.users * ingredients)
+            first_recipe = self._reserve(Recipe, self.recipes)
+            if self.uses_copy:
+                constraints = self._drop_foreign_keys(loaded)
+
+            # Hashed once: every user shares the password, stored the way
+            # create_user() would have stored it
+            password = make_password(self.password)
+            self._write_all(get_user_model(), (
+                'id', 'email', 'password', 'name', 'is_active', 'is_staff',
+                'is_superuser', 'list_version'), (
+                (first_user + n, email, password, f'Seed user {n}', True,
+                 False, False, 0)
+                for n, email in enumerate(self.emails())
+            ), batch_size)
+
+            recipe_id = first_recipe
+            batch = ([], [], [])
+            for n, count in enumerate(counts):
+                for _ in range(count):
+                    picked_tags = [n * tags + rank for rank in self._pick(
+                        rng, self.tags_per_recipe, self.tag_names,
+                        self.tag_weights)]
+                    picked_ingredients = self._pick(
+                        rng, self.ingredients_per_recipe,
+                        self.ingredient_names, self.ingredient_weights)
+                    title = rng.choice(TITLE_WORDS)
+                    if picked_ingredients:
+                        main = self.ingredient_names[min(picked_ingredients)]
+                        title += f' {main.lower()}'
+                    title += f' {rng.choice(DISHES).lower()}'
+                    picked_ingredients = [
+                        n * ingredients + rank for rank in picked_ingredients]
+
+                    batch[0].append((
+                        recipe_id, first_user + n, title,
+                        rng.randint(5, 180),
+                        Decimal(rng.randint(100, 5000)).scaleb(-2), '',
+                        Recipe.IMAGE_NONE, '', self.now))
+                    for offset in picked_tags:
+                        tag_counts[offset] += 1
+                        batch[1].append((recipe_id, first_tag + offset))
+                    for offset in picked_ingredients:
+                        ingredient_counts[offset] += 1
+                        batch[2].append(
+                            (recipe_id, first_ingredient + offset))
+                    recipe_id += 1
+                    if len(batch[0]) >= batch_size:
+                        self._write_recipes(*batch)
+                        batch = ([], [], [])
+                        if progress:
+                            progress(recipe_id - first_recipe)
+            if batch[0]:
+                self._write_recipes(*batch)
+                if progress:
+                    progress(recipe_id - first_recipe)
+
+            for model, first, names, recipe_counts in (
+                    (Tag, first_tag, self.tag_names, tag_counts),
+                    (Ingredient, first_ingredient, self.ingredient_names,
+                     ingredient_counts)):
+                self._write_all(model, (
+                    'id', 'user_id', 'name', 'updated_at', 'recipe_count'), (
+                    (first + offset, first_user + n, name, self.now,
+                     recipe_counts[offset])
+                    for n in range(self.users)
+                    for offset, name in enumerate(
+                        names, start=n * len(names))
+                ), batch_size)
+            # Needs the names, so only once they are all written
+            Recipe.objects.using(self.db).filter(
+                pk__gte=first_recipe, pk__lt=recipe_id,
+            ).update_search_vector()
+            if self.uses_copy:
+                self._add_foreign_keys(constraints)
+
+        if self.uses_copy:
+            tables = [model._meta.db_table
+                      for model in (get_user_model(),) + loaded]
+            with connections[self.db].cursor() as cursor:
+                # Plans for the new row counts instead of the old ones
+                cursor.execute('ANALYZE ' + ', '.join(
+                    connections[self.db].ops.quote_name(table)
+                    for table in tables))
+
+    def _write_recipes(self, recipes, tag_links, ingredient_links):
+        self._write(Recipe, (
+            'id', 'user_id', 'title', 'time_minutes', 'price', 'link',
+            'image_status', 'pending_image', 'updated_at'), recipes)
+        self._write(Recipe.tag.through, ('recipe_id', 'tag_id'), tag_links)
+        self._write(Recipe.ingredients.through,
+                    ('recipe_id', 'ingredient_id'), ingredient_links)
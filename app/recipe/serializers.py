@@ -1,32 +1,90 @@
+import copy
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models.functions import Lower
 from rest_framework import serializers
+from core.metrics import TimedListSerializer, TimedSerializerMixin
 from core.models import Tag, Ingredient,Recipe
 
-class TagSerializer(serializers.ModelSerializer):
+
+class UniqueNameMixin:
+    """Reject a name the requesting user already has, ignoring case"""
+
+    def validate_name(self, value):
+        request = self.context.get('request')
+        if request is None:
+            return value
+        model = self.Meta.model
+        existing = model.objects.annotate(name_lower=Lower('name')).filter(
+            user=request.user, name_lower=value.lower())
+        if self.instance is not None:
+            existing = existing.exclude(pk=self.instance.pk)
+        if existing.exists():
+            raise serializers.ValidationError(
+                f'{model._meta.verbose_name.capitalize()} "{value}" '
+                'already exists.')
+        return value
+
+
+class TagSerializer(TimedSerializerMixin, UniqueNameMixin,
+                    serializers.ModelSerializer):
     """Serializer for tag objects"""
 
     class Meta:
         model = Tag
         fields = ('id','name')
         read_only_fields = ('id',)
+        list_serializer_class = TimedListSerializer
+
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, UniqueNameMixin,
+                           serializers.ModelSerializer):
     """Serializer for ingredient"""
 
     class Meta:
         model = Ingredient
         fields = ('id','name','user')
         read_only_fields = ('id',)
+        list_serializer_class = TimedListSerializer
+
+
+class PrimaryKeysField(serializers.ManyRelatedField):
+    """A list of primary keys, looked up in one query for the whole list
+    instead of one query per key"""
 
-class RecipeSerializer(serializers.ModelSerializer):
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        child = self.child_relation
+        queryset = child.get_queryset()
+        pks = []
+        for item in data:
+            try:
+                if isinstance(item, (bool, list, dict)):
+                    raise TypeError
+                pks.append(queryset.model._meta.pk.to_python(item))
+            except (TypeError, DjangoValidationError):
+                child.fail('incorrect_type', data_type=type(item).__name__)
+        found = queryset.in_bulk(set(pks))
+        for item, pk in zip(data, pks):
+            if pk not in found:
+                child.fail('does_not_exist', pk_value=item)
+        return [found[pk] for pk in pks]
+
+
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serialize recipe"""
-    ingredients = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset = Ingredient.objects.all()
+    ingredients = PrimaryKeysField(
+        child_relation=serializers.PrimaryKeyRelatedField(
+            queryset=Ingredient.objects.all()),
     )
     """Presents tag as a primary key """
-    tag =serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all()
+    tag = PrimaryKeysField(
+        child_relation=serializers.PrimaryKeyRelatedField(
+            queryset=Tag.objects.all()),
     )
     class Meta:
         model = Recipe
@@ -37,10 +95,12 @@ class RecipeSerializer(serializers.ModelSerializer):
             'tag',
             'time_minutes',
             'price',
-            'link'
+            'link',
+            'image_status'
         )
 
         read_only_fields =('id',)
+        list_serializer_class = TimedListSerializer
 
 # uses the recipe serializer as the base
 class RecipeDetailSerializer(RecipeSerializer):
@@ -49,13 +109,75 @@ class RecipeDetailSerializer(RecipeSerializer):
     tag = TagSerializer(many=True, read_only=True)
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+_expanded = {}
+
+
+def expand_serializer(serializer_class, nested_class, fields):
+    """Return a subclass of serializer_class whose given fields are
+    declared as they are in nested_class, e.g. as nested serializers"""
+    key = (serializer_class, nested_class, frozenset(fields))
+    if key not in _expanded:
+        declared = {
+            name: copy.deepcopy(nested_class._declared_fields[name])
+            for name in fields
+        }
+        _expanded[key] = type(
+            f'Expanded{serializer_class.__name__}', (serializer_class,),
+            declared)
+    return _expanded[key]
+
+
+class RecipeImageSerializer(TimedSerializerMixin,
+                            serializers.ModelSerializer):
     """Serializer for uploading images to recipes"""
+    # A plain file field: the image is decoded by the background worker,
+    # not on the request path.
+    image = serializers.FileField()
 
     class Meta:
         model = Recipe
-        fields = ('id','image')
+        fields = ('id', 'image', 'thumbnail', 'image_status')
 
         read_only_fields=('id',)
-        
 
+    def validate_image(self, value):
+        """Reject uploads larger than RECIPE_IMAGE_MAX_BYTES"""
+        if value.size > settings.RECIPE_IMAGE_MAX_BYTES:
+            raise serializers.ValidationError(
+                'Image files may be at most '
+                f'{settings.RECIPE_IMAGE_MAX_BYTES} bytes.')
+        return value
+
+
+class RecipeBulkSerializer(serializers.ModelSerializer):
+    """Serializer for one recipe of a bulk create or update.
+
+    Related ids are plain integers here; recipe.bulk checks them against
+    the user's tags and ingredients in one query for the whole batch.
+    """
+    id = serializers.IntegerField(required=False)
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(), required=False)
+    tag = serializers.ListField(
+        child=serializers.IntegerField(), required=False)
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'id',
+            'title',
+            'ingredients',
+            'tag',
+            'time_minutes',
+            'price',
+            'link'
+        )
+
+
+class NameListSerializer(serializers.Serializer):
+    """Serializer for a list of tag or ingredient names to resolve"""
+    names = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        allow_empty=False,
+        max_length=1000,
+    )
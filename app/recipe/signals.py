@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Ingredient, Recipe, Tag
+from recipe import cache
+
+
+def invalidate_user(user_id):
+    """Bump the user's list version, and their cache generation now and
+    once the write commits.
+
+    The list version is a column of the user's row, so it commits with the
+    write and every process sees it. The second generation bump drops
+    anything cached by a request that read the old rows between the first
+    bump and the commit.
+    """
+    get_user_model().objects.filter(pk=user_id).update(
+        list_version=F('list_version') + 1)
+    cache.bump_generation(user_id)
+    transaction.on_commit(lambda: cache.bump_generation(user_id))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+def invalidate_on_write(sender, instance, **kwargs):
+    """Invalidate the owner's lists when a tag, ingredient or recipe changes"""
+    invalidate_user(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tag.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_on_relation_change(sender, instance, action, **kwargs):
+    """Invalidate the owner's lists when a recipe's relations change"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_user(instance.user_id)
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.views import RecipeViewSet
+
+
+ASYNC_RECIPES_URL = reverse('recipe:async-recipe-list')
+
+# The middleware of APP_SERVER=asgi, which leaves WhiteNoise out
+ASGI_MIDDLEWARE = [
+    name for name in settings.MIDDLEWARE
+    if name != 'whitenoise.middleware.WhiteNoiseMiddleware']
+
+
+class AsyncViewsTests(TransactionTestCase):
+    """Test the async endpoints answer like the viewsets.
+
+    The views run their queries on the pool's own connections, which do
+    not see the rows of an open test transaction, hence TransactionTestCase.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'async@joseph.com',
+            'testPASS'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+        self.tag = Tag.objects.create(user=self.user, name='Dinner')
+        self.ingredient = Ingredient.objects.create(
+            user=self.user, name='Rice')
+        for i in range(3):
+            self.recipe = Recipe.objects.create(
+                user=self.user, title=f'Curry {i}', time_minutes=i,
+                price=Decimal('7.5'))
+            self.recipe.tag.add(self.tag)
+            self.recipe.ingredients.add(self.ingredient)
+
+    async def _compare(self, name, *args, params=None):
+        """Return the async response for name, asserting it matches"""
+        # Django 3.2's AsyncClient drops its data argument on GET
+        query = f'?{urlencode(params)}' if params else ''
+        res = await self.async_client.get(
+            reverse(f'recipe:async-{name}', args=args) + query,
+            authorization=f'Token {self.token.key}')
+        expected = await sync_to_async(self.client.get)(
+            reverse(f'recipe:{name}', args=args), params or {})
+
+        self.assertEqual(res.status_code, expected.status_code)
+        self.assertEqual(res.content, expected.content)
+        # ETags cover the URL, so only their presence is shared
+        self.assertEqual('ETag' in res, 'ETag' in expected)
+        return res
+
+    async def test_lists_match_viewsets(self):
+        """Test the async lists return what the viewsets return"""
+        res = await self._compare('recipe-list')
+        self.assertEqual(len(res.json()['results']), 3)
+        await self._compare('recipe-list', params={'fields': 'id,title'})
+        await self._compare('recipe-list', params={'expand': 'tag'})
+        await self._compare('tag-list')
+        await self._compare('ingredient-list', params={'ordering': 'popular'})
+
+    async def test_details_match_viewsets(self):
+        """Test the async details return what the viewsets return"""
+        res = await self._compare('recipe-detail', self.recipe.pk)
+        self.assertEqual(res.json()['title'], 'Curry 2')
+        await self._compare('tag-detail', self.tag.pk)
+        await self._compare('ingredient-detail', self.ingredient.pk)
+
+    async def test_requires_authentication(self):
+        """Test the async endpoints reject anonymous requests"""
+        res = await self.async_client.get(ASYNC_RECIPES_URL)
+
+        self.assertEqual(res.status_code, 401)
+
+    async def test_other_users_objects_not_found(self):
+        """Test a detail of another user's recipe is a 404"""
+        other = await sync_to_async(get_user_model().objects.create_user)(
+            'other@joseph.com', 'pass')
+        recipe = await sync_to_async(Recipe.objects.create)(
+            user=other, title='Secret', time_minutes=1, price=1)
+
+        res = await self.async_client.get(
+            reverse('recipe:async-recipe-detail', args=[recipe.pk]),
+            authorization=f'Token {self.token.key}')
+
+        self.assertEqual(res.status_code, 404)
+
+    async def test_actions_run_off_the_event_loop(self):
+        """Test concurrent requests run their action in pool threads"""
+        threads = []
+        original = RecipeViewSet.list
+
+        def record(viewset, request, *args, **kwargs):
+            threads.append(threading.get_ident())
+            return original(viewset, request, *args, **kwargs)
+
+        with mock.patch.object(RecipeViewSet, 'list', record):
+            responses = await asyncio.gather(*(
+                self.async_client.get(
+                    ASYNC_RECIPES_URL,
+                    authorization=f'Token {self.token.key}')
+                for _ in range(5)
+            ))
+
+        self.assertEqual([res.status_code for res in responses], [200] * 5)
+        self.assertEqual(len(threads), 5)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_asgi_middleware_async_capable(self):
+        """Test no middleware of the ASGI server runs on the sync thread"""
+        for name in ASGI_MIDDLEWARE:
+            with self.subTest(name):
+                self.assertTrue(import_string(name).async_capable)
+
+    @override_settings(MIDDLEWARE=ASGI_MIDDLEWARE)
+    async def test_asgi_requests_run_together(self):
+        """Test requests through the ASGI middleware are not serialized"""
+        # Each action waits for the other, which would time out if any
+        # middleware made the requests take turns on the sync thread
+        both_in = threading.Barrier(2, timeout=5)
+        original = RecipeViewSet.list
+
+        def list_together(viewset, request, *args, **kwargs):
+            both_in.wait()
+            return original(viewset, request, *args, **kwargs)
+
+        with mock.patch.object(RecipeViewSet, 'list', list_together):
+            responses = await asyncio.gather(*(
+                self.async_client.get(
+                    ASYNC_RECIPES_URL,
+                    authorization=f'Token {self.token.key}')
+                for _ in range(2)
+            ))
+
+        self.assertEqual([res.status_code for res in responses], [200] * 2)
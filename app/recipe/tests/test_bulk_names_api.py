@@ -0,0 +1,116 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Tag
+
+
+TAGS_URL = reverse('recipe:tag-list')
+TAGS_BULK_URL = reverse('recipe:tag-bulk')
+INGREDIENTS_BULK_URL = reverse('recipe:ingredient-bulk')
+
+
+class BulkNamesApiTests(TestCase):
+    """Test resolving tag and ingredient names to ids in bulk"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'names@softdev.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_creates_missing_and_returns_existing(self):
+        """Test existing names are reused and missing ones created"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(
+            TAGS_BULK_URL, {'names': ['vegan', 'Dessert']}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0], {'id': vegan.id, 'name': 'Vegan'})
+        dessert = Tag.objects.get(user=self.user, name='Dessert')
+        self.assertEqual(res.data[1], {'id': dessert.id, 'name': 'Dessert'})
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_deduplicates_names_ignoring_case(self):
+        """Test names differing only by case resolve to one ingredient"""
+        res = self.client.post(
+            INGREDIENTS_BULK_URL,
+            {'names': ['Salt', 'SALT', 'salt']},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len({item['id'] for item in res.data}), 1)
+        self.assertEqual(Ingredient.objects.count(), 1)
+
+    def test_bulk_names_folded_by_the_database(self):
+        """Test names the database and Python lowercase differently are
+        all resolved"""
+        Tag.objects.create(user=self.user, name='İstanbul')
+        names = ['istanbul', 'Éclair', 'İstanbul']
+
+        res = self.client.post(TAGS_BULK_URL, {'names': names}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 3)
+        for item in res.data:
+            self.assertEqual(
+                Tag.objects.get(pk=item['id']).name, item['name'])
+
+    def test_bulk_names_are_per_user(self):
+        """Test another user's tag with the same name is not returned"""
+        other = get_user_model().objects.create_user(
+            'other@softdev.com',
+            'testPASS'
+        )
+        theirs = Tag.objects.create(user=other, name='Vegan')
+
+        res = self.client.post(
+            TAGS_BULK_URL, {'names': ['Vegan']}, format='json')
+
+        self.assertNotEqual(res.data[0]['id'], theirs.id)
+        self.assertTrue(Tag.objects.filter(user=self.user).exists())
+
+    def test_bulk_invalid_payload(self):
+        """Test an empty list of names is rejected"""
+        res = self.client.post(TAGS_BULK_URL, {'names': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipUnless(connection.vendor == 'postgresql',
+                'Single statement upsert requires PostgreSQL')
+    def test_bulk_single_round_trip(self):
+        """Test resolving any number of names costs one query, and one
+        more for the list version"""
+        Tag.objects.create(user=self.user, name='Existing')
+        names = ['Existing'] + [f'Tag {i}' for i in range(50)]
+
+        with self.assertNumQueries(2):
+            res = self.client.post(
+                TAGS_BULK_URL, {'names': names}, format='json')
+
+        self.assertEqual(len(res.data), 51)
+
+    def test_create_duplicate_name_rejected(self):
+        """Test creating a tag whose name exists in another case fails"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(TAGS_URL, {'name': 'VEGAN'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_database_enforces_unique_names(self):
+        """Test the database rejects duplicate names ignoring case"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        with self.assertRaises(IntegrityError):
+            Tag.objects.create(user=self.user, name='vegan')
@@ -0,0 +1,115 @@
+import datetime
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.renderers import ORJSONRenderer
+
+
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class FastListTests(TestCase):
+    """Test the fast list path renders exactly what the serializers do"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'fast@joseph.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
+
+        vegan = Tag.objects.create(user=self.user, name='Végan \u2028')
+        dinner = Tag.objects.create(user=self.user, name='Dinner "late"')
+        Tag.objects.create(user=self.user, name='Unused')
+        rice = Ingredient.objects.create(user=self.user, name='Rice')
+        for i in range(5):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Curry {i} ☃', time_minutes=i,
+                price=Decimal('7.5') + i, link='' if i % 2 else 'http://x')
+            recipe.tag.add(dinner, vegan)
+            if i % 2:
+                recipe.ingredients.add(rice)
+
+    def _compare(self, url, params=None):
+        """Return the body of url, asserting both paths agree on it"""
+        with override_settings(FAST_LIST_RENDERING=False):
+            cache.clear()
+            slow = self.client.get(url, params or {})
+        with override_settings(FAST_LIST_RENDERING=True):
+            cache.clear()
+            fast = self.client.get(url, params or {})
+
+        self.assertEqual(slow.status_code, 200)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+        self.assertEqual(fast['Content-Type'], slow['Content-Type'])
+        return fast
+
+    def test_recipe_list_matches(self):
+        """Test the recipe list, its filters and pages are byte compatible"""
+        self._compare(RECIPES_URL)
+        self._compare(RECIPES_URL, {'search': 'curry'})
+        self._compare(RECIPES_URL, {
+            'tag': Tag.objects.get(name='Unused').pk})
+        res = self._compare(RECIPES_URL, {'page_size': 2})
+        self._compare(res.data['next'])
+
+    def test_tag_and_ingredient_lists_match(self):
+        """Test the tag and ingredient lists are byte compatible"""
+        self._compare(TAGS_URL)
+        self._compare(TAGS_URL, {'assigned_only': 1})
+        self._compare(INGREDIENTS_URL)
+
+    def test_recipe_list_queries(self):
+        """Test the fast path loads each relation in one query"""
+        with override_settings(FAST_LIST_RENDERING=True):
+            # ETag, recipes, ingredients, tags
+            with self.assertNumQueries(4):
+                self.client.get(RECIPES_URL)
+
+    @override_settings(FAST_LIST_RENDERING=True)
+    def test_browsable_api(self):
+        """Test the fast rows also render in the browsable API"""
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT='text/html')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('Curry 4', res.content.decode())
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """Test the orjson renderer matches JSONRenderer"""
+
+    def test_same_bytes(self):
+        """Test serializer data types encode identically"""
+        data = {
+            'text': 'snow ☃ \u2028 \u2029 "quoted" \\',
+            'number': 2 ** 40,
+            'decimal': Decimal('1.50'),
+            'date': datetime.datetime(
+                2021, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            'nested': [None, True, {'a': []}],
+        }
+
+        self.assertEqual(
+            ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indent_falls_back(self):
+        """Test indented output is left to JSONRenderer"""
+        data = {'a': [1, 2]}
+        media_type = 'application/json; indent=4'
+
+        self.assertEqual(
+            ORJSONRenderer().render(data, media_type),
+            JSONRenderer().render(data, media_type))
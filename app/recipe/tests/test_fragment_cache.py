@@ -0,0 +1,124 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.serializers import RecipeSerializer
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class RecipeFragmentCacheTests(TestCase):
+    """Test assembling recipe lists from cached serialized recipes"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'fragments@softdev.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Dinner')
+        self.garlic = Ingredient.objects.create(user=self.user, name='Garlic')
+        self.recipes = []
+        for i in range(5):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Curry {i}', time_minutes=i,
+                price='7.50')
+            recipe.tag.add(self.tag)
+            recipe.ingredients.add(self.garlic)
+            self.recipes.append(recipe)
+
+    def _list(self, params=None):
+        res = self.client.get(RECIPES_URL, params or {})
+        self.assertEqual(res.status_code, 200)
+        return res.data['results']
+
+    def _serialized(self, params=None):
+        """Return the list and the ids of the recipes serialized for it"""
+        with mock.patch.object(
+                RecipeSerializer, 'to_representation', autospec=True,
+                side_effect=RecipeSerializer.to_representation) as serialize:
+            results = self._list(params)
+        return results, sorted(call.args[1].pk for call in
+                               serialize.call_args_list)
+
+    def test_warm_list_serializes_nothing(self):
+        """Test a repeated list reads the page and serializes nothing"""
+        first = self._list()
+
+        # ETag, page
+        with self.assertNumQueries(2):
+            results, serialized = self._serialized()
+
+        self.assertEqual(serialized, [])
+        self.assertEqual(results, first)
+
+    def test_search_vector_not_loaded(self):
+        """Test listing and retrieving recipes leave the search document
+        in the database"""
+        detail_url = reverse('recipe:recipe-detail', args=[self.recipes[0].id])
+
+        with CaptureQueriesContext(connection) as queries:
+            self._list()
+            self.client.get(detail_url)
+
+        for query in queries.captured_queries:
+            self.assertNotIn('search_vector', query['sql'])
+
+    def test_only_changed_recipes_serialized(self):
+        """Test saved recipes and changed relations miss the cache"""
+        self._list()
+        edited, retagged = self.recipes[1], self.recipes[3]
+        edited.title = 'Stew'
+        edited.save()
+        retagged.tag.remove(self.tag)
+
+        results, serialized = self._serialized()
+
+        self.assertEqual(serialized, [edited.pk, retagged.pk])
+        by_id = {item['id']: item for item in results}
+        self.assertEqual(by_id[edited.pk]['title'], 'Stew')
+        self.assertEqual(by_id[retagged.pk]['tag'], [])
+
+    def test_same_output_as_uncached(self):
+        """Test cold and warm lists match plain serialization"""
+        for params in ({}, {'expand': 'tag,ingredients'},
+                       {'fields': 'title,tag'}, {'search': 'curry'},
+                       {'page_size': 2}):
+            with override_settings(RECIPE_FRAGMENT_CACHE_TIMEOUT=0):
+                expected = self._list(params)
+
+            self.assertEqual(self._list(params), expected, params)
+            self.assertEqual(self._list(params), expected, params)
+
+    def test_variants_cached_apart(self):
+        """Test sparse and expanded lists do not share entries"""
+        self._list({'fields': 'id,title'})
+        self._list({'expand': 'tag'})
+
+        results = self._list()
+
+        self.assertEqual(results[0]['tag'], [self.tag.pk])
+        self.assertIn('price', results[0])
+
+    def test_related_rename_and_delete(self):
+        """Test renamed and deleted tags show in cached expanded lists"""
+        self._list({'expand': 'tag'})
+        self.tag.name = 'Supper'
+        self.tag.save()
+
+        results = self._list({'expand': 'tag'})
+
+        self.assertEqual(results[0]['tag'][0]['name'], 'Supper')
+        self.garlic.delete()
+        self.assertEqual(self._list()[0]['ingredients'], [])
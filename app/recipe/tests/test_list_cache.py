@@ -0,0 +1,100 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache as django_cache
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.models import Ingredient, Recipe, Tag
+from recipe import cache
+
+
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+class AttrListCacheTests(TestCase):
+    """Test the versioned cache of tag and ingredient lists"""
+
+    def setUp(self):
+        django_cache.clear()
+        metrics.registry.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'cache@softdev.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _names(self, url, params=None):
+        res = self.client.get(url, params or {})
+        return [item['name'] for item in res.data['results']]
+
+    def test_repeated_list_served_from_cache(self):
+        """Test a repeated list call does not query the database"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        self._names(TAGS_URL)
+
+        with self.assertNumQueries(0):
+            names = self._names(TAGS_URL)
+
+        self.assertEqual(names, ['Vegan'])
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_lookups_counted_in_process(self):
+        """Test hits and misses are counted without writing to the cache"""
+        self._names(TAGS_URL)
+
+        with mock.patch.object(django_cache, 'incr') as incr, \
+                mock.patch.object(django_cache, 'add') as add:
+            self._names(TAGS_URL)
+
+        incr.assert_not_called()
+        add.assert_not_called()
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_create_invalidates_list(self):
+        """Test creating a tag through the API shows up in the next list"""
+        self._names(TAGS_URL)
+
+        self.client.post(TAGS_URL, {'name': 'Dessert'})
+
+        self.assertEqual(self._names(TAGS_URL), ['Dessert'])
+
+    def test_recipe_relation_change_invalidates_assigned_only(self):
+        """Test assigning and deleting recipes updates assigned_only lists"""
+        garlic = Ingredient.objects.create(user=self.user, name='Garlic')
+        Ingredient.objects.create(user=self.user, name='Salt')
+        params = {'assigned_only': 1}
+        self.assertEqual(self._names(INGREDIENTS_URL, params), [])
+
+        recipe = Recipe.objects.create(
+            user=self.user, title='Garlic bread', time_minutes=5, price=2.00)
+        recipe.ingredients.add(garlic)
+        self.assertEqual(self._names(INGREDIENTS_URL, params), ['Garlic'])
+
+        recipe.delete()
+        self.assertEqual(self._names(INGREDIENTS_URL, params), [])
+
+    def test_cache_is_per_user(self):
+        """Test one user's cached list is not served to another"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        self._names(TAGS_URL)
+
+        user2 = get_user_model().objects.create_user(
+            'other@softdev.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(user2)
+
+        self.assertEqual(self._names(TAGS_URL), [])
+
+    def test_generation_survives_eviction(self):
+        """Test an evicted generation never reuses an older value"""
+        before = cache.get_generation(self.user.pk)
+        django_cache.delete(cache.GENERATION_KEY.format(user_id=self.user.pk))
+
+        self.assertGreater(cache.get_generation(self.user.pk), before)
@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def sample_recipe(user, title):
+    """Create and return a sample recipe"""
+    return Recipe.objects.create(
+        user=user, title=title, time_minutes=10, price=5.00
+    )
+
+
+class CursorPaginationTests(TestCase):
+    """Test keyset pagination of the recipe API lists"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'pages@softdev.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _walk(self, url, page_size):
+        """Follow next links and return the pages of results"""
+        pages = []
+        res = self.client.get(url, {'page_size': page_size})
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            pages.append(res.data['results'])
+            if not res.data['next']:
+                return pages
+            res = self.client.get(res.data['next'])
+
+    def test_recipes_paginated_newest_first(self):
+        """Test recipes are split into pages ordered by descending id"""
+        recipes = [sample_recipe(self.user, f'Recipe {i}') for i in range(5)]
+
+        pages = self._walk(RECIPES_URL, 2)
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        ids = [item['id'] for page in pages for item in page]
+        self.assertEqual(ids, [recipe.id for recipe in reversed(recipes)])
+
+    def test_cursor_stable_under_inserts(self):
+        """Test recipes created between page fetches do not shift pages"""
+        for i in range(4):
+            sample_recipe(self.user, f'Recipe {i}')
+
+        first = self.client.get(RECIPES_URL, {'page_size': 2})
+        sample_recipe(self.user, 'Created while paging')
+        second = self.client.get(first.data['next'])
+
+        seen = [item['id'] for item in first.data['results']]
+        seen += [item['id'] for item in second.data['results']]
+        self.assertEqual(len(set(seen)), 4)
+        self.assertNotIn(
+            'Created while paging',
+            [item['title'] for item in second.data['results']]
+        )
+
+    def test_no_count_query(self):
+        """Test listing a page does not count the whole table"""
+        for i in range(3):
+            sample_recipe(self.user, f'Recipe {i}')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(RECIPES_URL, {'page_size': 1})
+
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'].upper())
+            self.assertNotIn('OFFSET', query['sql'].upper())
+
+    def test_tags_paginated_by_name(self):
+        """Test tags are paginated in descending name order"""
+        for name in ('Apple', 'Banana', 'Cherry', 'Date'):
+            Tag.objects.create(user=self.user, name=name)
+
+        pages = self._walk(TAGS_URL, 3)
+
+        names = [item['name'] for page in pages for item in page]
+        self.assertEqual(names, ['Date', 'Cherry', 'Banana', 'Apple'])
+        self.assertEqual(len(pages), 2)
@@ -0,0 +1,166 @@
+import tempfile
+from io import BytesIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from PIL import Image
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from user.authentication import token_cache
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TestCase):
+    """Test the recipe API stays within its query budgets at any size.
+
+    Requests authenticate with a token the cache has not seen, so the
+    lookup counts, and work on many related rows so a query per row
+    would exceed the budget.
+    """
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'budget@joseph.com',
+            'testPASS'
+        )
+        self.client = APIClient()
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.tags = [Tag.objects.create(user=self.user, name=f'Tag {i}')
+                     for i in range(12)]
+        self.ingredients = [
+            Ingredient.objects.create(user=self.user, name=f'Ingredient {i}')
+            for i in range(12)]
+        self.recipes = []
+        for i in range(30):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Curry {i}', time_minutes=i,
+                price='5.00')
+            recipe.tag.set(self.tags[i % 4:i % 4 + 6])
+            recipe.ingredients.set(self.ingredients[i % 3:i % 3 + 8])
+            self.recipes.append(recipe)
+
+    def _payload(self, tags, ingredients):
+        return {'title': 'Stew', 'time_minutes': 30, 'price': '9.50',
+                'tag': [tag.pk for tag in tags],
+                'ingredients': [item.pk for item in ingredients]}
+
+    def test_recipe_reads(self):
+        """Test listing, filtering, expanding and retrieving recipes"""
+        tag_ids = f'{self.tags[4].pk},{self.tags[5].pk}'
+        for params in ({}, {'expand': 'tag,ingredients'},
+                       {'tag': tag_ids, 'match': 'all'},
+                       {'ingredients': self.ingredients[7].pk},
+                       {'search': 'curry'}):
+            token_cache.clear()
+            res = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK, params)
+        res = self.client.get(detail_url(self.recipes[0].pk))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_recipe_writes(self):
+        """Test writing recipes with many tags and ingredients"""
+        res = self.client.post(
+            RECIPES_URL, self._payload(self.tags[:8], self.ingredients[:8]),
+            format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        token_cache.clear()
+        url = detail_url(res.data['id'])
+        # Adds and removes links of both relations
+        res = self.client.put(
+            url, self._payload(self.tags[4:], self.ingredients[4:]),
+            format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        token_cache.clear()
+        res = self.client.patch(
+            url, {'tag': [tag.pk for tag in self.tags[:9]]}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        token_cache.clear()
+        # A PATCH may change both relations, as much as a PUT
+        res = self.client.patch(url, {
+            'tag': [tag.pk for tag in self.tags[:4]],
+            'ingredients': [ingredient.pk
+                            for ingredient in self.ingredients[:4]],
+        }, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        token_cache.clear()
+        res = self.client.delete(detail_url(self.recipes[0].pk))
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+    # Elsewhere the recipes are inserted one at a time, see recipe.bulk
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL only')
+    def test_recipe_bulk(self):
+        """Test a bulk create costs the same however many recipes"""
+        items = [self._payload(self.tags, self.ingredients)
+                 for _ in range(50)]
+
+        res = self.client.post(
+            reverse('recipe:recipe-bulk'), items, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_upload_image(self):
+        """Test queueing an image upload"""
+        image = BytesIO()
+        Image.new('RGB', (10, 10)).save(image, 'JPEG')
+        image.name = 'curry.jpg'
+        image.seek(0)
+
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root,
+                                  RECIPE_IMAGE_WORKERS=0):
+            res = self.client.post(
+                reverse('recipe:recipe-upload-image',
+                        args=[self.recipes[0].pk]),
+                {'image': image}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+
+    def test_tags_and_ingredients(self):
+        """Test listing, retrieving and creating tags and ingredients"""
+        for kind, objects in (('tag', self.tags),
+                              ('ingredient', self.ingredients)):
+            token_cache.clear()
+            res = self.client.get(
+                reverse(f'recipe:{kind}-list'), {'assigned_only': 1})
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+            token_cache.clear()
+            res = self.client.get(
+                reverse(f'recipe:{kind}-detail', args=[objects[0].pk]))
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+            token_cache.clear()
+            res = self.client.post(
+                reverse(f'recipe:{kind}-list'),
+                {'name': 'New', 'user': self.user.pk})
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+            token_cache.clear()
+            res = self.client.post(
+                reverse(f'recipe:{kind}-bulk'),
+                {'names': [f'Name {i}' for i in range(40)]}, format='json')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
@@ -0,0 +1,97 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class SparseFieldsTests(TestCase):
+    """Test trimming responses and queries with ?fields="""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sparse@joseph.com',
+            'testPASS'
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=30, price=7)
+        self.recipe.tag.add(self.tag)
+        self.recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Rice'))
+
+    def test_recipe_list_fields(self):
+        """Test a thin recipe list is one narrow query after its ETag"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['results'], [{'id': self.recipe.id, 'title': 'Curry'}])
+        self.assertEqual(len(queries), 2)
+        sql = queries[1]['sql']
+        self.assertNotIn('price', sql)
+        self.assertNotIn('search_vector', sql)
+
+    def test_requested_relation_is_prefetched(self):
+        """Test only the relations asked for are loaded"""
+        # ETag, recipes, tags
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL, {'fields': 'title,tag'})
+
+        self.assertEqual(
+            res.data['results'], [{'title': 'Curry', 'tag': [self.tag.id]}])
+
+    def test_recipe_detail_fields(self):
+        """Test sparse fieldsets on the detail endpoint"""
+        res = self.client.get(
+            detail_url(self.recipe.id), {'fields': 'title,ingredients'})
+
+        self.assertEqual(res.data, {
+            'title': 'Curry',
+            'ingredients': [{
+                'id': self.recipe.ingredients.get().id,
+                'name': 'Rice',
+                'user': self.user.id,
+            }],
+        })
+
+    def test_tag_list_fields(self):
+        """Test sparse fieldsets on the tag list"""
+        res = self.client.get(TAGS_URL, {'fields': 'name'})
+
+        self.assertEqual(res.data['results'], [{'name': 'Vegan'}])
+
+    def test_unknown_field_rejected(self):
+        """Test asking for a field that does not exist is a 400"""
+        res = self.client.get(RECIPES_URL, {'fields': 'id,secret'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['fields'], ["Unknown field 'secret'."])
+
+    @override_settings(FAST_LIST_RENDERING=True)
+    def test_fast_path_fields(self):
+        """Test the fast list path honours ?fields="""
+        # ETag, recipes
+        with self.assertNumQueries(2):
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title'})
+
+        self.assertEqual(
+            res.json()['results'], [{'id': self.recipe.id, 'title': 'Curry'}])
@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from recipe import views
+from recipe import async_views, views
 
 
 router = DefaultRouter()
@@ -12,4 +12,16 @@ app_name = 'recipe'
 
 urlpatterns = [
     path('',include(router.urls)),
-]
\ No newline at end of file
+    # Coroutine versions of the read endpoints, for ASGI servers
+    path('async/tags/', async_views.tag_list, name='async-tag-list'),
+    path('async/tags/<int:pk>/', async_views.tag_detail,
+         name='async-tag-detail'),
+    path('async/ingredients/', async_views.ingredient_list,
+         name='async-ingredient-list'),
+    path('async/ingredients/<int:pk>/', async_views.ingredient_detail,
+         name='async-ingredient-detail'),
+    path('async/recipes/', async_views.recipe_list,
+         name='async-recipe-list'),
+    path('async/recipes/<int:pk>/', async_views.recipe_detail,
+         name='async-recipe-detail'),
+]
@@ -1,33 +1,100 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 
 from core.models import Tag, Ingredient,Recipe
-from recipe.serializers import TagSerializer, IngredientSerializer,RecipeSerializer,RecipeDetailSerializer,RecipeImageSerializer
+from core.replicas import ReplicaReadMixin
+from recipe import bulk, cache, conditional, export, images
+from recipe.fastpath import FastListMixin
+from recipe.fragments import FragmentListMixin
+from recipe.renderers import CSVRenderer, NDJSONRenderer
+from recipe.pagination import RecipeAttrCursorPagination, RecipeCursorPagination
+from recipe.serializers import (
+    TagSerializer,
+    IngredientSerializer,
+    RecipeSerializer,
+    RecipeDetailSerializer,
+    RecipeImageSerializer,
+    RecipeBulkSerializer,
+    NameListSerializer,
+    expand_serializer,
+)
+from recipe.signals import invalidate_user
+from rest_framework.decorators import action
 from rest_framework.response import Response
+from user.authentication import CachedTokenAuthentication
 
 
-from rest_framework.decorators import action
-class  BaseRecipeAttrViewSet(viewsets.GenericViewSet,
-                             mixins.ListModelMixin,
-                             mixins.CreateModelMixin):
+class BaseRecipeAttrViewSet(ReplicaReadMixin,
+                            FastListMixin,
+                            viewsets.GenericViewSet,
+                            mixins.ListModelMixin,
+                            mixins.RetrieveModelMixin,
+                            mixins.CreateModelMixin):
         """Base Viewset for user recipe attributes"""
-        authentication_classes =  (TokenAuthentication,)
+        authentication_classes =  (CachedTokenAuthentication,)
         permission_classes = (IsAuthenticated,)
+        pagination_class = RecipeAttrCursorPagination
+        # Most SQL queries a request of each action may run, the token
+        # lookup of a cold authentication cache included: the worst case
+        # of recipe/tests/test_query_budgets.py, see core/query_budget.py
+        query_budgets = {'list': 2, 'retrieve': 2, 'create': 6, 'bulk': 4}
 
         def get_queryset(self):
             """Return objects for the current authenticated user"""
+            if getattr(self, 'swagger_fake_view', False):
+                # Introspected for the schema, without a user
+                return self.queryset.none()
             assigned_only = bool(
                 int(self.request.query_params.get("assigned_only", 0))
             )
             queryset = self.queryset
             if assigned_only:
-                queryset =queryset.filter(recipe__isnull=False)
-            return queryset.filter(user=self.request.user).order_by('-name').distinct()
+                queryset = queryset.filter(recipe_count__gt=0)
+            return queryset.filter(user=self.request.user).order_by('-name')
+
+        def list(self, request, *args, **kwargs):
+            """List objects, served from the per-user cache when possible"""
+            key = cache.list_key(request, self.queryset.model)
+            data = cache.get_list(key)
+            if data is None:
+                response = super().list(request, *args, **kwargs)
+                cache.set_list(key, response.data)
+                return response
+            return Response(data)
+
+        def get_serializer_class(self):
+            """Return appropriate serializer class"""
+            if self.action == 'bulk':
+                return NameListSerializer
+            return self.serializer_class
 
         def perform_create(self, serializer):
             """Create a new object"""
-            serializer.save(user=self.request.user)
+            try:
+                with transaction.atomic():
+                    serializer.save(user=self.request.user)
+            except IntegrityError:
+                # lost a race with a concurrent create of the same name
+                raise ValidationError({'name': ['This name already exists.']})
+
+        @action(methods=['POST'], detail=False, url_path='bulk')
+        def bulk(self, request):
+            """Return the ids of the given names, creating missing ones"""
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            names = serializer.validated_data['names']
+
+            found = self.queryset.get_or_create_names(request.user, names)
+            # New rows are inserted without save(), so invalidate here
+            invalidate_user(request.user.pk)
+            return Response(
+                [dict(zip(('id', 'name'), found[name.lower()]))
+                 for name in names],
+                status.HTTP_200_OK)
 
 
 
@@ -47,34 +114,95 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     # renderer_classes = [TemplateHTMLRenderer]
+    # The serializer also looks up the user given with a new ingredient
+    query_budgets = {**BaseRecipeAttrViewSet.query_budgets, 'create': 7}
 
             
-class RecipeViewSet(viewsets.ModelViewSet):    
+class RecipeViewSet(ReplicaReadMixin, FastListMixin, FragmentListMixin,
+                    viewsets.ModelViewSet):
     """Manage recipes in db"""
     serializer_class = RecipeSerializer
     queryset = Recipe.objects.all()
-    authentication_classes =(TokenAuthentication,)
+    authentication_classes =(CachedTokenAuthentication,)
     permission_classes =(IsAuthenticated,)
+    pagination_class = RecipeCursorPagination
+    bulk_max_items = 10000
+    # Relations ?expand= can nest in list results, as in the detail view
+    expandable_fields = ('ingredients', 'tag')
+    export_chunk_size = 2000
+    # Most SQL queries a request of each action may run, the token lookup
+    # of a cold authentication cache included: the worst case of
+    # recipe/tests/test_query_budgets.py, see core/query_budget.py. Writes
+    # also keep the search vectors, recipe counts and the owner's list
+    # version up to date. A PATCH may send every field, so partial_update
+    # gets the budget of update.
+    query_budgets = {
+        'list': 5, 'retrieve': 4, 'create': 22, 'update': 35,
+        'partial_update': 35, 'destroy': 10, 'upload_image': 7, 'bulk': 13,
+        'export': 1,
+    }
+
+    # Relations read by each action's serializer. They are prefetched in one
+    # query per relation so listing recipes does not cost a query per row,
+    # in id order so the output is stable and matches the fast list path.
+    related_prefetch = (
+        Prefetch('ingredients', Ingredient.objects.order_by('pk')),
+        Prefetch('tag', Tag.objects.order_by('pk')),
+    )
+    action_prefetch = {
+        'list': related_prefetch,
+        'retrieve': related_prefetch,
+    }
 
     def _params_to_ints(self, qs):
         """Convert a list of string IDs to a list of Integers"""
-        return [int(str_id) for str_id in qs.split(',')]
+        try:
+            return [int(str_id) for str_id in qs.split(',') if str_id.strip()]
+        except ValueError:
+            raise ValidationError(
+                {'detail': f"'{qs}' is not a comma separated list of ids"})
+
+    def _match_all(self):
+        """Return whether filters must match all the given ids"""
+        match = self.request.query_params.get('match', 'any')
+        if match not in ('any', 'all'):
+            raise ValidationError({'match': "Expected 'any' or 'all'"})
+        return match == 'all'
 
 
     def get_queryset(self):
         """Return recipe for authenticated user"""
-        tags = self.request.query_params.get('tag')
-        ingredient = self.request.query_params.get("ingredients")
+        if getattr(self, 'swagger_fake_view', False):
+            # Introspected for the schema, without a user
+            return self.queryset.none()
+        tags = self._params_to_ints(self.request.query_params.get('tag', ''))
+        ingredients = self._params_to_ints(
+            self.request.query_params.get('ingredients', ''))
 
+        # Filtering on search_vector does not need it loaded
+        queryset = self.queryset.defer('search_vector')
+        # An empty list of ids, as in ?tag=, filters nothing, whatever ?match=
+        if tags or ingredients:
+            match_all = self._match_all()
         if tags:
-            tag_ids = self._params_to_ints(tag)
-            queryset = queryset.filter(tag__id__in=tag_ids)
-        if ingredient:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset=queryset.filter(ingredients__id__in=ingredient_ids)
-        queryset = self.queryset
+            queryset = queryset.filter_related('tag', tags, match_all)
+        if ingredients:
+            queryset = queryset.filter_related(
+                'ingredients', ingredients, match_all)
+        search = self.request.query_params.get('search', '').strip()
+        if search:
+            queryset = queryset.search(search)
+        queryset = queryset.prefetch_related(*self.get_prefetches())
         return queryset.filter(user=self.request.user)
 
+    def get_prefetches(self):
+        """Return the relations the action's serializer reads"""
+        fields = self.get_requested_fields()
+        return [
+            prefetch for prefetch in self.action_prefetch.get(self.action, ())
+            if fields is None or prefetch.prefetch_to in fields
+        ]
+
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
@@ -83,23 +211,115 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeDetailSerializer
         elif self.action =='upload_image':
             return RecipeImageSerializer    
+        elif self.action == 'bulk':
+            return RecipeBulkSerializer
+        elif self.action == 'list':
+            expand = self._expanded_fields()
+            if expand:
+                return expand_serializer(
+                    self.serializer_class, RecipeDetailSerializer, expand)
         return self.serializer_class  
 
+    def _expanded_fields(self):
+        """Return the relations to nest in list results, from ?expand="""
+        param = self.request.query_params.get('expand', '')
+        expand = {name.strip() for name in param.split(',') if name.strip()}
+        unknown = sorted(expand - set(self.expandable_fields))
+        if unknown:
+            raise ValidationError({'expand': [
+                f"Cannot expand '{name}'." for name in unknown]})
+        return expand
+
+    def list(self, request, *args, **kwargs):
+        """List recipes, or return 304 when the client's page is current"""
+        etag = conditional.list_etag(
+            request, Recipe.objects.filter(user=request.user))
+        response = conditional.not_modified(request, etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+            response['ETag'] = etag
+        return response
+
+    def _stored_etag(self, pk):
+        """Return the ETag of a recipe from its change marker alone"""
+        try:
+            updated_at = Recipe.objects.filter(
+                pk=pk, user=self.request.user
+            ).values_list('updated_at', flat=True).first()
+        except (TypeError, ValueError):
+            return None
+        if updated_at is None:
+            return None
+        return conditional.recipe_etag(self.request, pk, updated_at)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Return a recipe, or 304 when the client's copy is current"""
+        if request.headers.get('If-None-Match'):
+            etag = self._stored_etag(kwargs['pk'])
+            response = etag and conditional.not_modified(request, etag)
+            if response:
+                return response
+        recipe = self.get_object()
+        serializer = self.get_serializer(recipe)
+        etag = conditional.recipe_etag(request, recipe.pk, recipe.updated_at)
+        return Response(serializer.data, headers={'ETag': etag})
+
     # creating recipe endpoints
     def perform_create(self, serializer):
         """Create a new recipe """
         serializer.save(user=self.request.user)
 
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        """Create or update a list of recipes in one transaction"""
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {'detail': 'Expected a list of recipes.'},
+                status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.bulk_max_items:
+            return Response(
+                {'detail': f'At most {self.bulk_max_items} recipes '
+                           'can be sent at once.'},
+                status.HTTP_400_BAD_REQUEST)
+
+        data, errors = bulk.validate(request.user, items)
+        if errors:
+            return Response(errors, status.HTTP_400_BAD_REQUEST)
+        recipes = bulk.save(request.user, data)
+        return Response(
+            [{'id': recipe.pk} for recipe in recipes],
+            status.HTTP_201_CREATED)
+
+    @action(methods=['GET'], detail=False, url_path='export',
+            renderer_classes=(NDJSONRenderer, CSVRenderer))
+    def export(self, request):
+        """Stream all of the user's recipes as NDJSON or CSV"""
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            export.stream(self.get_queryset(), renderer,
+                          self.export_chunk_size),
+            content_type=f'{renderer.media_type}; charset=utf-8',
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipes.{renderer.format}"')
+        return response
+
     @action(methods=['POST'], detail=True, url_path='upload_image')
     def upload_image(self,request, pk=None):
-        """Upload an image to recipe"""
+        """Upload an image to recipe, processed in the background"""
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            pending = images.save_upload(serializer.validated_data['image'])
+            images.enqueue(recipe, pending)
+            recipe.refresh_from_db(fields=['image_status', 'updated_at'])
+            etag = conditional.recipe_etag(
+                request, recipe.pk, recipe.updated_at)
 
-            return Response(serializer.data, status.HTTP_200_OK)
+            return Response(serializer.data, status.HTTP_202_ACCEPTED,
+                            headers={'ETag': etag})
         return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)    
 
         
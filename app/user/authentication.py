@@ -0,0 +1,186 @@
+"""Token authentication that caches token lookups.
+
+DRF's TokenAuthentication joins ``authtoken_token`` and ``core_user`` on
+every request. CachedTokenAuthentication keeps recent tokens in a bounded
+in-process LRU with a TTL and, when ``TOKEN_AUTH_SHARED_CACHE`` names a
+cache alias, in a cache shared by every worker. The signal handlers in
+``user.signals`` revoke entries as soon as a token is deleted or its user
+is saved, which covers deactivation and password changes. Only the shared
+tier carries a revocation to the other workers, so UserConfig.ready()
+refuses to start more than one worker process without it.
+
+A revocation can land while a token missing from the cache is being read
+from the database. Every revocation therefore bumps a version, the one
+of the key in the shared tier and a counter of the process locally, and
+a token read before the bump is not cached.
+"""
+import copy
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from core.caches import check_shared, worker_processes
+
+
+SHARED_KEY = 'tokenauth:{key}'
+# Number of revocations of the key, entries of older versions are stale
+VERSION_KEY = 'tokenauth:version:{key}'
+# The keys DRF's Token.generate_key() makes
+KEY_FORMAT = re.compile(r'[0-9a-f]{40}')
+
+
+class TokenCache:
+    """Thread-safe LRU of token keys to tokens, bounded in size and age"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._revocations = 0
+        self._lock = threading.Lock()
+
+    def _shared(self):
+        alias = settings.TOKEN_AUTH_SHARED_CACHE
+        return caches[alias] if alias else None
+
+    def get(self, key):
+        """Return the cached token for key, or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                else:
+                    del self._entries[key]
+                    entry = None
+
+        shared = self._shared()
+        if shared is None:
+            return entry and entry[1]
+        # The shared tier is authoritative, so a revocation made by any
+        # worker is seen immediately, even when the local entry is fresh.
+        entry_key = SHARED_KEY.format(key=key)
+        version_key = VERSION_KEY.format(key=key)
+        values = shared.get_many([entry_key, version_key])
+        shared_entry = values.get(entry_key)
+        if (shared_entry is not None
+                and shared_entry[0] != values.get(version_key, 0)):
+            # Read from the database before a revocation, written after it
+            shared.delete(entry_key)
+            shared_entry = None
+        if shared_entry is None:
+            self._discard(key)
+            return None
+        token = shared_entry[1]
+        if entry is None:
+            self._remember(key, token, self._revocations)
+        return token
+
+    def version(self, key):
+        """Return the revocation versions of key, to read before loading
+        its token from the database and pass to set()"""
+        shared = self._shared()
+        shared_version = (
+            None if shared is None
+            else shared.get(VERSION_KEY.format(key=key), 0))
+        return self._revocations, shared_version
+
+    def set(self, key, token, version):
+        """Cache token unless key may have been revoked since version"""
+        revocations, shared_version = version
+        self._remember(key, token, revocations)
+        shared = self._shared()
+        if shared is not None and shared_version is not None:
+            # Never replaces an entry; a stale one is dropped by get()
+            shared.add(SHARED_KEY.format(key=key), (shared_version, token),
+                       settings.TOKEN_AUTH_SHARED_CACHE_TTL)
+
+    def _remember(self, key, token, revocations):
+        expires = time.monotonic() + settings.TOKEN_AUTH_CACHE_TTL
+        with self._lock:
+            if revocations != self._revocations:
+                # A token, maybe this one, was revoked meanwhile
+                return
+            self._entries[key] = (expires, token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_AUTH_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def _discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def revoke(self, key):
+        """Drop a token from every tier"""
+        with self._lock:
+            self._revocations += 1
+        self._discard(key)
+        shared = self._shared()
+        if shared is not None:
+            version_key = VERSION_KEY.format(key=key)
+            # Kept with no expiry, so a stale entry can never match again
+            shared.add(version_key, 0, None)
+            try:
+                shared.incr(version_key)
+            except ValueError:
+                # Evicted between the two calls
+                shared.set(version_key, 1, None)
+            shared.delete(SHARED_KEY.format(key=key))
+
+    def revoke_user(self, user_id, keys=()):
+        """Drop the given token keys and any local entry for the user"""
+        with self._lock:
+            stale = [key for key, (_, token) in self._entries.items()
+                     if token.user_id == user_id]
+        for key in set(stale) | set(keys):
+            self.revoke(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def check_shared_tier():
+    """Raise ImproperlyConfigured when a revocation would not reach the
+    other worker processes"""
+    alias = settings.TOKEN_AUTH_SHARED_CACHE
+    if alias is not None:
+        check_shared(alias)
+    elif worker_processes() > 1:
+        raise ImproperlyConfigured(
+            'Several worker processes would keep revoked tokens for up to '
+            'TOKEN_AUTH_CACHE_TTL seconds. Set TOKEN_AUTH_SHARED_CACHE to '
+            'a cache shared by the workers, or set CACHE_LOCATION.')
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication served from the token cache when possible"""
+
+    def authenticate_credentials(self, key):
+        if not KEY_FORMAT.fullmatch(key):
+            # Never a valid token, and the shared tier may refuse the key
+            return super().authenticate_credentials(key)
+        token = token_cache.get(key)
+        if token is None:
+            version = token_cache.version(key)
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, token, version)
+        elif not token.user.is_active:
+            # As TokenAuthentication checks on every lookup
+            token_cache.revoke(key)
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        # Each request gets its own user instance so views that modify
+        # request.user never share state with other threads.
+        user = copy.copy(token.user)
+        return (user, token)
@@ -2,9 +2,10 @@ from django.contrib.auth import get_user_model,authenticate
 from rest_framework import serializers
 from django.utils.translation import ugettext_lazy as _
 
+from core.metrics import TimedSerializerMixin
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializers for the user object"""
 
     class Meta:
@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from user.authentication import token_cache
+
+
+@receiver(post_delete, sender=Token)
+def revoke_deleted_token(sender, instance, **kwargs):
+    """Stop authenticating a token as soon as it is deleted"""
+    token_cache.revoke(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def revoke_tokens_of_saved_user(sender, instance, raw=False, **kwargs):
+    """Reload the user's token on next use after any change to the user.
+
+    This is what makes deactivation and password changes take effect on
+    the very next request.
+    """
+    if raw or kwargs.get('created'):
+        return
+    keys = Token.objects.filter(user=instance).values_list('key', flat=True)
+    token_cache.revoke_user(instance.pk, keys)
@@ -0,0 +1,207 @@
+import os
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import check_shared_tier, token_cache
+
+
+ME_URL = reverse('user:me')
+
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'tokens': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tokens',
+    },
+}
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test authenticating requests through the token cache"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='token@devsoftdevelopers.com',
+            password='testPASS',
+            name='Token user'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_token_skips_lookup(self):
+        """Test a repeated request does not look the token up again"""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_invalid_token_rejected(self):
+        """Test an unknown token is not cached as valid"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(CACHES=SHARED_CACHES, TOKEN_AUTH_SHARED_CACHE='tokens')
+    def test_malformed_token_skips_cache(self):
+        """Test a token no key could match is rejected without the cache"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + 'x' * 300)
+
+        with patch.object(token_cache, 'get') as get:
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        get.assert_not_called()
+
+    def _revoke_while_loading(self):
+        """Make a request whose token is revoked while it is read"""
+        load = TokenAuthentication.authenticate_credentials
+
+        def load_then_revoke(authentication, key):
+            found = load(authentication, key)
+            token_cache.revoke(key)
+            return found
+
+        with patch.object(TokenAuthentication, 'authenticate_credentials',
+                          load_then_revoke):
+            self.client.get(ME_URL)
+
+    def test_revoked_while_loading_not_cached(self):
+        """Test a token revoked during its lookup is not cached"""
+        self._revoke_while_loading()
+
+        self.assertIsNone(token_cache.get(self.token.key))
+
+    @override_settings(CACHES=SHARED_CACHES, TOKEN_AUTH_SHARED_CACHE='tokens')
+    def test_revoked_while_loading_not_shared(self):
+        """Test the shared tier rejects an entry older than a revocation"""
+        self._revoke_while_loading()
+        token_cache.clear()
+
+        self.assertIsNone(token_cache.get(self.token.key))
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+        with self.assertNumQueries(0):
+            self.client.get(ME_URL)
+
+    def test_deleted_token_revoked_immediately(self):
+        """Test deleting a token revokes it on the next request"""
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_revoked_immediately(self):
+        """Test deactivating a user revokes their cached token"""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_inactive_cached_user_rejected(self):
+        """Test a cached token of an inactive user is rejected and dropped"""
+        self.client.get(ME_URL)
+        token_cache.get(self.token.key).user.is_active = False
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIsNone(token_cache.get(self.token.key))
+
+    def test_password_change_reloads_user(self):
+        """Test a password change drops the cached user"""
+        self.client.get(ME_URL)
+        self.user.set_password('newPASS123')
+        self.user.save()
+
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+    @override_settings(TOKEN_AUTH_CACHE_TTL=10)
+    def test_entry_expires_after_ttl(self):
+        """Test tokens are looked up again once the TTL has passed"""
+        self.client.get(ME_URL)
+
+        with patch('user.authentication.time.monotonic',
+                   return_value=10 ** 9):
+            with self.assertNumQueries(1):
+                self.client.get(ME_URL)
+
+    @override_settings(TOKEN_AUTH_CACHE_SIZE=1)
+    def test_cache_bounded_in_size(self):
+        """Test the least recently used token is evicted"""
+        user2 = get_user_model().objects.create_user(
+            email='other@devsoftdevelopers.com',
+            password='testPASS'
+        )
+        token2 = Token.objects.create(user=user2)
+        self.client.get(ME_URL)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token2.key}')
+        self.client.get(ME_URL)
+
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.assertIsNotNone(token_cache.get(token2.key))
+
+    @override_settings(CACHES=SHARED_CACHES, TOKEN_AUTH_SHARED_CACHE='tokens')
+    def test_shared_tier_serves_other_workers(self):
+        """Test a token cached by one worker is used by another"""
+        self.client.get(ME_URL)
+        # simulates a different worker with an empty local cache
+        token_cache.clear()
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(CACHES=SHARED_CACHES, TOKEN_AUTH_SHARED_CACHE='tokens')
+    def test_shared_tier_revocation_reaches_local_entries(self):
+        """Test revoking in the shared tier overrides fresh local entries"""
+        self.client.get(ME_URL)
+        # another worker deletes the token: only the shared tier is updated
+        with patch.object(token_cache, '_discard'):
+            self.token.delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class SharedTierCheckTests(SimpleTestCase):
+    """Test refusing several workers without a shared token tier"""
+
+    def _workers(self, count):
+        return patch.dict(os.environ, {'WEB_CONCURRENCY': str(count)})
+
+    @override_settings(TOKEN_AUTH_SHARED_CACHE=None)
+    def test_several_workers_need_shared_tier(self):
+        """Test several workers fail without a shared tier"""
+        with self._workers(3), self.assertRaises(ImproperlyConfigured):
+            check_shared_tier()
+        with self._workers(1):
+            check_shared_tier()
+
+    @override_settings(CACHES=SHARED_CACHES, TOKEN_AUTH_SHARED_CACHE='tokens')
+    def test_shared_tier_must_be_shared(self):
+        """Test a process-local cache does not count as the shared tier"""
+        with self._workers(3), self.assertRaises(ImproperlyConfigured):
+            check_shared_tier()
@@ -1,26 +1,33 @@
 from django.shortcuts import render
 
 from user.serializers import UserSerializer,TokenAuthSerializer
-from rest_framework import generics,authentication,permissions
+from rest_framework import generics,permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+from core.replicas import ReplicaReadMixin
+from user.authentication import CachedTokenAuthentication
 
 
 class CreateUserView(generics.CreateAPIView):
     serializer_class = UserSerializer
+    # Most SQL queries a request may run, see core/query_budget.py
+    query_budgets = {'post': 2}
 
 
 class CreateTokenView(ObtainAuthToken):
     """Create a new auth token for user"""
     serializer_class = TokenAuthSerializer 
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    query_budgets = {'post': 2}
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+
+class ManageUserView(ReplicaReadMixin, generics.RetrieveUpdateAPIView):
     """Manage the authenticated user"""
 
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
+    query_budgets = {'get': 2, 'put': 5, 'patch': 5}
 
 
     def get_object(self):
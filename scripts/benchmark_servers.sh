@@ -0,0 +1,27 @@
+#!/bin/sh
+
+# Compares the recipe list under the uWSGI setup of entrypoint.sh with the
+# same list and its async version under the ASGI server, one process each.
+# Run from the app directory, against a migrated database:
+#   benchmark_servers.sh [CONCURRENCY] [REQUESTS]
+
+set -e
+
+CONCURRENCY=${1:-200}
+REQUESTS=${2:-5000}
+
+uwsgi --http :8090 --master --enable-threads --module app.wsgi \
+    --listen 1024 --disable-logging --die-on-term \
+    --py-sys-executable "$(command -v python)" &
+UWSGI_PID=$!
+APP_SERVER=asgi gunicorn app.asgi:application --bind :8091 --workers 1 \
+    --worker-class uvicorn.workers.UvicornWorker --backlog 1024 &
+ASGI_PID=$!
+trap 'kill $UWSGI_PID $ASGI_PID' EXIT
+sleep 3
+
+python manage.py benchmark_servers \
+    --concurrency "$CONCURRENCY" --requests "$REQUESTS" \
+    uwsgi=http://127.0.0.1:8090/api/recipe/recipes/ \
+    asgi-sync=http://127.0.0.1:8091/api/recipe/recipes/ \
+    asgi-async=http://127.0.0.1:8091/api/recipe/async/recipes/
@@ -4,5 +4,32 @@ set -e
 
 python manage.py collectstatic --noinput
 
-uwsgi --socket :8082 --master --enable-threads --module app.wsgi
+# Image jobs queued by the workers of a previous run died with them. Jobs
+# still too recent to be taken for lost at start-up are caught by the later
+# runs, which also recover those of workers recycled since. In the
+# background, so that neither the database nor a failure holds the server.
+(
+    python manage.py wait_for_db
+    while :; do
+        python manage.py requeue_images || echo "requeue_images failed" >&2
+        sleep "${RECIPE_IMAGE_STALE_SECONDS:-300}"
+    done
+) &
 
+# Totals of the workers of a previous run would be added to this one's
+if [ -n "$METRICS_DIR" ]; then
+    mkdir -p "$METRICS_DIR"
+    rm -f "$METRICS_DIR"/metrics-*.json
+fi
+
+# APP_SERVER=asgi serves plain HTTP, for the async endpoints, instead of
+# the uwsgi protocol; a proxy in front then needs proxy_pass. gunicorn
+# reads the number of workers from WEB_CONCURRENCY.
+if [ "$APP_SERVER" = "asgi" ]; then
+    exec gunicorn app.asgi:application --bind :8082 \
+        --worker-class uvicorn.workers.UvicornWorker
+fi
+
+# Image processing spawns Python processes, which need the interpreter
+uwsgi --socket :8082 --master --enable-threads --module app.wsgi \
+    --py-sys-executable "$(command -v python)"